@@ -1,12 +1,25 @@
 """
 Chat API endpoints for AI Study Companion
 """
+import asyncio
+import json
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional, Dict
-from services.ai_agent import generate_chat_response
-from database import SessionLocal, Conversation, Student
-from datetime import datetime
+from typing import List, Optional, Dict, Iterator
+from services.ai_agent import (
+    MAX_HISTORY_LENGTH, generate_chat_response_async, get_prompt_token_stats, get_semantic_cache_stats,
+    probe_semantic_cache, retrieve_chat_context, semantic_cache_eligible, stream_chat_response
+)
+from services.conversation_store import get_latest_conversation_id
+from services.conversation_writer import conversation_writer, save_conversation_turn
+from services.handoff_signals import load_signal_state
+from services.conversation_summary import load_history_with_summary
+from services.student_cache import get_student_profile
+from services.model_router import get_routing_stats
+from services.single_flight import SINGLE_FLIGHT_ENABLED, chat_flights, get_single_flight_stats, request_key
+from database import SessionLocal
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -14,7 +27,8 @@ router = APIRouter(prefix="/chat", tags=["chat"])
 class ChatMessage(BaseModel):
     student_id: str
     message: str
-    history: Optional[List[Dict]] = None
+    history: Optional[List[Dict]] = None  # Omit to use the server-side conversation history
+    subject: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -24,6 +38,62 @@ class ChatResponse(BaseModel):
     handoff_message: Optional[str] = None
 
 
+def get_student_or_404(student_id: str) -> Dict:
+    """Load a student's cached profile or raise 404"""
+    student = get_student_profile(student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail=f"Student {student_id} not found")
+    return student
+
+
+def load_conversation_context(student_db_id: int) -> Dict:
+    """
+    Server-side state of the student's latest conversation, loaded in one session
+    
+    Returns:
+        {"history": recent messages after the summary, "summary": str or None,
+         "signals": stored handoff signal state or None}
+    """
+    db = SessionLocal()
+    try:
+        conversation_id = get_latest_conversation_id(db, student_db_id)
+        if conversation_id is None:
+            return {"history": [], "summary": None, "signals": None}
+        summary, history = load_history_with_summary(db, conversation_id, MAX_HISTORY_LENGTH)
+        return {"history": history, "summary": summary, "signals": load_signal_state(db, conversation_id)}
+    finally:
+        db.close()
+
+
+async def resolve_history(message_data: ChatMessage, student: Dict) -> Dict:
+    """
+    Client-supplied history if given, otherwise the stored conversation's
+    rolling summary, the messages after it and its handoff signal state
+    """
+    if message_data.history is not None:
+        return {"history": message_data.history, "summary": None, "signals": None}
+    if conversation_writer.has_pending(student["id"]):
+        # The previous turn may still be queued for writing
+        await run_in_threadpool(conversation_writer.wait_for_student, student["id"])
+    return await run_in_threadpool(load_conversation_context, student["id"])
+
+
+def chat_request_key(message_data: ChatMessage, conversation: Dict) -> str:
+    """Single-flight key: the same message on the same conversation state"""
+    return request_key(
+        message_data.student_id,
+        (message_data.subject or "").strip().lower(),
+        message_data.message.strip(),
+        conversation["summary"],
+        [(message.get("role"), message.get("content")) for message in conversation["history"]]
+    )
+
+
+def format_sse(event: str, data: Dict) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @router.post("/", response_model=ChatResponse)
 async def chat(message_data: ChatMessage):
     """
@@ -31,70 +101,174 @@ async def chat(message_data: ChatMessage):
     
     Args:
         message_data: Chat message with student_id, message, and optional history
+            (stored summary and recent messages are used when omitted)
     
     Returns:
         AI response with confidence score and handoff detection
     """
-    # Validate student exists
-    db = SessionLocal()
-    try:
-        student = db.query(Student).filter(Student.student_id == message_data.student_id).first()
-        if not student:
-            raise HTTPException(status_code=404, detail=f"Student {message_data.student_id} not found")
-    finally:
-        db.close()
+    # Validate student exists (blocking DB query runs off the event loop)
+    student = await run_in_threadpool(get_student_or_404, message_data.student_id)
     
     # Generate AI response
     try:
-        result = generate_chat_response(
-            student_id=message_data.student_id,
-            message=message_data.message,
-            history=message_data.history or []
-        )
+        conversation = await resolve_history(message_data, student)
         
-        # Save conversation to database (optional - for tracking)
-        db = SessionLocal()
-        try:
-            # Find or create conversation record
-            conversation = db.query(Conversation).filter(
-                Conversation.student_id == student.id
-            ).order_by(Conversation.created_at.desc()).first()
-            
-            if not conversation:
-                conversation = Conversation(
-                    student_id=student.id,
-                    subject="General",
-                    message_count=0,
-                    messages=[]
-                )
-                db.add(conversation)
+        async def respond() -> Dict:
+            # Profile loading and retrieval run concurrently; the LLM call is async
+            result = await generate_chat_response_async(
+                student_id=message_data.student_id,
+                message=message_data.message,
+                history=conversation["history"],
+                summary=conversation["summary"],
+                signals=conversation["signals"],
+                subject=message_data.subject
+            )
             
-            # Add new messages to conversation
-            messages = conversation.messages or []
-            messages.append({
-                "role": "user",
-                "content": message_data.message,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            messages.append({
-                "role": "assistant",
-                "content": result["response"],
-                "timestamp": datetime.utcnow().isoformat(),
-                "confidence_score": result["confidence_score"],
-                "should_handoff": result["should_handoff"]
-            })
-            
-            conversation.messages = messages
-            conversation.message_count = len(messages)
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            print(f"Warning: Failed to save conversation: {e}")
-        finally:
-            db.close()
+            # Queue the turn for write-behind persistence; write directly only if the queue is full
+            if not conversation_writer.submit(student["id"], message_data.message, result):
+                await run_in_threadpool(save_conversation_turn, student["id"], message_data.message, result)
+            return result
         
+        # Identical in-flight requests (retries, double submits) share one reply and one saved turn
+        result = await chat_flights.run(chat_request_key(message_data, conversation), respond)
         return ChatResponse(**result)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
+
+@router.post("/stream")
+async def chat_stream(message_data: ChatMessage):
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    
+    Emits a "token" event ({"content": str}) for every piece of the reply as
+    the model produces it, then a single "done" event carrying the
+    ChatResponse fields (full response text including any handoff message,
+    confidence_score, should_handoff, handoff_message). The conversation is
+    saved after the stream has been fully sent. An identical request that
+    arrives while one is streaming waits for it (up to SINGLE_FLIGHT_WAIT_SECONDS,
+    then generates its own) and receives its reply as a single token.
+    
+    Args:
+        message_data: Chat message with student_id, message, and optional history
+            (stored summary and recent messages are used when omitted)
+    """
+    # Validate before streaming so unknown students still get a plain 404
+    student = await run_in_threadpool(get_student_or_404, message_data.student_id)
+    
+    hit, cache_probe, context, flight_key = None, None, None, None
+    save_turn = True
+    try:
+        conversation = await resolve_history(message_data, student)
+        if SINGLE_FLIGHT_ENABLED:
+            key = chat_request_key(message_data, conversation)
+            flight, leader = chat_flights.join(key)
+            if leader:
+                flight_key = key
+            else:
+                try:
+                    result = await chat_flights.wait(key, flight)
+                    hit = {"ai_response": result["response"], "result": result}
+                    save_turn = False  # The leading request saves the turn
+                except asyncio.TimeoutError:
+                    pass  # The leader never finished; generate the reply here
+        if hit is None and semantic_cache_eligible(conversation["history"], conversation["summary"]):
+            hit, cache_probe = await probe_semantic_cache(
+                student, message_data.message, conversation["history"],
+                conversation["signals"], message_data.subject
+            )
+        if hit is None:
+            context = await retrieve_chat_context(message_data.student_id, message_data.message)
+    except Exception as e:
+        if flight_key is not None:
+            chat_flights.finish(flight_key, error=e)
+        raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
+    
+    def cached_events() -> Iterator:
+        # A cached answer is sent as a single token
+        yield "token", hit["ai_response"]
+        yield "done", hit["result"]
+    
+    def event_stream() -> Iterator[str]:
+        # Sync generator: Starlette iterates it in the threadpool
+        events = cached_events() if hit else stream_chat_response(
+            student_id=message_data.student_id,
+            message=message_data.message,
+            history=conversation["history"],
+            context=context,
+            summary=conversation["summary"],
+            signals=conversation["signals"],
+            cache_probe=cache_probe,
+            subject=message_data.subject
+        )
+        result = None
+        try:
+            for event, payload in events:
+                if event == "token":
+                    yield format_sse("token", {"content": payload})
+                else:
+                    result = payload
+                    yield format_sse("done", payload)
+        finally:
+            # Runs after "done" is sent, and also when the client disconnects
+            # mid-stream, so a finished reply is always saved and shared
+            if result is not None:
+                if save_turn and not conversation_writer.submit(student["id"], message_data.message, result):
+                    save_conversation_turn(student["id"], message_data.message, result)
+                if flight_key is not None:
+                    chat_flights.finish(flight_key, result)
+            elif flight_key is not None:
+                chat_flights.finish(flight_key, error=RuntimeError("Chat stream ended without a response"))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/prompt-stats")
+def prompt_stats():
+    """Per-section prompt token counts (mean/max/last) for this worker"""
+    return get_prompt_token_stats()
+
+
+@router.get("/cache-stats")
+def cache_stats():
+    """Semantic response cache hit rate and size for this worker"""
+    return get_semantic_cache_stats()
+
+
+@router.get("/routing-stats")
+def routing_stats():
+    """Model routing mix, reasons, per-tier latency and recent decisions for this worker"""
+    return get_routing_stats()
+
+
+@router.get("/persistence-stats")
+def persistence_stats():
+    """Write-behind queue depth, batch sizes and failures for this worker"""
+    return conversation_writer.stats()
+
+
+@router.get("/single-flight-stats")
+def single_flight_stats():
+    """Coalesced duplicate chat and quiz requests for this worker"""
+    return get_single_flight_stats()
+
+
+@router.get("/signals/{student_id}")
+def conversation_signals(student_id: str):
+    """Handoff signal state of the student's latest conversation (for analytics)"""
+    student = get_student_or_404(student_id)
+    conversation_writer.wait_for_student(student["id"])
+    db = SessionLocal()
+    try:
+        conversation_id = get_latest_conversation_id(db, student["id"])
+        state = load_signal_state(db, conversation_id) if conversation_id is not None else None
+    finally:
+        db.close()
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"No signal state for student {student_id}")
+    return state
@@ -2,9 +2,14 @@
 Quiz API endpoints for AI Study Companion
 """
 from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional, Dict
-from services.quiz_generator import generate_quiz, score_quiz, check_auto_completion
+from services.quiz_generator import generate_quiz, score_quiz, check_auto_completion, retrieve_quiz_context
+from services.student_cache import get_student_profile, invalidate_student_profile
+from services.single_flight import quiz_flights, request_key
+from services.llm_gateway import LLMUnavailableError
+from services.quiz_pool import serve_pooled_quiz, get_quiz_pool_stats
 from database import SessionLocal, QuizResult, Student, Goal
 from datetime import datetime
 import json
@@ -61,33 +66,58 @@ async def generate_quiz_endpoint(request: QuizGenerationRequest):
     """
     Generate an adaptive quiz for a student in a specific subject.
     
+    With QUIZ_POOL_ENABLED, allow-listed subjects are served from the
+    pre-generated quiz pool when a quiz is ready. In QUIZ_POOL_MODE=shared
+    those quizzes are not grounded in the student's session transcripts.
+    
     Args:
         request: QuizGenerationRequest with student_id, subject, num_questions
     
     Returns:
         QuizResponse with quiz_id, questions, and metadata
     """
-    # Validate student exists
-    db = SessionLocal()
-    try:
-        student = db.query(Student).filter(Student.student_id == request.student_id).first()
-        if not student:
-            raise HTTPException(status_code=404, detail=f"Student {request.student_id} not found")
-    finally:
-        db.close()
+    # Validate student exists (cached profile; blocking on a miss, so off the event loop)
+    student = await run_in_threadpool(get_student_profile, request.student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail=f"Student {request.student_id} not found")
     
-    # Generate quiz using quiz generator service
-    try:
-        quiz_data = generate_quiz(
+    async def create_quiz() -> Dict:
+        # A pre-generated quiz at the student's difficulty is served in milliseconds
+        pooled = await run_in_threadpool(serve_pooled_quiz, request.student_id, request.subject, request.num_questions)
+        if pooled:
+            return pooled
+        # Pool miss: await retrieval, then run the blocking generation off the event loop
+        context = await retrieve_quiz_context(request.student_id, request.subject)
+        return await run_in_threadpool(
+            generate_quiz,
             student_id=request.student_id,
             subject=request.subject,
-            num_questions=request.num_questions
+            num_questions=request.num_questions,
+            context=context
         )
+    
+    # Generate quiz using quiz generator service; identical in-flight requests
+    # (double clicks, retries) share one generation and one stored quiz.
+    # Difficulty is derived from the student's quiz history, so it is the same
+    # for every request with this key.
+    try:
+        key = request_key(request.student_id, request.subject.strip().lower(), request.num_questions)
+        quiz_data = await quiz_flights.run(key, create_quiz)
         return QuizResponse(**quiz_data)
+    except LLMUnavailableError as e:
+        # Fail fast while the model is unavailable instead of queueing
+        headers = {"Retry-After": str(int(e.retry_after) + 1)} if e.retry_after else None
+        raise HTTPException(status_code=503, detail=f"Quiz generation is temporarily unavailable: {str(e)}", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating quiz: {str(e)}")
 
 
+@router.get("/pool-stats")
+def quiz_pool_stats():
+    """Pre-generated quiz pool depth per bucket and hit rate"""
+    return get_quiz_pool_stats()
+
+
 @router.post("/{quiz_id}/submit", response_model=QuizSubmissionResponse)
 async def submit_quiz(quiz_id: str, submission: QuizSubmissionRequest):
     """
@@ -142,6 +172,12 @@ async def submit_quiz(quiz_id: str, submission: QuizSubmissionRequest):
         
         db.commit()
         
+        # Completed goals drop out of the student's cached profile
+        if goal_completed:
+            student_id = db.query(Student.student_id).filter(Student.id == quiz_result.student_id).scalar()
+            if student_id:
+                invalidate_student_profile(student_id)
+        
         return QuizSubmissionResponse(
             quiz_id=quiz_id,
             score_percent=score_data["score_percent"],
@@ -149,7 +185,7 @@ async def submit_quiz(quiz_id: str, submission: QuizSubmissionRequest):
             total_questions=score_data["total_questions"],
             feedback=score_data["feedback"],
             goal_completed=goal_completed,
-            goal_id=goal_id,
+            goal_id=str(goal_id) if goal_id is not None else None,
             celebration_message=celebration_message
         )
     
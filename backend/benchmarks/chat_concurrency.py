@@ -0,0 +1,155 @@
+"""
+Chat pipeline throughput per worker: blocking vs async
+
+Runs the chat pipeline for many concurrent requests on one event loop (one
+uvicorn worker) with fake LLM clients that sleep for a fixed completion
+latency, so the numbers reflect event-loop behaviour rather than OpenAI.
+
+- "blocking" calls generate_chat_response directly inside the coroutine, as
+  the original chat() handler did: each request holds the loop for its DB
+  queries, retrieval and completion, so requests are served one at a time.
+- "async" awaits generate_chat_response_async: the profile and retrieval run
+  concurrently off the loop and the completion is awaited, so requests overlap.
+
+Uses a temporary SQLite database, the local embedding provider and the numpy
+vector store; nothing touches the network.
+
+Usage:
+    python benchmarks/chat_concurrency.py --requests 200 --concurrency 50 --latency-ms 400
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import types
+
+# Isolated storage and offline providers, set before any backend import
+_TMP_DIR = tempfile.mkdtemp(prefix="chat_concurrency_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'app.db')}"
+os.environ["VECTOR_STORE_BACKEND"] = "numpy"
+os.environ["NUMPY_STORE_PATH"] = os.path.join(_TMP_DIR, "vector_store")
+os.environ["EMBEDDING_PROVIDER"] = "local"
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+# Measure event-loop blocking, not the gateway's per-model concurrency cap
+os.environ.setdefault("LLM_MAX_CONCURRENCY_PER_MODEL", "1000")
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import registry
+
+REPLY = "What do you think happens to the electrons when sodium meets chlorine? 🤔"
+
+
+def completion(text: str):
+    message = types.SimpleNamespace(content=text)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+class FakeCompletions:
+    """Synchronous chat.completions stand-in with fixed latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def create(self, **kwargs):
+        time.sleep(self.latency)
+        return completion(REPLY)
+
+
+class FakeAsyncCompletions:
+    """Asynchronous chat.completions stand-in with fixed latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return completion(REPLY)
+
+
+def install_fake_clients(latency: float):
+    registry.override("openai_client", types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=FakeCompletions(latency))
+    ))
+    registry.override("async_openai_client", types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=FakeAsyncCompletions(latency))
+    ))
+
+
+def seed(students: int):
+    """Create students with a goal and a couple of indexed transcripts each"""
+    from database import SessionLocal, User, Student, Goal, init_db
+    from services.rag_engine import get_collection, generate_embeddings
+
+    init_db()
+    db = SessionLocal()
+    try:
+        for s in range(students):
+            user = User(email=f"student{s}@example.com", name=f"Student {s}", grade=10)
+            db.add(user)
+            db.flush()
+            student = Student(student_id=f"S{s:03d}", user_id=user.id)
+            db.add(student)
+            db.flush()
+            db.add(Goal(student_id=student.id, goal_id=f"G{s:03d}", subject="Chemistry",
+                        description="Understand ionic bonding", status="active"))
+        db.commit()
+    finally:
+        db.close()
+
+    ids, documents, metadatas = [], [], []
+    for s in range(students):
+        for t, topic in enumerate(["ionic bonds", "covalent bonds"]):
+            ids.append(f"S{s:03d}_T{t}")
+            documents.append(f"Subject: Chemistry\nTopic: {topic}\nTutor: Let's review {topic} together.")
+            metadatas.append({"student_id": f"S{s:03d}", "subject": "Chemistry", "topic": topic})
+    get_collection().upsert(ids=ids, embeddings=generate_embeddings(documents),
+                            metadatas=metadatas, documents=documents)
+
+
+async def run_mode(mode: str, requests: int, concurrency: int, students: int) -> float:
+    """Issue requests with bounded concurrency and return requests/sec"""
+    from services.ai_agent import generate_chat_response, generate_chat_response_async
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handle(i: int):
+        async with semaphore:
+            student_id = f"S{i % students:03d}"
+            message = "Can you help me with ionic bonds?"
+            if mode == "blocking":
+                result = generate_chat_response(student_id, message, [])
+            else:
+                result = await generate_chat_response_async(student_id, message, [])
+            assert result["confidence_score"] > 0, result
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handle(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="Chat requests per mode")
+    parser.add_argument("--concurrency", type=int, default=25, help="Requests in flight")
+    parser.add_argument("--latency-ms", type=float, default=400, help="Simulated completion latency")
+    parser.add_argument("--students", type=int, default=20, help="Seeded students")
+    args = parser.parse_args()
+
+    install_fake_clients(args.latency_ms / 1000)
+    seed(args.students)
+
+    print(f"🚀 {args.requests} chat requests, concurrency {args.concurrency}, "
+          f"completion latency {args.latency_ms:.0f} ms, one event loop\n")
+    results = {}
+    for mode in ("blocking", "async"):
+        results[mode] = asyncio.run(run_mode(mode, args.requests, args.concurrency, args.students))
+        print(f"{mode:<10} {results[mode]:>8.1f} req/s")
+    print(f"\nspeedup    {results['async'] / results['blocking']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
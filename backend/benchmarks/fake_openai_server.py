@@ -0,0 +1,261 @@
+"""
+Local stand-in for the OpenAI API used by the backend, for offline load testing
+
+Implements the two endpoints the backend calls:
+- POST /v1/chat/completions (plain and stream=True Server-Sent Events)
+- POST /v1/embeddings (deterministic hashed n-gram vectors, so retrieval
+  still ranks related texts together)
+
+Quiz prompts get deterministic canned quiz JSON in the generate_quiz schema,
+summary and grading prompts get short canned answers, and everything else
+gets a canned Socratic tutor reply. Latency is drawn from a configurable
+distribution, streams are paced per token, and failures (500, 429 and hung
+requests) can be injected at given rates.
+
+Point the backend at it with OPENAI_BASE_URL (any OPENAI_API_KEY, or none):
+
+Usage:
+    python benchmarks/fake_openai_server.py --port 8900 --latency lognormal:600,0.5 --error-rate 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from services.embedding_providers import HashingEmbeddingProvider
+from services.prompt_budget import count_tokens
+
+DEFAULT_EMBEDDING_DIMENSION = 1536  # text-embedding-3-small
+
+TUTOR_REPLIES = [
+    "Great question! Before I explain, what do you already know about how {topic} works? 🤔",
+    "Let's break {topic} into smaller steps. What do you think the first step should be?",
+    "You're on the right track! Can you tell me what happens if we change one part of {topic}? 💡",
+    "Think back to your last session. Which idea from it connects to {topic}?",
+    "Nice work so far! Try explaining {topic} in your own words, and I'll help fill any gaps. ✨",
+]
+QUIZ_TOPICS = ["Core concepts", "Definitions", "Applications", "Problem solving", "Review"]
+
+
+class LatencyDistribution:
+    """Latency in seconds from a spec like "fixed:400", "uniform:200,800", "normal:500,100" or "lognormal:600,0.5" (ms)"""
+
+    def __init__(self, spec: str, rng: random.Random):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",")] if params else [0.0]
+        self.rng = rng
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(self.params[0], self.params[1])
+        elif self.kind == "normal":
+            ms = self.rng.gauss(self.params[0], self.params[1])
+        else:
+            # Median and log-space sigma, the usual shape of API latencies
+            ms = self.params[0] * self.rng.lognormvariate(0.0, self.params[1])
+        return max(0.0, ms) / 1000.0
+
+
+def stable_seed(*parts) -> int:
+    return int.from_bytes(hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).digest()[:8], "big")
+
+
+def canned_quiz(prompt: str) -> str:
+    """Deterministic quiz JSON matching the schema generate_quiz asks for"""
+    count_match = re.search(r"Generate (\d+)", prompt)
+    subject_match = re.search(r"questions for (.+?) at (\w+) difficulty", prompt)
+    count = int(count_match.group(1)) if count_match else 5
+    subject = subject_match.group(1) if subject_match else "General"
+    difficulty = subject_match.group(2) if subject_match else "medium"
+    rng = random.Random(stable_seed("quiz", subject, difficulty, count))
+    questions = []
+    for i in range(1, count + 1):
+        topic = QUIZ_TOPICS[(i - 1) % len(QUIZ_TOPICS)]
+        correct = rng.choice("ABCD")
+        questions.append({
+            "id": i,
+            "question": f"{subject} ({difficulty}) question {i}: which statement about {topic.lower()} is correct?",
+            "options": [
+                f"{letter}. {'The correct statement' if letter == correct else 'A plausible distractor'} about {topic.lower()}"
+                for letter in "ABCD"
+            ],
+            "correct_answer": correct,
+            "topic": f"{topic} in {subject}",
+            "explanation": f"Option {correct} describes {topic.lower()} in {subject} accurately.",
+        })
+    return json.dumps({"questions": questions})
+
+
+def canned_reply(messages: List[Dict]) -> str:
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    if "multiple-choice questions" in prompt and "questions" in prompt.lower():
+        return canned_quiz(prompt)
+    if "running summary" in prompt:
+        return "The student reviewed key concepts with the tutor, answered guiding questions and asked for more practice."
+    if "Reply with the number only" in prompt:
+        return "4"
+    question = str(messages[-1].get("content", "")) if messages else ""
+    # The chat prompt ends with "Current Student Question: ..."
+    match = re.search(r"Current Student Question:\s*(.+)", prompt)
+    topic = (match.group(1) if match else question).strip().rstrip("?.!")[:60] or "this topic"
+    rng = random.Random(stable_seed("chat", prompt))
+    return rng.choice(TUTOR_REPLIES).format(topic=topic)
+
+
+def create_app(args) -> FastAPI:
+    rng = random.Random(args.seed)
+    chat_latency = LatencyDistribution(args.latency, rng)
+    embedding_latency = LatencyDistribution(args.embedding_latency, rng)
+    embedder = HashingEmbeddingProvider(dimension=args.dimension)
+    stats = {"chat": 0, "stream": 0, "embeddings": 0, "errors": 0, "rate_limited": 0, "hung": 0}
+
+    app = FastAPI(title="Fake OpenAI API")
+
+    async def inject_failure():
+        """Injected failure response, or None to serve the request normally"""
+        roll = rng.random()
+        if roll < args.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "Injected server error", "type": "server_error"}})
+        roll -= args.error_rate
+        if roll < args.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": "1"},
+                content={"error": {"message": "Injected rate limit", "type": "rate_limit_exceeded"}}
+            )
+        roll -= args.rate_limit_rate
+        if roll < args.hang_rate:
+            stats["hung"] += 1
+            await asyncio.sleep(args.hang_seconds)
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        failure = await inject_failure()
+        if failure is not None:
+            return failure
+
+        model = body.get("model", "gpt-4o")
+        messages = body.get("messages", [])
+        content = canned_reply(messages)
+        prompt_tokens = sum(count_tokens(str(message.get("content", ""))) for message in messages)
+        completion_tokens = count_tokens(content)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            stats["chat"] += 1
+            await asyncio.sleep(chat_latency.sample())
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+
+        stats["stream"] += 1
+
+        def chunk(delta: Dict, finish_reason=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            # Time to first token, then a steady per-token pace
+            await asyncio.sleep(chat_latency.sample())
+            yield chunk({"role": "assistant", "content": ""})
+            for piece in re.findall(r"\S+\s*", content):
+                yield chunk({"content": piece})
+                await asyncio.sleep(args.stream_token_ms / 1000.0)
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        failure = await inject_failure()
+        if failure is not None:
+            return failure
+
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        stats["embeddings"] += 1
+        await asyncio.sleep(embedding_latency.sample())
+        vectors = embedder.embed(texts) if texts else []
+        tokens = sum(count_tokens(text) for text in texts)
+        return {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(vectors)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/stats")
+    def server_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="lognormal:600,0.5",
+                        help="Chat latency (ms) before the response / first token: fixed:MS, uniform:LO,HI, "
+                             "normal:MEAN,STD or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--embedding-latency", default="lognormal:80,0.3", help="Embeddings latency (same format)")
+    parser.add_argument("--stream-token-ms", type=float, default=15, help="Delay between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share answered with HTTP 429")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Share that hang for --hang-seconds first")
+    parser.add_argument("--hang-seconds", type=float, default=60)
+    parser.add_argument("--dimension", type=int, default=DEFAULT_EMBEDDING_DIMENSION, help="Embedding dimension")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency and failure sampling")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    print(f"🚀 Fake OpenAI API on http://{args.host}:{args.port}/v1 (latency {args.latency})")
+    print(f"   export OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Offline evaluation of chat model routing: latency and cost savings vs answer quality
+
+Runs the router over a labelled set of chat turns (built in, or --turns
+JSONL with message / subject / best_distance / recent_confusion / label
+"simple" or "hard") and reports the routing mix, latency and cost against
+always using the full model, and how many hard turns were sent to the fast
+model. Per-tier latency and token counts come from the routing decision log
+(--log, default CHAT_ROUTING_LOG_PATH) when it has entries for that tier;
+otherwise they fall back to the assumed profiles below, and the report says
+which numbers are assumptions. Prices are always assumed list prices. The
+label agreement only checks the router against hand labels; it does not
+measure answer quality (use --live for that).
+
+With a log, the logged production turns themselves are also summarized:
+observed per-tier latency, tokens and confidence, their cost against
+running every turn on the full model, and how many decisions the current
+rules would change. With --live (needs OPENAI_API_KEY), every labelled turn
+is answered by both models; real latency and token usage are measured and
+the full model grades each fast answer against its own from 1 to 5.
+
+Usage:
+    python benchmarks/model_routing_eval.py
+    python benchmarks/model_routing_eval.py --log routing.jsonl
+    python benchmarks/model_routing_eval.py --live
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.model_router import CHAT_ROUTING_LOG_PATH, FAST_MODEL_NAME, FULL_MODEL_NAME, choose_tier, extract_features
+
+# Assumed list prices (USD per 1M tokens); adjust to current pricing
+MODEL_PRICES = {
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+}
+
+# Assumed serving profile per tier, used only when the routing log has no observations
+ASSUMED_TIER_PROFILES = {
+    "fast": {"latency_ms": 300 + 150 / 140 * 1000, "prompt_tokens": 600, "completion_tokens": 150},
+    "full": {"latency_ms": 450 + 150 / 80 * 1000, "prompt_tokens": 600, "completion_tokens": 150},
+}
+
+SAMPLE_TURNS = [
+    {"message": "hi!", "subject": "Chemistry", "best_distance": 0.6, "label": "simple"},
+    {"message": "thanks, that makes sense", "subject": "Algebra", "best_distance": 0.7, "label": "simple"},
+    {"message": "ok got it", "subject": "Physics", "best_distance": 0.5, "label": "simple"},
+    {"message": "What is a noun?", "subject": "English", "best_distance": 0.4, "label": "simple"},
+    {"message": "Who wrote Romeo and Juliet?", "subject": "English", "best_distance": 0.5, "label": "simple"},
+    {"message": "What does mitochondria do again?", "subject": "Biology", "best_distance": 0.3, "label": "simple"},
+    {"message": "When was the Treaty of Versailles signed?", "subject": "History", "best_distance": 0.6, "label": "simple"},
+    {"message": "Can you remind me what a thesis statement is?", "subject": "SAT Writing", "best_distance": 0.5, "label": "simple"},
+    {"message": "Why does ionic bonding happen between metals and nonmetals?", "subject": "Chemistry", "best_distance": 0.4, "label": "hard"},
+    {"message": "Solve 3x + 7 = 22 step by step", "subject": "Algebra", "best_distance": 0.5, "label": "hard"},
+    {"message": "How do I find the derivative of x^2 sin x?", "subject": "Calculus", "best_distance": 0.8, "label": "hard"},
+    {"message": "I'm confused about limiting reagents", "subject": "Chemistry", "best_distance": 0.4, "label": "hard"},
+    {"message": "What is the difference between velocity and acceleration?", "subject": "Physics", "best_distance": 0.6, "label": "hard"},
+    {"message": "What is a mole?", "subject": "Chemistry", "best_distance": 0.5, "label": "hard"},
+    {"message": "Can you help me plan my essay on climate policy, I have three sources and I'm not sure how to "
+                "connect the economic arguments with the ethical ones and still keep it under 800 words for class",
+     "subject": "English", "best_distance": 0.7, "label": "hard"},
+    {"message": "What's the main idea of the reading?", "subject": "English", "best_distance": 1.6, "label": "hard"},
+    {"message": "What is photosynthesis?", "subject": "Biology", "best_distance": 0.4, "recent_confusion": 2, "label": "hard"},
+    {"message": "Can you book a session with a tutor?", "subject": "Biology", "best_distance": 0.4, "label": "hard"},
+]
+
+
+def route_turn(turn: Dict) -> Dict:
+    """Routing decision for a labelled turn (retrieval and signals are simulated from the turn fields)"""
+    context = [{"distance": turn["best_distance"]}] if turn.get("best_distance") is not None else []
+    signals = {"recent_flags": [1] * turn.get("recent_confusion", 0)}
+    features = extract_features(turn["message"], context, [], signals, turn.get("subject"))
+    tier, reason = choose_tier(features)
+    return {"tier": tier, "reason": reason, "model": FAST_MODEL_NAME if tier == "fast" else FULL_MODEL_NAME}
+
+
+def tier_model(tier: str) -> str:
+    return FAST_MODEL_NAME if tier == "fast" else FULL_MODEL_NAME
+
+
+def cost(model: str, prompt_tokens: float, completion_tokens: float) -> float:
+    prices = MODEL_PRICES[model]
+    return (prompt_tokens * prices["input"] + completion_tokens * prices["output"]) / 1_000_000
+
+
+def load_log(path: Optional[str]) -> List[Dict]:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def observed_profiles(entries: List[Dict]) -> Dict[str, Dict]:
+    """Per-tier median latency and mean tokens of logged turns (tiers without observations are omitted)"""
+    profiles = {}
+    for tier in ("fast", "full"):
+        observed = [
+            entry for entry in entries
+            if entry["tier"] == tier and entry.get("latency_ms") is not None and entry.get("completion_tokens") is not None
+        ]
+        if observed:
+            profiles[tier] = {
+                "latency_ms": statistics.median(entry["latency_ms"] for entry in observed),
+                "prompt_tokens": statistics.mean(entry["prompt_tokens"] for entry in observed),
+                "completion_tokens": statistics.mean(entry["completion_tokens"] for entry in observed),
+                "turns": len(observed),
+            }
+    return profiles
+
+
+def tier_profiles(entries: List[Dict]) -> Dict[str, Dict]:
+    """Observed profile per tier where available, otherwise the assumed one (marked "assumed")"""
+    observed = observed_profiles(entries)
+    return {
+        tier: {**observed[tier], "assumed": False} if tier in observed else {**ASSUMED_TIER_PROFILES[tier], "assumed": True}
+        for tier in ("fast", "full")
+    }
+
+
+def describe_source(profile: Dict) -> str:
+    if profile["assumed"]:
+        return "ASSUMED (no logged turns)"
+    return f"observed over {profile['turns']} logged turns"
+
+
+def evaluate_offline(turns: List[Dict], entries: List[Dict]):
+    profiles = tier_profiles(entries)
+    decisions = [route_turn(turn) for turn in turns]
+
+    fast = [d for d in decisions if d["tier"] == "fast"]
+    hard_to_fast = [t["message"] for t, d in zip(turns, decisions) if d["tier"] == "fast" and t.get("label") == "hard"]
+    simple = [t for t in turns if t.get("label") == "simple"]
+    simple_to_fast = sum(1 for t, d in zip(turns, decisions) if d["tier"] == "fast" and t.get("label") == "simple")
+
+    def turn_cost(tier: str, model: str) -> float:
+        # Token counts of the routed tier, priced for the given model
+        return cost(model, profiles[tier]["prompt_tokens"], profiles[tier]["completion_tokens"])
+
+    mean_latency = statistics.mean(profiles[d["tier"]]["latency_ms"] for d in decisions)
+    total_cost = sum(turn_cost(d["tier"], d["model"]) for d in decisions)
+    baseline_cost = sum(turn_cost(d["tier"], FULL_MODEL_NAME) for d in decisions)
+    assumed = any(profile["assumed"] for profile in profiles.values())
+
+    print(f"🚀 Routing {len(turns)} labelled turns (figures below use this sample's routing mix)\n")
+    for turn, decision in zip(turns, decisions):
+        print(f"  {decision['tier']:>4}  {decision['reason']:<26} [{turn.get('label', '?'):>6}] {turn['message'][:60]}")
+    print()
+    for tier in ("fast", "full"):
+        profile = profiles[tier]
+        print(f"{tier} tier profile     {profile['latency_ms']:>6.0f} ms, {profile['prompt_tokens']:.0f} prompt / "
+              f"{profile['completion_tokens']:.0f} output tokens  -- {describe_source(profile)}")
+    print("prices                ASSUMED list prices (MODEL_PRICES)")
+    print()
+    print(f"fast share            {len(fast) / len(turns):>8.0%}")
+    print(f"mean latency          {mean_latency:>8.0f} ms   (always {FULL_MODEL_NAME}: {profiles['full']['latency_ms']:.0f} ms)")
+    print(f"cost per 1k turns     ${total_cost / len(turns) * 1000:>7.3f}   (always {FULL_MODEL_NAME}: "
+          f"${baseline_cost / len(turns) * 1000:.3f}, saving {1 - total_cost / baseline_cost:.0%})")
+    if simple:
+        print(f"simple turns on fast  {simple_to_fast}/{len(simple)}")
+    print(f"hard turns on fast    {len(hard_to_fast)}")
+    for message in hard_to_fast:
+        print(f"    - {message}")
+    print()
+    if assumed:
+        print("⚠️  Latency/token figures above are partly ASSUMED, not measured; record a routing log "
+              "(CHAT_ROUTING_LOG_PATH) and pass --log to use observed numbers.")
+    print("⚠️  Label agreement is the router against hand labels on this sample, not answer quality and "
+          "not the production traffic mix; use --live to grade answers.")
+
+
+def evaluate_log(entries: List[Dict], path: str):
+    """Summarize logged production turns and replay them through the current rules"""
+    changed = sum(1 for entry in entries if choose_tier(entry["features"])[0] != entry["tier"])
+    print(f"🚀 {len(entries)} logged decisions from {path}\n")
+    for tier in ("fast", "full"):
+        tier_entries = [entry for entry in entries if entry["tier"] == tier]
+        if not tier_entries:
+            continue
+        latencies = [entry["latency_ms"] for entry in tier_entries if entry.get("latency_ms") is not None]
+        confidences = [entry["confidence_score"] for entry in tier_entries if entry.get("confidence_score") is not None]
+        handoffs = sum(1 for entry in tier_entries if entry.get("should_handoff"))
+        print(f"{tier:>4}: {len(tier_entries):>6} turns  "
+              f"p50 {statistics.median(latencies) if latencies else 0:>7.0f} ms  "
+              f"mean confidence {statistics.mean(confidences) if confidences else 0:.2f}  "
+              f"handoffs {handoffs / len(tier_entries):.1%}")
+
+    # Logged token counts priced per model; the all-full baseline reuses each turn's tokens
+    priced = [entry for entry in entries if entry.get("completion_tokens") is not None and entry.get("model") in MODEL_PRICES]
+    if priced:
+        routed_cost = sum(cost(entry["model"], entry["prompt_tokens"], entry["completion_tokens"]) for entry in priced)
+        full_cost = sum(cost(FULL_MODEL_NAME, entry["prompt_tokens"], entry["completion_tokens"]) for entry in priced)
+        print(f"\ncost of {len(priced)} logged turns  ${routed_cost:.4f}   (same tokens all on {FULL_MODEL_NAME}: "
+              f"${full_cost:.4f}, saving {1 - routed_cost / full_cost:.0%}; ASSUMED list prices)")
+    else:
+        print("\nno token counts in the log (older entries); cost not computed")
+    print(f"decisions the current rules would change: {changed}")
+
+
+def evaluate_live(turns: List[Dict]):
+    """Answer every turn with both models and grade the fast answers"""
+    from services.llm_gateway import chat_completion
+
+    def answer(model: str, turn: Dict):
+        start = time.perf_counter()
+        response = chat_completion(
+            model=model,
+            messages=[
+                {"role": "system", "content": f"You are a friendly {turn.get('subject', 'General')} tutor for a high school student."},
+                {"role": "user", "content": turn["message"]},
+            ],
+            temperature=0.7,
+            max_tokens=300
+        )
+        usage = response.usage
+        return (
+            response.choices[0].message.content.strip(),
+            (time.perf_counter() - start) * 1000,
+            cost(model, usage.prompt_tokens, usage.completion_tokens)
+        )
+
+    def grade(turn: Dict, reference: str, candidate: str) -> Optional[int]:
+        """Grade from 1 to 5, or None if the grader's reply has no grade"""
+        response = chat_completion(
+            model=FULL_MODEL_NAME,
+            messages=[{"role": "user", "content": (
+                f"Student question: {turn['message']}\n\nReference tutor answer:\n{reference}\n\n"
+                f"Candidate tutor answer:\n{candidate}\n\nRate the candidate from 1 (wrong or unhelpful) to 5 "
+                f"(as good as the reference). Reply with the number only."
+            )}],
+            temperature=0,
+            max_tokens=2
+        )
+        digits = [c for c in response.choices[0].message.content or "" if c in "12345"]
+        return int(digits[0]) if digits else None
+
+    print(f"🚀 Live evaluation of {len(turns)} turns ({FAST_MODEL_NAME} vs {FULL_MODEL_NAME})\n")
+    rows = []
+    for turn in turns:
+        decision = route_turn(turn)
+        fast_text, fast_ms, fast_cost = answer(FAST_MODEL_NAME, turn)
+        full_text, full_ms, full_cost = answer(FULL_MODEL_NAME, turn)
+        score = grade(turn, full_text, fast_text)
+        rows.append((decision, fast_ms, fast_cost, full_ms, full_cost, score))
+        print(f"  {decision['tier']:>4}  grade {score if score is not None else '?'}  fast {fast_ms:>6.0f} ms  full {full_ms:>6.0f} ms  {turn['message'][:50]}")
+
+    routed_ms = [fast_ms if d["tier"] == "fast" else full_ms for d, fast_ms, _, full_ms, _, _ in rows]
+    routed_cost = sum(fast_cost if d["tier"] == "fast" else full_cost for d, _, fast_cost, _, full_cost, _ in rows)
+    full_cost_total = sum(row[4] for row in rows)
+    fast_rows = [row for row in rows if row[0]["tier"] == "fast"]
+    fast_grades = [row[5] for row in fast_rows if row[5] is not None]
+    ungraded = len(fast_rows) - len(fast_grades)
+    print()
+    print(f"mean latency   routed {statistics.mean(routed_ms):.0f} ms, always {FULL_MODEL_NAME} "
+          f"{statistics.mean(row[3] for row in rows):.0f} ms")
+    print(f"cost           routed ${routed_cost:.4f}, always {FULL_MODEL_NAME} ${full_cost_total:.4f}")
+    if fast_grades:
+        print(f"fast-routed answer grade   mean {statistics.mean(fast_grades):.2f} / 5, "
+              f"{sum(1 for g in fast_grades if g <= 3)} of {len(fast_grades)} at 3 or below")
+    if ungraded:
+        print(f"ungraded (grader reply had no 1-5 grade, excluded above): {ungraded} of {len(fast_rows)} fast-routed turns")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", help="JSONL of labelled turns (default: built-in sample)")
+    parser.add_argument("--log", default=CHAT_ROUTING_LOG_PATH or None,
+                        help="Routing decision log with observed latency and tokens (default: CHAT_ROUTING_LOG_PATH)")
+    parser.add_argument("--live", action="store_true", help="Call both models and grade answers (needs OPENAI_API_KEY)")
+    args = parser.parse_args()
+
+    entries = load_log(args.log)
+    if args.log and not entries:
+        print(f"Routing log {args.log} is missing or empty\n")
+
+    if args.turns:
+        with open(args.turns, encoding="utf-8") as f:
+            turns = [json.loads(line) for line in f if line.strip()]
+    else:
+        turns = SAMPLE_TURNS
+
+    if args.live:
+        evaluate_live(turns)
+    else:
+        if entries:
+            evaluate_log(entries, args.log)
+            print()
+        evaluate_offline(turns, entries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Import and boot latency benchmark for the backend
+
+Each measurement runs in a fresh interpreter so module caches don't hide
+cold-start cost. "import" times a bare import of each module; "boot" imports
+main and runs the FastAPI lifespan startup (database, vector store and LLM
+client initialization).
+
+Usage:
+    python benchmarks/startup_time.py --runs 5
+    python benchmarks/startup_time.py --importtime services.rag_engine
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "database",
+    "services.rag_engine",
+    "services.ai_agent",
+    "services.quiz_generator",
+    "main",
+]
+
+IMPORT_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+BOOT_SNIPPET = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(boot())
+print(json.dumps({"seconds": time.perf_counter() - start, "import_seconds": imported - start}))
+"""
+
+
+def run_snippet(snippet: str) -> dict:
+    """Run a snippet in a fresh interpreter from the backend directory"""
+    completed = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "failed")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(label: str, samples: list):
+    values_ms = [value * 1000 for value in samples]
+    print(f"{label:<32} median {statistics.median(values_ms):>8.1f} ms   "
+          f"min {min(values_ms):>8.1f} ms   max {max(values_ms):>8.1f} ms")
+
+
+def show_importtime(module: str, top: int):
+    """Print the slowest imports (cumulative) reported by python -X importtime"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_part, cumulative_us, name = [part.strip() for part in line.split("|")]
+        rows.append((int(cumulative_us), int(self_part.split(":")[-1]), name))
+    print(f"Slowest imports for {module} (cumulative):")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:>8.1f} ms  (self {self_us / 1000:>6.1f} ms)  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--importtime", metavar="MODULE", help="Show the slowest imports of MODULE and exit")
+    parser.add_argument("--top", type=int, default=15, help="Rows to show with --importtime")
+    args = parser.parse_args()
+
+    if args.importtime:
+        show_importtime(args.importtime, args.top)
+        return
+
+    print(f"🚀 Startup latency ({args.runs} fresh interpreters each)\n")
+    for module in MODULES:
+        try:
+            samples = [run_snippet(IMPORT_SNIPPET.format(module=module))["seconds"] for _ in range(args.runs)]
+            summarize(f"import {module}", samples)
+        except RuntimeError as e:
+            print(f"{'import ' + module:<32} failed: {e}")
+
+    try:
+        results = [run_snippet(BOOT_SNIPPET) for _ in range(args.runs)]
+        summarize("boot (import + lifespan)", [result["seconds"] for result in results])
+    except RuntimeError as e:
+        print(f"boot failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
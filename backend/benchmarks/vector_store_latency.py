@@ -0,0 +1,119 @@
+"""
+Per-student query latency: ChromaDB where-filter vs partitioned NumPy store
+
+Builds a synthetic corpus (students x transcripts per student, random unit
+vectors), loads it into both backends in temporary directories and times
+filtered top-k queries for random students. ChromaDB is skipped if it is
+not installed.
+
+Usage:
+    python benchmarks/vector_store_latency.py --students 500 --per-student 20 --dimension 1536
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_store import PartitionedVectorStore
+
+
+def make_corpus(students: int, per_student: int, dimension: int, seed: int) -> Dict[str, List]:
+    """Random unit vectors with student_id metadata"""
+    rng = np.random.default_rng(seed)
+    total = students * per_student
+    vectors = rng.standard_normal((total, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids, metadatas, documents = [], [], []
+    for s in range(students):
+        for t in range(per_student):
+            ids.append(f"s{s:05d}_t{t:03d}")
+            metadatas.append({"student_id": f"S{s:05d}", "transcript_id": f"s{s:05d}_t{t:03d}"})
+            documents.append(f"Transcript {t} for student {s}")
+    return {"ids": ids, "embeddings": vectors.tolist(), "metadatas": metadatas, "documents": documents}
+
+
+def load(collection, corpus: Dict[str, List], batch_size: int = 5000) -> float:
+    """Insert the corpus in batches and return elapsed seconds"""
+    start = time.perf_counter()
+    for offset in range(0, len(corpus["ids"]), batch_size):
+        collection.add(**{key: values[offset:offset + batch_size] for key, values in corpus.items()})
+    return time.perf_counter() - start
+
+
+def time_queries(query_fn: Callable, queries: np.ndarray, student_ids: List[str]) -> List[float]:
+    """Run one filtered query per (vector, student) and return latencies in ms"""
+    latencies = []
+    for vector, student_id in zip(queries, student_ids):
+        start = time.perf_counter()
+        query_fn(vector, student_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name: str, load_seconds: float, latencies: List[float], total: int):
+    values = np.asarray(latencies)
+    print(f"{name:<12} load {total / load_seconds:>9.0f} vec/s   "
+          f"p50 {np.percentile(values, 50):>8.3f} ms   "
+          f"p95 {np.percentile(values, 95):>8.3f} ms   "
+          f"p99 {np.percentile(values, 99):>8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=200, help="Number of students")
+    parser.add_argument("--per-student", type=int, default=20, help="Transcripts per student")
+    parser.add_argument("--dimension", type=int, default=1536, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=500, help="Number of timed queries")
+    parser.add_argument("--top-k", type=int, default=3, help="Results per query")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.students, args.per_student, args.dimension, args.seed)
+    total = len(corpus["ids"])
+    rng = np.random.default_rng(args.seed + 1)
+    queries = rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+    student_ids = [f"S{s:05d}" for s in rng.integers(0, args.students, args.queries)]
+
+    print(f"🚀 {total} vectors ({args.students} students x {args.per_student}), "
+          f"dim {args.dimension}, {args.queries} queries, top_k {args.top_k}\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PartitionedVectorStore(Path(tmp) / "numpy", partition_key="student_id")
+        load_seconds = load(store, corpus)
+        latencies = time_queries(
+            lambda vector, student_id: store.query(
+                query_embeddings=[vector], n_results=args.top_k, where={"student_id": student_id}
+            ),
+            queries, student_ids
+        )
+        report("numpy", load_seconds, latencies, total)
+
+        try:
+            import chromadb
+            from chromadb.config import Settings
+        except ImportError:
+            print("chroma       skipped (chromadb not installed)")
+            return
+
+        client = chromadb.PersistentClient(path=str(Path(tmp) / "chroma"), settings=Settings(anonymized_telemetry=False))
+        collection = client.create_collection(name="benchmark")
+        load_seconds = load(collection, corpus)
+        latencies = time_queries(
+            lambda vector, student_id: collection.query(
+                query_embeddings=[vector.tolist()], n_results=args.top_k, where={"student_id": student_id}
+            ),
+            queries, student_ids
+        )
+        report("chroma", load_seconds, latencies, total)
+
+
+if __name__ == "__main__":
+    main()
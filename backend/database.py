@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, JSON, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, JSON, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -54,9 +54,47 @@ class Conversation(Base):
     duration_minutes = Column(Integer, default=0)
     message_count = Column(Integer, default=0)
     transcript_reference = Column(String, nullable=True)
-    messages = Column(JSON, default=[])
+    messages = Column(JSON, default=[])  # Legacy blob; chat turns live in ConversationMessage
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class ConversationMessage(Base):
+    __tablename__ = "conversation_messages"
+    __table_args__ = (
+        Index("ix_conversation_messages_conversation_seq", "conversation_id", "seq", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer)  # Foreign key to Conversation.id
+    seq = Column(Integer)  # 1-based position within the conversation
+    role = Column(String)
+    content = Column(Text)
+    confidence_score = Column(Float, nullable=True)
+    should_handoff = Column(Boolean, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ConversationSummary(Base):
+    __tablename__ = "conversation_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, unique=True, index=True)  # Foreign key to Conversation.id
+    summary = Column(Text)
+    summarized_through_seq = Column(Integer, default=0)  # Last ConversationMessage.seq folded in
+    model = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ConversationSignalState(Base):
+    __tablename__ = "conversation_signal_states"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, unique=True, index=True)  # Foreign key to Conversation.id
+    recent_flags = Column(JSON, default=[])  # 1 per recent message that was a confused user message
+    user_messages = Column(Integer, default=0)
+    confusion_messages = Column(Integer, default=0)
+    booking_requests = Column(Integer, default=0)
+    handoffs = Column(Integer, default=0)
+    last_handoff_reason = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class Goal(Base):
     __tablename__ = "goals"
     
@@ -89,6 +127,33 @@ class QuizResult(Base):
     answers = Column(JSON, default={})
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class QuizPoolEntry(Base):
+    __tablename__ = "quiz_pool_entries"
+    __table_args__ = (
+        Index("ix_quiz_pool_entries_bucket", "bucket", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bucket = Column(String)  # subject|difficulty|num_questions[|student_id]
+    subject = Column(String)
+    difficulty = Column(String)
+    num_questions = Column(Integer)
+    student_id = Column(String, nullable=True)  # Set for personalized (per-student) pools
+    questions = Column(JSON, default=[])
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class QuizPoolBucket(Base):
+    __tablename__ = "quiz_pool_buckets"
+    
+    bucket = Column(String, primary_key=True)  # Same key as QuizPoolEntry.bucket
+    subject = Column(String)
+    difficulty = Column(String)
+    num_questions = Column(Integer)
+    student_id = Column(String, nullable=True)
+    last_requested = Column(DateTime, default=datetime.utcnow)
+    refill_owner = Column(String, nullable=True)  # Worker currently refilling the bucket
+    refill_lease_until = Column(DateTime, nullable=True)
+
 class NudgeLog(Base):
     __tablename__ = "nudge_logs"
     
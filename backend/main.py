@@ -1,23 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import os
-from database import init_db
+from services import registry
+from services.conversation_writer import conversation_writer
+from services.quiz_pool import quiz_pool, QUIZ_POOL_ENABLED
 from api.chat import router as chat_router
 from api.quiz import router as quiz_router
 from api.dashboard import router as dashboard_router
 
-# Load environment variables
-load_dotenv()
 
-# Initialize database
-init_db()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Initialize database, vector store and LLM clients once per worker
+    await run_in_threadpool(registry.warm_up)
+    # Start topping up the pre-generated quiz pool
+    if QUIZ_POOL_ENABLED:
+        await run_in_threadpool(quiz_pool.start)
+    yield
+    await run_in_threadpool(quiz_pool.stop)
+    # Write chat turns still queued for write-behind persistence
+    await run_in_threadpool(conversation_writer.shutdown)
+
 
 # Create FastAPI app
 app = FastAPI(
     title="AI Study Companion API",
     description="API for AI-powered tutoring companion",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -48,6 +61,12 @@ def health_check():
         "environment": "development"
     }
 
+# Readiness endpoint (shared services initialized)
+@app.get("/ready")
+def readiness_check():
+    status = registry.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 # Root endpoint
 @app.get("/")
 def root():
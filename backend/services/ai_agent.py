@@ -1,142 +1,215 @@
 """
 AI Agent service using LangChain for conversational AI with context retrieval
 """
+import asyncio
 import os
-from typing import List, Dict, Optional, Tuple
-from openai import OpenAI
-from dotenv import load_dotenv
-from services.rag_engine import retrieve_context
-from database import SessionLocal, Student, Goal, Conversation, User
-
-load_dotenv()
-
-# Initialize OpenAI client
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY environment variable must be set")
-openai_client = OpenAI(api_key=api_key)
+import time
+from typing import Any, List, Dict, Iterator, Optional, Tuple
+from services.llm_gateway import chat_completion, chat_completion_async, stream_chat_completion
+from services.rag_engine import embed_query_async, retrieve_context, retrieve_context_async
+from services.student_cache import get_student_profile
+from services.handoff_signals import FRUSTRATION_THRESHOLD, scan_message, window_from_history
+from services.prompt_budget import PromptTokenStats, TokenBudget, count_tokens, truncate_to_tokens
+from services.semantic_cache import SemanticResponseCache
+from services.model_router import route_chat_turn, routing_log
 
 # Model configuration
-MODEL_NAME = "gpt-4o"
 MAX_HISTORY_LENGTH = 10  # Store last 10 messages
 
+# Prompt token budget: sections are filled in priority order (profile, goals,
+# RAG context, history) so lower-priority sections are trimmed first
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+MAX_QUERY_TOKENS = 500  # Longer questions are truncated
+MAX_PASSAGE_TOKENS = 150  # Per retrieved passage in chunk mode
+MAX_SUMMARY_TOKENS = 75  # Per session summary in document mode
+MAX_HISTORY_MESSAGE_TOKENS = 200  # Long pasted messages are truncated
+MAX_CONVERSATION_SUMMARY_TOKENS = 300  # Rolling summary of earlier turns
+
+prompt_token_stats = PromptTokenStats()
+
+# Opt-in semantic response cache for repeated questions early in a conversation
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_MAX_HISTORY = 2  # Answers depend on the conversation; only serve them near its start
+
+semantic_response_cache = SemanticResponseCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS
+)
+
 
 def get_student_info(student_id: str) -> Optional[Dict]:
-    """Retrieve student information from database"""
-    db = SessionLocal()
-    try:
-        student = db.query(Student).filter(Student.student_id == student_id).first()
-        if not student:
-            return None
-        
-        # Get user info
-        user = db.query(User).filter(User.id == student.user_id).first()
-        
-        # Get current goals
-        goals = db.query(Goal).filter(
-            Goal.student_id == student.id,
-            Goal.status == "active"
-        ).all()
-        
-        return {
-            "student_id": student.student_id,
-            "name": user.name if user else "Student",
-            "grade": user.grade if user else None,
-            "engagement_level": student.engagement_level,
-            "avg_quiz_score": student.avg_quiz_score,
-            "current_goals": [
-                {
-                    "subject": goal.subject,
-                    "description": goal.description,
-                    "progress_percent": goal.progress_percent
-                }
-                for goal in goals
-            ]
-        }
-    finally:
-        db.close()
+    """Retrieve student profile and active goals (cached, see services/student_cache.py)"""
+    return get_student_profile(student_id)
+
+
+async def get_student_info_async(student_id: str) -> Optional[Dict]:
+    """get_student_info on a worker thread so the blocking DB queries don't stall the event loop"""
+    return await asyncio.to_thread(get_student_info, student_id)
+
+
+async def retrieve_chat_context(student_id: str, message: str) -> List[Dict]:
+    """Retrieve RAG context for a chat message without blocking the event loop"""
+    return await retrieve_context_async(message, student_id, top_k=3)
 
 
 def build_prompt_template(
     student_info: Dict,
     query: str,
     context: List[Dict],
-    history: List[Dict]
+    history: List[Dict],
+    summary: Optional[str] = None
 ) -> str:
-    """Build comprehensive prompt with student context, RAG results, and conversation history"""
+    """
+    Build comprehensive prompt with student context, RAG results, and conversation history
+    
+    The prompt is kept within PROMPT_TOKEN_BUDGET: the system prompt, question
+    and student profile are always included, then goals, the rolling
+    conversation summary, RAG context and history (newest first) fill what is
+    left. Per-section token counts are recorded in prompt_token_stats.
+    """
+    budget = TokenBudget(PROMPT_TOKEN_BUDGET)
+    trimmed = []
+    
+    # System prompt
+    system_prompt = """You are an AI Study Companion, a supportive tutoring assistant that helps students learn through Socratic dialogue and guided questions.
+
+Your role:
+- Remember what the student has learned from previous sessions (using the context provided)
+- Ask leading questions to guide understanding rather than giving direct answers
+- Provide hints and encouragement when students are struggling
+- Reference previous learning when relevant
+- Keep responses concise and engaging (2-3 sentences typically)
+- If the student seems frustrated or explicitly requests human help, acknowledge this and suggest booking a session
+
+Tone: Friendly, encouraging, and patient. Use emojis sparingly (1-2 per response max)."""
+    budget.spend(system_prompt)
+    
+    # Question and response instructions
+    if count_tokens(query) > MAX_QUERY_TOKENS:
+        query = truncate_to_tokens(query, MAX_QUERY_TOKENS)
+        trimmed.append("question")
+    question_section = f"""Current Student Question: {query}
+
+Please provide a helpful, contextual response that:
+1. References relevant previous learning if applicable
+2. Guides the student with questions rather than giving direct answers
+3. Relates to their current goals if relevant
+4. Keeps the response concise and encouraging
+
+Response:"""
+    budget.spend(question_section)
     
     # Student information section
-    student_section = f"""
+    student_section = budget.spend(f"""
 Student Information:
 - Name: {student_info.get('name', 'Student')}
 - Grade: {student_info.get('grade', 'N/A')}
 - Engagement Level: {student_info.get('engagement_level', 'moderate')}
 - Average Quiz Score: {student_info.get('avg_quiz_score', 0):.1f}%
-"""
+""")
     
     # Current goals section
     goals = student_info.get('current_goals', [])
     if goals:
-        goals_section = "\nCurrent Learning Goals:\n"
-        for goal in goals:
-            goals_section += f"- {goal['subject']}: {goal['description']} ({goal['progress_percent']:.0f}% complete)\n"
+        goals_section = budget.spend("\nCurrent Learning Goals:\n")
+        for index, goal in enumerate(goals):
+            line = f"- {goal['subject']}: {goal['description']} ({goal['progress_percent']:.0f}% complete)\n"
+            if not budget.fits(line):
+                goals_section += budget.spend(f"- ({len(goals) - index} more not shown)\n")
+                trimmed.append("goals")
+                break
+            goals_section += budget.spend(line)
     else:
-        goals_section = "\nCurrent Learning Goals: None set\n"
+        goals_section = budget.spend("\nCurrent Learning Goals: None set\n")
+    
+    # Rolling summary of the turns no longer included verbatim
+    summary_section = ""
+    if summary:
+        fitted = budget.take(summary, MAX_CONVERSATION_SUMMARY_TOKENS)
+        if fitted is None:
+            trimmed.append("summary")
+        else:
+            summary_section = budget.spend("\nEarlier in This Conversation (summary):\n") + fitted + budget.spend("\n")
     
     # RAG context section
     if context:
-        context_section = "\nRelevant Previous Session Context:\n"
+        context_section = budget.spend("\nRelevant Previous Session Context:\n")
         for i, ctx in enumerate(context[:3], 1):  # Top 3 results
             metadata = ctx.get('metadata', {})
-            context_section += f"\n{i}. Subject: {metadata.get('subject', 'N/A')}, Topic: {metadata.get('topic', 'N/A')}\n"
-            context_section += f"   Summary: {ctx.get('document', '')[:300]}...\n"
+            header = f"\n{i}. Subject: {metadata.get('subject', 'N/A')}, Topic: {metadata.get('topic', 'N/A')}\n"
+            if not budget.fits(header):
+                trimmed.append("context")
+                break
+            context_section += budget.spend(header)
+            passages = ctx.get('passages')
+            if passages:
+                # Chunk mode: only the most relevant passages of the session
+                pieces = [("   Excerpt: ", passage, MAX_PASSAGE_TOKENS) for passage in passages]
+            else:
+                pieces = [("   Summary: ", ctx.get('document', ''), MAX_SUMMARY_TOKENS)]
+            for label, text, max_tokens in pieces:
+                available = budget.remaining - count_tokens(label) - 1
+                if available < min(max_tokens, count_tokens(text)):
+                    trimmed.append("context")
+                fitted = budget.take(text, min(max_tokens, available))
+                if fitted is None:
+                    break
+                context_section += budget.spend(label) + fitted + budget.spend("\n")
     else:
-        context_section = "\nRelevant Previous Session Context: None found\n"
+        context_section = budget.spend("\nRelevant Previous Session Context: None found\n")
     
-    # Conversation history section
-    if history:
-        history_section = "\nRecent Conversation History:\n"
-        for msg in history[-MAX_HISTORY_LENGTH:]:  # Last 10 messages
+    # Conversation history section, newest messages first until the budget runs out
+    recent_history = history[-MAX_HISTORY_LENGTH:]  # Last 10 messages
+    if recent_history:
+        header = budget.spend("\nRecent Conversation History:\n")
+        lines = []
+        for msg in reversed(recent_history):
             role = msg.get('role', 'user')
             content = msg.get('content', '')
-            history_section += f"{role.title()}: {content}\n"
+            prefix = f"{role.title()}: "
+            fitted = budget.take(content, min(MAX_HISTORY_MESSAGE_TOKENS, budget.remaining - count_tokens(prefix)))
+            if fitted is None:
+                break
+            lines.append(budget.spend(prefix) + fitted + "\n")
+        if len(lines) < len(recent_history):
+            trimmed.append("history")
+            lines.append("(earlier messages omitted)\n")
+        history_section = header + "".join(reversed(lines))
     else:
         history_section = "\nRecent Conversation History: This is the start of the conversation.\n"
     
-    # System prompt
-    system_prompt = """You are an AI Study Companion, a supportive tutoring assistant that helps students learn through Socratic dialogue and guided questions.
-
-Your role:
-- Remember what the student has learned from previous sessions (using the context provided)
-- Ask leading questions to guide understanding rather than giving direct answers
-- Provide hints and encouragement when students are struggling
-- Reference previous learning when relevant
-- Keep responses concise and engaging (2-3 sentences typically)
-- If the student seems frustrated or explicitly requests human help, acknowledge this and suggest booking a session
-
-Tone: Friendly, encouraging, and patient. Use emojis sparingly (1-2 per response max)."""
-    
     # Combine into full prompt
     full_prompt = f"""{system_prompt}
 
 {student_section}
 {goals_section}
+{summary_section}
 {context_section}
 {history_section}
 
-Current Student Question: {query}
-
-Please provide a helpful, contextual response that:
-1. References relevant previous learning if applicable
-2. Guides the student with questions rather than giving direct answers
-3. Relates to their current goals if relevant
-4. Keeps the response concise and encouraging
-
-Response:"""
+{question_section}"""
+    
+    prompt_token_stats.record({
+        "system": count_tokens(system_prompt),
+        "profile": count_tokens(student_section),
+        "goals": count_tokens(goals_section),
+        "summary": count_tokens(summary_section),
+        "context": count_tokens(context_section),
+        "history": count_tokens(history_section),
+        "question": count_tokens(question_section),
+        "total": count_tokens(full_prompt),
+    }, trimmed_sections=dict.fromkeys(trimmed))
     
     return full_prompt
 
 
+def get_prompt_token_stats() -> Dict:
+    """Per-section token counts of the prompts built so far in this process"""
+    return prompt_token_stats.stats()
+
+
 def calculate_confidence_score(response: str, context: List[Dict]) -> float:
     """Calculate confidence score based on response quality and context availability"""
     # Base confidence
@@ -161,11 +234,16 @@ def calculate_confidence_score(response: str, context: List[Dict]) -> float:
 def detect_handoff_trigger(
     message: str,
     history: List[Dict],
-    confidence: float
+    confidence: float,
+    signals: Optional[Dict] = None
 ) -> Tuple[bool, str]:
     """
     Detect if human handoff should be triggered
     
+    Phrase matching is a single compiled-regex pass over the current message;
+    the frustration window comes from the conversation's stored signal state
+    when available, otherwise from the last messages of history.
+    
     Returns:
         (should_handoff: bool, reason: str)
     """
@@ -173,48 +251,168 @@ def detect_handoff_trigger(
     if confidence < 0.6:
         return True, "I'm not completely confident in my answer. Let me connect you with a human tutor who can provide more detailed help."
     
+    matched = scan_message(message)
+    
     # Explicit booking requests
-    booking_keywords = [
-        "book a session", "book session", "schedule a tutor", "schedule tutor",
-        "need a tutor", "want a tutor", "human tutor", "book me", "schedule me"
-    ]
-    message_lower = message.lower()
-    if any(keyword in message_lower for keyword in booking_keywords):
+    if matched["booking"]:
         return True, "I'd be happy to help you book a session with a tutor! Let me connect you."
     
     # Immediate frustration detection from current message
-    confusion_keywords = [
-        "confused", "don't understand", "dont understand", "don't get it", "dont get it",
-        "not getting it", "stuck", "lost", "no idea", "have no idea", "i have no idea",
-        "i'm not sure", "im not sure", "i am not sure", "i'm lost", "i feel lost",
-        "i'm clueless", "no clue", "not sure what to do"
-    ]
-    if any(keyword in message_lower for keyword in confusion_keywords):
+    if matched["confusion"]:
         return True, "I hear you're feeling stuck. Let me connect you with a human tutor who can walk through this with you."
     
-    # Frustration detection (3+ signals in recent history including current message)
-    if len(history) >= 1:
-        recent_messages = history[-5:]  # Last 5 messages
-        confusion_count = 0
-        for msg in recent_messages:
-            if msg.get('role') == 'user':
-                content = msg.get('content', '').lower()
-                if any(phrase in content for phrase in confusion_keywords):
-                    confusion_count += 1
-        # Include current message in the count as well
-        if any(keyword in message_lower for keyword in confusion_keywords):
-            confusion_count += 1
-        
-        if confusion_count >= 3:
-            return True, "I notice you've been feeling confused. Let me connect you with a human tutor who can provide more personalized guidance."
+    # Frustration detection (3+ confused user messages among the recent messages)
+    recent_flags = signals["recent_flags"] if signals else window_from_history(history)
+    if sum(recent_flags) >= FRUSTRATION_THRESHOLD:
+        return True, "I notice you've been feeling confused. Let me connect you with a human tutor who can provide more personalized guidance."
     
     return False, ""
 
 
+def build_chat_messages(prompt: str) -> List[Dict]:
+    """Chat completion messages for a built prompt"""
+    return [
+        {"role": "system", "content": "You are an AI Study Companion, a supportive tutoring assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def usage_tokens(messages: List[Dict], ai_response: str, response: Any = None) -> Dict:
+    """Prompt/completion tokens of one completion: reported usage when present, else local counts"""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+    return {
+        "prompt_tokens": sum(count_tokens(message["content"]) for message in messages),
+        "completion_tokens": count_tokens(ai_response),
+    }
+
+
+def missing_profile_response() -> Dict:
+    """Response returned when the student profile can't be loaded"""
+    return {
+        "response": "I couldn't find your student profile. Please contact support.",
+        "confidence_score": 0.0,
+        "should_handoff": True,
+        "handoff_message": "Unable to locate student profile"
+    }
+
+
+def error_response(error: Exception) -> Dict:
+    """Response returned when generation fails"""
+    return {
+        "response": "I apologize, but I'm having trouble processing your request right now. Please try again in a moment.",
+        "confidence_score": 0.0,
+        "should_handoff": True,
+        "handoff_message": f"Error: {str(error)}"
+    }
+
+
+def finalize_chat_response(
+    ai_response: str,
+    message: str,
+    history: List[Dict],
+    context: List[Dict],
+    signals: Optional[Dict] = None
+) -> Dict:
+    """Score a generated response and attach handoff detection"""
+    # Calculate confidence score
+    confidence = calculate_confidence_score(ai_response, context)
+    return apply_handoff_detection(ai_response, confidence, message, history, signals)
+
+
+def apply_handoff_detection(
+    ai_response: str,
+    confidence: float,
+    message: str,
+    history: List[Dict],
+    signals: Optional[Dict] = None
+) -> Dict:
+    """Attach handoff detection for the current message to a scored response"""
+    # Detect handoff triggers
+    should_handoff, handoff_message = detect_handoff_trigger(message, history, confidence, signals)
+    
+    # Combine response with handoff if needed
+    if should_handoff:
+        final_response = f"{ai_response}\n\n{handoff_message}"
+    else:
+        final_response = ai_response
+    
+    return {
+        "response": final_response,
+        "confidence_score": confidence,
+        "should_handoff": should_handoff,
+        "handoff_message": handoff_message if should_handoff else None
+    }
+
+
+def semantic_cache_scope(student_info: Dict) -> Tuple:
+    """
+    Isolation scope for cached responses: always the student
+
+    Answers are generated from a personalized prompt (name, goals, the
+    student's own transcript context), so they are never shared across students.
+    """
+    return ("student", student_info["student_id"])
+
+
+def semantic_cache_eligible(history: List[Dict], summary: Optional[str]) -> bool:
+    return SEMANTIC_CACHE_ENABLED and summary is None and len(history) <= SEMANTIC_CACHE_MAX_HISTORY
+
+
+async def probe_semantic_cache(
+    student_info: Dict,
+    message: str,
+    history: List[Dict],
+    signals: Optional[Dict] = None,
+    subject: Optional[str] = None
+) -> Tuple[Optional[Dict], Dict]:
+    """
+    Look up a cached response for a near-identical earlier question
+    
+    Handoff detection always runs on the current message, so a cached answer
+    never hides a booking request or confusion signal.
+    
+    Returns:
+        (hit or None, probe): hit is {"ai_response", "result"}; pass probe to
+        remember_response to cache the answer generated on a miss
+    """
+    probe = {
+        "scope": semantic_cache_scope(student_info),
+        "subject": (subject or "General").lower(),
+        "embedding": await embed_query_async(message),
+    }
+    cached = semantic_response_cache.lookup(probe["scope"], probe["subject"], probe["embedding"])
+    if cached is None:
+        return None, probe
+    value = cached["value"]
+    result = apply_handoff_detection(value["ai_response"], value["confidence_score"], message, history, signals)
+    return {"ai_response": value["ai_response"], "result": result}, probe
+
+
+def remember_response(probe: Optional[Dict], ai_response: str, result: Dict):
+    """Cache a generated answer (handoffs and low-confidence answers are never cached)"""
+    if probe is None or result["should_handoff"]:
+        return
+    semantic_response_cache.store(probe["scope"], probe["subject"], probe["embedding"], {
+        "ai_response": ai_response,
+        "confidence_score": result["confidence_score"],
+    })
+
+
+def get_semantic_cache_stats() -> Dict:
+    """Hit/miss metrics of the semantic response cache"""
+    return {"enabled": SEMANTIC_CACHE_ENABLED, "scope": "student", **semantic_response_cache.stats()}
+
+
 def generate_chat_response(
     student_id: str,
     message: str,
-    history: Optional[List[Dict]] = None
+    history: Optional[List[Dict]] = None,
+    context: Optional[List[Dict]] = None,
+    summary: Optional[str] = None,
+    signals: Optional[Dict] = None,
+    subject: Optional[str] = None
 ) -> Dict:
     """
     Generate AI chat response with context retrieval and handoff detection
@@ -223,6 +421,11 @@ def generate_chat_response(
         student_id: Student ID
         message: User message
         history: Optional conversation history (list of {role, content} dicts)
+        context: Optional pre-fetched RAG context (e.g. from retrieve_chat_context);
+            retrieved synchronously when omitted
+        summary: Optional rolling summary of earlier turns not included in history
+        signals: Optional stored handoff signal state of the conversation
+        subject: Optional subject the conversation is about (used for model routing)
     
     Returns:
         {
@@ -238,57 +441,200 @@ def generate_chat_response(
     # Step 1: Get student information
     student_info = get_student_info(student_id)
     if not student_info:
-        return {
-            "response": "I couldn't find your student profile. Please contact support.",
-            "confidence_score": 0.0,
-            "should_handoff": True,
-            "handoff_message": "Unable to locate student profile"
-        }
+        return missing_profile_response()
     
     # Step 2: Retrieve relevant context using RAG
-    context = retrieve_context(message, student_id, top_k=3)
+    if context is None:
+        context = retrieve_context(message, student_id, top_k=3)
     
     # Step 3: Build prompt with all context
-    prompt = build_prompt_template(student_info, message, context, history)
+    prompt = build_prompt_template(student_info, message, context, history, summary)
     
     # Step 4: Generate response using OpenAI
     try:
-        response = openai_client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": "You are an AI Study Companion, a supportive tutoring assistant."},
-                {"role": "user", "content": prompt}
-            ],
+        decision = route_chat_turn(message, context, history, signals, subject)
+        start = time.perf_counter()
+        messages = build_chat_messages(prompt)
+        response = chat_completion(
+            model=decision["model"],
+            messages=messages,
             temperature=0.7,
             max_tokens=300
         )
         
         ai_response = response.choices[0].message.content.strip()
         
-        # Step 5: Calculate confidence score
-        confidence = calculate_confidence_score(ai_response, context)
-        
-        # Step 6: Detect handoff triggers
-        should_handoff, handoff_message = detect_handoff_trigger(message, history, confidence)
+        # Steps 5-7: Confidence score, handoff detection and final response
+        result = finalize_chat_response(ai_response, message, history, context, signals)
+        routing_log.record(
+            decision, (time.perf_counter() - start) * 1000, result, usage_tokens(messages, ai_response, response)
+        )
+        return result
+    
+    except Exception as e:
+        return error_response(e)
+
+
+async def generate_chat_response_async(
+    student_id: str,
+    message: str,
+    history: Optional[List[Dict]] = None,
+    context: Optional[List[Dict]] = None,
+    summary: Optional[str] = None,
+    signals: Optional[Dict] = None,
+    subject: Optional[str] = None
+) -> Dict:
+    """
+    Async version of generate_chat_response for use inside request handlers
+    
+    The student profile (DB, on a worker thread) and RAG context are loaded
+    concurrently, and the completion uses the shared async OpenAI client, so
+    the event loop keeps serving other requests while this one waits. With
+    SEMANTIC_CACHE_ENABLED, a near-identical earlier question from the
+    same student and subject is answered from the cache without retrieval or a
+    completion.
+    
+    Args:
+        student_id: Student ID
+        message: User message
+        history: Optional conversation history (list of {role, content} dicts)
+        context: Optional pre-fetched RAG context; retrieved concurrently with
+            the student profile when omitted
+        summary: Optional rolling summary of earlier turns not included in history
+        signals: Optional stored handoff signal state of the conversation
+        subject: Optional subject the conversation is about (semantic cache key and model routing)
+    
+    Returns:
+        Same shape as generate_chat_response
+    """
+    if history is None:
+        history = []
+    
+    cache_probe = None
+    if context is None and semantic_cache_eligible(history, summary):
+        # Embed the question while the profile loads; a cache hit skips retrieval and generation
+        student_info, _ = await asyncio.gather(
+            get_student_info_async(student_id),
+            embed_query_async(message)
+        )
+        if not student_info:
+            return missing_profile_response()
+        hit, cache_probe = await probe_semantic_cache(student_info, message, history, signals, subject)
+        if hit:
+            return hit["result"]
+        context = await retrieve_chat_context(student_id, message)
+    
+    # Steps 1-2: Student information and RAG context, fetched concurrently
+    elif context is None:
+        student_info, context = await asyncio.gather(
+            get_student_info_async(student_id),
+            retrieve_chat_context(student_id, message)
+        )
+    else:
+        student_info = await get_student_info_async(student_id)
+    if not student_info:
+        return missing_profile_response()
+    
+    # Step 3: Build prompt with all context
+    prompt = build_prompt_template(student_info, message, context, history, summary)
+    
+    # Step 4: Generate response without blocking the event loop
+    try:
+        decision = route_chat_turn(message, context, history, signals, subject)
+        start = time.perf_counter()
+        messages = build_chat_messages(prompt)
+        response = await chat_completion_async(
+            model=decision["model"],
+            messages=messages,
+            temperature=0.7,
+            max_tokens=300
+        )
         
-        # Step 7: Combine response with handoff if needed
-        if should_handoff:
-            final_response = f"{ai_response}\n\n{handoff_message}"
-        else:
-            final_response = ai_response
+        ai_response = response.choices[0].message.content.strip()
         
-        return {
-            "response": final_response,
-            "confidence_score": confidence,
-            "should_handoff": should_handoff,
-            "handoff_message": handoff_message if should_handoff else None
-        }
+        # Steps 5-7: Confidence score, handoff detection and final response
+        result = finalize_chat_response(ai_response, message, history, context, signals)
+        routing_log.record(
+            decision, (time.perf_counter() - start) * 1000, result, usage_tokens(messages, ai_response, response)
+        )
+        remember_response(cache_probe, ai_response, result)
+        return result
     
     except Exception as e:
-        return {
-            "response": "I apologize, but I'm having trouble processing your request right now. Please try again in a moment.",
-            "confidence_score": 0.0,
-            "should_handoff": True,
-            "handoff_message": f"Error: {str(e)}"
-        }
+        return error_response(e)
+
+
+def stream_chat_response(
+    student_id: str,
+    message: str,
+    history: Optional[List[Dict]] = None,
+    context: Optional[List[Dict]] = None,
+    summary: Optional[str] = None,
+    signals: Optional[Dict] = None,
+    cache_probe: Optional[Dict] = None,
+    subject: Optional[str] = None
+) -> Iterator[Tuple[str, object]]:
+    """
+    Stream an AI chat response token by token
+    
+    Same pipeline as generate_chat_response, but the completion is requested
+    with stream=True and each content delta is yielded as it arrives.
+    Confidence and handoff detection need the full text, so they are
+    computed once the stream ends and delivered in the final event.
+    
+    Args:
+        student_id: Student ID
+        message: User message
+        history: Optional conversation history (list of {role, content} dicts)
+        context: Optional pre-fetched RAG context; retrieved synchronously when omitted
+        summary: Optional rolling summary of earlier turns not included in history
+        signals: Optional stored handoff signal state of the conversation
+        cache_probe: Optional probe from probe_semantic_cache; the finished
+            answer is stored in the semantic cache under it
+        subject: Optional subject the conversation is about (used for model routing)
+    
+    Yields:
+        ("token", str) for each content delta, then exactly one ("done", dict)
+        with the same shape as generate_chat_response's result
+    """
+    if history is None:
+        history = []
+    
+    student_info = get_student_info(student_id)
+    if not student_info:
+        yield "done", missing_profile_response()
+        return
+    
+    if context is None:
+        context = retrieve_context(message, student_id, top_k=3)
+    
+    prompt = build_prompt_template(student_info, message, context, history, summary)
+    
+    decision = route_chat_turn(message, context, history, signals, subject)
+    start = time.perf_counter()
+    messages = build_chat_messages(prompt)
+    parts = []
+    try:
+        stream = stream_chat_completion(
+            model=decision["model"],
+            messages=messages,
+            temperature=0.7,
+            max_tokens=300
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                parts.append(token)
+                yield "token", token
+    except Exception as e:
+        yield "done", error_response(e)
+        return
+    
+    ai_response = "".join(parts).strip()
+    result = finalize_chat_response(ai_response, message, history, context, signals)
+    routing_log.record(decision, (time.perf_counter() - start) * 1000, result, usage_tokens(messages, ai_response))
+    remember_response(cache_probe, ai_response, result)
+    yield "done", result
 
@@ -0,0 +1,195 @@
+"""
+Append-only chat message store
+
+Each chat turn inserts its messages as ConversationMessage rows numbered by
+seq within the student's latest conversation, instead of rewriting the
+Conversation.messages JSON blob. History is read back with a bounded
+"last N" query on the (conversation_id, seq) index.
+"""
+import threading
+from contextlib import ExitStack
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, Conversation, ConversationMessage
+
+APPEND_RETRIES = 5  # Turns from other workers can still race for the same seq numbers
+
+# Striped per-student locks serialize appends within this process
+_append_locks = [threading.Lock() for _ in range(64)]
+
+
+def get_latest_conversation_id(db, student_db_id: int) -> Optional[int]:
+    """Id of the student's most recent conversation, or None"""
+    row = db.query(Conversation.id).filter(
+        Conversation.student_id == student_db_id
+    ).order_by(Conversation.created_at.desc()).first()
+    return row[0] if row else None
+
+
+def message_to_dict(message: ConversationMessage) -> Dict:
+    return {
+        "role": message.role,
+        "content": message.content,
+        "timestamp": message.created_at.isoformat() if message.created_at else None,
+        "confidence_score": message.confidence_score,
+        "should_handoff": message.should_handoff,
+    }
+
+
+def load_messages(db, conversation_id: int, limit: int, after_seq: int = 0) -> List[Dict]:
+    """Last `limit` messages of a conversation with seq > after_seq, oldest first"""
+    rows = db.query(ConversationMessage).filter(
+        ConversationMessage.conversation_id == conversation_id,
+        ConversationMessage.seq > after_seq
+    ).order_by(ConversationMessage.seq.desc()).limit(limit).all()
+    return [message_to_dict(row) for row in reversed(rows)]
+
+
+def load_history(db, conversation_id: int, limit: int) -> List[Dict]:
+    """Last `limit` messages of a conversation, falling back to its legacy JSON blob if not migrated yet"""
+    messages = load_messages(db, conversation_id, limit)
+    if messages:
+        return messages
+    legacy = db.query(Conversation.messages).filter(Conversation.id == conversation_id).scalar()
+    return list(legacy or [])[-limit:]
+
+
+def load_recent_messages(student_db_id: int, limit: int = 10) -> List[Dict]:
+    """
+    Last messages of the student's latest conversation, oldest first
+
+    Args:
+        student_db_id: Student primary key (Student.id)
+        limit: Maximum number of messages to return
+    """
+    db = SessionLocal()
+    try:
+        conversation_id = get_latest_conversation_id(db, student_db_id)
+        if conversation_id is None:
+            return []
+        return load_history(db, conversation_id, limit)
+    finally:
+        db.close()
+
+
+def migrate_legacy_messages(db, conversation_id: int) -> int:
+    """
+    Move a conversation's legacy JSON messages into ConversationMessage rows
+
+    Returns:
+        Highest seq written (0 if there was nothing to migrate)
+    """
+    legacy = db.query(Conversation.messages).filter(Conversation.id == conversation_id).scalar() or []
+    for seq, message in enumerate(legacy, 1):
+        db.add(ConversationMessage(
+            conversation_id=conversation_id,
+            seq=seq,
+            role=message.get("role"),
+            content=message.get("content"),
+            confidence_score=message.get("confidence_score"),
+            should_handoff=message.get("should_handoff")
+        ))
+    if legacy:
+        db.query(Conversation).filter(Conversation.id == conversation_id).update(
+            {Conversation.messages: []}, synchronize_session=False
+        )
+    return len(legacy)
+
+
+def append_messages(student_db_id: int, messages: List[Dict]) -> int:
+    """
+    Append messages to the student's latest conversation (created if missing)
+
+    Only the new rows are written; the conversation's message_count is
+    incremented in SQL.
+
+    Args:
+        student_db_id: Student primary key (Student.id)
+        messages: {role, content, optional confidence_score / should_handoff} dicts
+
+    Returns:
+        Conversation id the messages were appended to
+    """
+    with _append_locks[student_db_id % len(_append_locks)]:
+        return _append_messages(student_db_id, messages)
+
+
+def append_message_batches(batches: List[Tuple[int, List[Dict]]]) -> List[int]:
+    """
+    Append several students' messages in one transaction, in the given order
+
+    Args:
+        batches: (student_db_id, messages) pairs; a student may appear more than once
+
+    Returns:
+        Conversation id of each batch
+    """
+    stripes = sorted({student_db_id % len(_append_locks) for student_db_id, _ in batches})
+    with ExitStack() as stack:
+        # Fixed lock order so concurrent batches can't deadlock
+        for stripe in stripes:
+            stack.enter_context(_append_locks[stripe])
+        return _commit_with_retries(
+            lambda db: [_append_in_session(db, student_db_id, messages) for student_db_id, messages in batches]
+        )
+
+
+def _append_messages(student_db_id: int, messages: List[Dict]) -> int:
+    return _commit_with_retries(lambda db: _append_in_session(db, student_db_id, messages))
+
+
+def _commit_with_retries(write: Callable):
+    for attempt in range(APPEND_RETRIES):
+        db = SessionLocal()
+        try:
+            result = write(db)
+            db.commit()
+            return result
+        except IntegrityError:
+            db.rollback()
+            if attempt == APPEND_RETRIES - 1:
+                raise
+        finally:
+            db.close()
+
+
+def _append_in_session(db, student_db_id: int, messages: List[Dict]) -> int:
+    conversation_id = get_latest_conversation_id(db, student_db_id)
+    if conversation_id is None:
+        conversation = Conversation(
+            student_id=student_db_id,
+            subject="General",
+            message_count=0,
+            messages=[]
+        )
+        db.add(conversation)
+        db.flush()
+        conversation_id = conversation.id
+
+    last_seq = db.query(func.max(ConversationMessage.seq)).filter(
+        ConversationMessage.conversation_id == conversation_id
+    ).scalar()
+    if last_seq is None:
+        last_seq = migrate_legacy_messages(db, conversation_id)
+
+    db.add_all([
+        ConversationMessage(
+            conversation_id=conversation_id,
+            seq=last_seq + offset,
+            role=message["role"],
+            content=message["content"],
+            confidence_score=message.get("confidence_score"),
+            should_handoff=message.get("should_handoff")
+        )
+        for offset, message in enumerate(messages, 1)
+    ])
+    db.query(Conversation).filter(Conversation.id == conversation_id).update(
+        {Conversation.message_count: func.coalesce(Conversation.message_count, 0) + len(messages)},
+        synchronize_session=False
+    )
+    # Later appends in the same transaction must see these rows (autoflush is off)
+    db.flush()
+    return conversation_id
@@ -0,0 +1,148 @@
+"""
+Rolling per-conversation summaries
+
+Every SUMMARY_EVERY_TURNS chat turns, a background worker folds the messages
+that have aged out of the recent window into the conversation's stored
+summary using a cheap model. Prompts then carry that summary plus only the
+messages after it, so prompt length stays roughly flat however long the
+conversation runs.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, ConversationMessage, ConversationSummary
+from services.conversation_store import load_history, load_messages
+from services.llm_gateway import chat_completion
+
+# Summary configuration
+SUMMARY_ENABLED = os.getenv("CONVERSATION_SUMMARY_ENABLED", "true").lower() == "true"
+SUMMARY_MODEL_NAME = os.getenv("CONVERSATION_SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_EVERY_TURNS = int(os.getenv("CONVERSATION_SUMMARY_EVERY_TURNS", "3"))  # User + assistant pairs
+SUMMARY_RECENT_MESSAGES = int(os.getenv("CONVERSATION_SUMMARY_RECENT_MESSAGES", "4"))  # Always kept verbatim
+SUMMARY_MAX_TOKENS = 250
+
+# One background worker; refreshes for the same conversation never overlap
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-summary")
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+summary_counts = {"scheduled": 0, "refreshed": 0, "failed": 0}
+
+
+def load_summary(db, conversation_id: int) -> Optional[ConversationSummary]:
+    return db.query(ConversationSummary).filter(
+        ConversationSummary.conversation_id == conversation_id
+    ).first()
+
+
+def load_history_with_summary(db, conversation_id: int, limit: int = 10) -> Tuple[Optional[str], List[Dict]]:
+    """
+    Conversation summary and the messages it doesn't cover yet
+
+    Args:
+        db: Database session
+        conversation_id: Conversation id
+        limit: Maximum number of verbatim messages
+
+    Returns:
+        (summary text or None, messages after the summary, oldest first)
+    """
+    summary = load_summary(db, conversation_id) if SUMMARY_ENABLED else None
+    if summary is None:
+        return None, load_history(db, conversation_id, limit)
+    return summary.summary, load_messages(db, conversation_id, limit, after_seq=summary.summarized_through_seq)
+
+
+def build_summary_prompt(previous_summary: Optional[str], messages: List[Dict]) -> str:
+    transcript = "\n".join(f"{message['role'].title()}: {message['content']}" for message in messages)
+    return f"""Update the running summary of a tutoring conversation between a student and an AI study companion.
+
+Current summary:
+{previous_summary or "(none yet)"}
+
+New messages:
+{transcript}
+
+Write the updated summary in at most 120 words. Keep the topics covered, what the student understood or
+struggled with, open questions, and any request for a human tutor. Return only the summary."""
+
+
+def refresh_summary(conversation_id: int) -> bool:
+    """
+    Fold messages that have left the recent window into the stored summary
+
+    Returns:
+        True if the summary was updated
+    """
+    db = SessionLocal()
+    try:
+        summary = load_summary(db, conversation_id)
+        summarized_through = summary.summarized_through_seq if summary else 0
+        last_seq = db.query(func.max(ConversationMessage.seq)).filter(
+            ConversationMessage.conversation_id == conversation_id
+        ).scalar() or 0
+
+        # Only summarize once a full batch of turns has aged out of the recent window
+        fold_through = last_seq - SUMMARY_RECENT_MESSAGES
+        if fold_through - summarized_through < SUMMARY_EVERY_TURNS * 2:
+            return False
+
+        rows = db.query(ConversationMessage).filter(
+            ConversationMessage.conversation_id == conversation_id,
+            ConversationMessage.seq > summarized_through,
+            ConversationMessage.seq <= fold_through
+        ).order_by(ConversationMessage.seq).all()
+        messages = [{"role": row.role, "content": row.content} for row in rows]
+
+        response = chat_completion(
+            model=SUMMARY_MODEL_NAME,
+            messages=[{"role": "user", "content": build_summary_prompt(summary.summary if summary else None, messages)}],
+            temperature=0.3,
+            max_tokens=SUMMARY_MAX_TOKENS
+        )
+        text = response.choices[0].message.content.strip()
+
+        if summary is None:
+            summary = ConversationSummary(conversation_id=conversation_id)
+            db.add(summary)
+        summary.summary = text
+        summary.summarized_through_seq = fold_through
+        summary.model = SUMMARY_MODEL_NAME
+        summary.updated_at = datetime.utcnow()
+        db.commit()
+        return True
+    except IntegrityError:
+        # Another worker created the summary first; it will be extended on a later turn
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+def _run_refresh(conversation_id: int):
+    try:
+        if refresh_summary(conversation_id):
+            summary_counts["refreshed"] += 1
+    except Exception as e:
+        summary_counts["failed"] += 1
+        print(f"Warning: Failed to refresh conversation summary: {e}")
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(conversation_id)
+
+
+def schedule_summary_refresh(conversation_id: int):
+    """Queue a background summary refresh (no-op if one is already pending for the conversation)"""
+    if not SUMMARY_ENABLED:
+        return
+    with _in_flight_lock:
+        if conversation_id in _in_flight:
+            return
+        _in_flight.add(conversation_id)
+    summary_counts["scheduled"] += 1
+    _summary_executor.submit(_run_refresh, conversation_id)
@@ -0,0 +1,206 @@
+"""
+Write-behind persistence of chat turns
+
+Chat handlers hand finished turns to a bounded in-process queue and respond
+immediately; one background thread drains the queue and commits turns in
+groups (one transaction per batch). Turns are written strictly in submission
+order, so a crash can lose the tail of the queue but never leaves a later
+turn stored without the earlier ones. Before a student's stored history is
+read, their pending turns are waited for, and the queue is flushed when the
+app shuts down. If the queue is full, callers fall back to writing directly,
+after waiting for that student's queued turns so their order is kept.
+"""
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from services.conversation_store import append_message_batches
+from services.conversation_summary import schedule_summary_refresh
+from services.handoff_signals import record_turn_signals
+
+# Write-behind configuration
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "1000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "0.05"))  # Max wait to fill a batch
+WRITE_BEHIND_READ_WAIT_SECONDS = 2.0  # Longest a history read waits for the student's pending turns
+WRITE_BEHIND_DIRECT_WAIT_SECONDS = 30.0  # Longest a direct write waits for the student's queued turns
+
+_STOP = object()
+
+Turn = Tuple[int, str, Dict]  # (student_db_id, user message, chat result)
+
+
+def turn_messages(message: str, result: Dict) -> List[Dict]:
+    """User message and assistant reply rows for one chat turn"""
+    return [
+        {"role": "user", "content": message},
+        {
+            "role": "assistant",
+            "content": result["response"],
+            "confidence_score": result["confidence_score"],
+            "should_handoff": result["should_handoff"]
+        }
+    ]
+
+
+def persist_turns(turns: List[Turn]):
+    """Append turns in one transaction, then advance signal state and schedule summaries"""
+    conversation_ids = append_message_batches([
+        (student_db_id, turn_messages(message, result)) for student_db_id, message, result in turns
+    ])
+    for (_, message, result), conversation_id in zip(turns, conversation_ids):
+        # The messages are committed; signal bookkeeping must not cause them to be written again
+        try:
+            record_turn_signals(conversation_id, message, result)
+        except Exception as e:
+            print(f"Warning: Failed to record handoff signals: {e}")
+    for conversation_id in dict.fromkeys(conversation_ids):
+        schedule_summary_refresh(conversation_id)
+
+
+def save_conversation_turn(student_db_id: int, message: str, result: Dict):
+    """
+    Append a user message and the assistant's reply to the student's latest conversation
+
+    Used when a turn can't be queued; the student's earlier queued turns are
+    written first, so turns are never stored out of order. Persistence is
+    best-effort: failures are logged and never surface to the client.
+
+    Args:
+        student_db_id: Student primary key (Student.id)
+        message: User message
+        result: Chat result from generate_chat_response / stream_chat_response
+    """
+    if not conversation_writer.wait_for_student(student_db_id, WRITE_BEHIND_DIRECT_WAIT_SECONDS):
+        print(f"Warning: Queued turns for student {student_db_id} still pending; saving this turn out of order")
+    try:
+        persist_turns([(student_db_id, message, result)])
+    except Exception as e:
+        print(f"Warning: Failed to save conversation: {e}")
+
+
+class ConversationWriter:
+    """Bounded FIFO of chat turns committed in batches by one worker thread"""
+
+    def __init__(self, max_queue: int, batch_size: int, flush_seconds: float):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.counts = {"submitted": 0, "written": 0, "batches": 0, "failed": 0, "overflow": 0}
+        self.last_batch_ms = 0.0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._pending: Dict[int, int] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, student_db_id: int, message: str, result: Dict) -> bool:
+        """
+        Queue a turn for writing
+
+        Returns:
+            False if the turn was not queued (disabled, shut down or full);
+            the caller should then write it with save_conversation_turn, which
+            waits for the student's queued turns first
+        """
+        with self._cond:
+            if not WRITE_BEHIND_ENABLED or self._closed:
+                return False
+            self._ensure_worker()
+            try:
+                # Under the lock so queue order matches pending counts and shutdown can't interleave
+                self._queue.put_nowait((student_db_id, message, result))
+            except queue.Full:
+                self.counts["overflow"] += 1
+                return False
+            self._pending[student_db_id] = self._pending.get(student_db_id, 0) + 1
+            self.counts["submitted"] += 1
+            return True
+
+    def has_pending(self, student_db_id: int) -> bool:
+        return self._pending.get(student_db_id, 0) > 0
+
+    def wait_for_student(self, student_db_id: int, timeout: float = WRITE_BEHIND_READ_WAIT_SECONDS) -> bool:
+        """Block until the student's queued turns are written (read-your-writes for history loads)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending.get(student_db_id, 0) == 0, timeout)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every queued turn is written"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout)
+
+    def shutdown(self, timeout: float = 30.0):
+        """Stop accepting turns, write everything queued, and stop the worker"""
+        with self._cond:
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch: List[Turn]):
+        start = time.perf_counter()
+        try:
+            persist_turns(batch)
+            self.counts["batches"] += 1
+        except Exception as e:
+            # Retry one by one so a single bad turn doesn't drop the rest of the batch
+            print(f"Warning: Failed to write conversation batch of {len(batch)}: {e}")
+            for turn in batch:
+                try:
+                    persist_turns([turn])
+                except Exception as turn_error:
+                    self.counts["failed"] += 1
+                    print(f"Warning: Failed to save conversation: {turn_error}")
+        self.last_batch_ms = (time.perf_counter() - start) * 1000
+        with self._cond:
+            self.counts["written"] += len(batch)
+            for student_db_id, _, _ in batch:
+                remaining = self._pending.get(student_db_id, 0) - 1
+                if remaining > 0:
+                    self._pending[student_db_id] = remaining
+                else:
+                    self._pending.pop(student_db_id, None)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            batches = self.counts["batches"]
+            return {
+                "enabled": WRITE_BEHIND_ENABLED,
+                **self.counts,
+                "queued": self._queue.qsize(),
+                "mean_batch_size": round(self.counts["written"] / batches, 2) if batches else 0.0,
+                "last_batch_ms": round(self.last_batch_ms, 2),
+            }
+
+
+conversation_writer = ConversationWriter(WRITE_BEHIND_MAX_QUEUE, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_SECONDS)
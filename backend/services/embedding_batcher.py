@@ -0,0 +1,76 @@
+"""
+Batched, concurrent embedding pipeline used when indexing transcripts
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Iterator, List, Sequence, Tuple
+
+
+def iter_batches(items: Sequence[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Split a sequence into consecutive batches of at most batch_size items"""
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    for start in range(0, len(items), batch_size):
+        yield list(items[start:start + batch_size])
+
+
+def embed_in_batches(
+    items: Sequence[Any],
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    batch_size: int = 64,
+    max_concurrency: int = 4,
+    text_of: Callable[[Any], str] = lambda item: item
+) -> Iterator[Tuple[List[Any], List[List[float]]]]:
+    """
+    Embed items in batches with a bounded number of requests in flight
+
+    Batches are yielded as soon as they finish (not in submission order), so
+    callers can stream them into the vector store instead of holding the whole
+    corpus in memory until the end.
+
+    Args:
+        items: Records to embed
+        embed_fn: Function that embeds a list of texts in a single request
+        batch_size: Number of texts packed into each embedding request
+        max_concurrency: Maximum number of embedding requests in flight
+        text_of: Function extracting the text to embed from an item
+
+    Returns:
+        Iterator of (batch_items, embeddings) tuples
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+
+    batches = iter_batches(items, batch_size)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        in_flight = {}
+
+        def submit_next() -> bool:
+            batch = next(batches, None)
+            if batch is None:
+                return False
+            future = executor.submit(embed_fn, [text_of(item) for item in batch])
+            in_flight[future] = batch
+            return True
+
+        # Fill the pipeline up to the concurrency limit
+        for _ in range(max_concurrency):
+            if not submit_next():
+                break
+
+        try:
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = in_flight.pop(future)
+                    embeddings = future.result()
+                    if len(embeddings) != len(batch):
+                        raise ValueError(
+                            f"Embedding count mismatch: expected {len(batch)}, got {len(embeddings)}"
+                        )
+                    # Keep the pipeline full before handing the batch to the caller
+                    submit_next()
+                    yield batch, embeddings
+        finally:
+            for future in in_flight:
+                future.cancel()
@@ -0,0 +1,166 @@
+"""
+Persistent, content-addressed embedding cache backed by SQLite
+
+Embeddings are keyed by (model, sha256(text)) and stored as float32 blobs.
+The cache is bounded by entry count and evicts least-recently-used entries.
+Recency is tracked coarsely (a hit only rewrites last_used if it is older
+than TOUCH_INTERVAL_SECONDS) and the entry count is kept in memory, so the
+lookup path is a single indexed SELECT in the common case.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+TOUCH_INTERVAL_SECONDS = 3600.0  # LRU resolution; hits within this window don't write
+
+
+def text_hash(text: str) -> str:
+    """Content address of a text (sha256 hex digest)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding cache with size-bounded LRU eviction and hit/miss stats"""
+
+    def __init__(self, path: Path, max_entries: int = 100_000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dimension INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        # Approximate when other processes share the file; re-counted after each eviction
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Look up cached embeddings
+
+        Returns:
+            List aligned with texts; None for entries not in the cache
+        """
+        hashes = [text_hash(text) for text in texts]
+        unique_hashes = list(dict.fromkeys(hashes))
+        found: Dict[str, List[float]] = {}
+        stale: List[str] = []
+        now = time.time()
+
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique_hashes), 500):
+                chunk = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector, last_used FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk]
+                ).fetchall()
+                for row_hash, blob, last_used in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[row_hash] = vector.tolist()
+                    if now - last_used >= TOUCH_INTERVAL_SECONDS:
+                        stale.append(row_hash)
+
+            if stale:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, row_hash) for row_hash in stale]
+                )
+                self._conn.commit()
+
+            results = [found.get(h) for h in hashes]
+            hit_count = sum(1 for result in results if result is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Store embeddings for texts, evicting the least recently used entries if over capacity"""
+        if len(texts) != len(embeddings):
+            raise ValueError("texts and embeddings must have the same length")
+        if not texts:
+            return
+
+        now = time.time()
+        rows = [
+            (model, text_hash(text), len(embedding), array("f", embedding).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, dimension, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            inserted = self._conn.total_changes - before
+            self._count += inserted
+            if inserted < len(rows):
+                # Some texts were already cached (e.g. written by another process); refresh them
+                self._conn.executemany(
+                    "UPDATE embeddings SET dimension = ?, vector = ?, last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(dimension, blob, last_used, row_model, row_hash) for row_model, row_hash, dimension, blob, last_used in rows]
+                )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        """Trim the cache to 90% of max_entries once it grows past the limit"""
+        if self.max_entries <= 0 or self._count <= self.max_entries:
+            return
+        # Evict down to a low-water mark so we don't run eviction on every insert
+        excess = self._count - int(self.max_entries * 0.9)
+        deleted = self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,)
+        ).rowcount
+        self.evictions += deleted
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self):
+        """Remove all cached embeddings"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._count = 0
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            entries = self._count
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+                "path": str(self.path),
+            }
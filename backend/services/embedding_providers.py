@@ -0,0 +1,178 @@
+"""
+Pluggable embedding providers for the RAG engine
+
+The provider is selected with the EMBEDDING_PROVIDER environment variable:
+- "openai": OpenAI embeddings API (default)
+- "local": deterministic hashed character n-gram projection (NumPy, offline)
+
+Additional providers can be added with register_embedding_provider().
+"""
+import asyncio
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+DEFAULT_LOCAL_EMBEDDING_DIMENSION = 384
+
+
+class EmbeddingProvider:
+    """Interface for embedding backends"""
+
+    name = "base"
+    model = "base"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts in a single call"""
+        raise NotImplementedError
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        """Async embedding; by default runs embed() in a worker thread"""
+        return await asyncio.to_thread(self.embed, texts)
+
+    @property
+    def namespace(self) -> str:
+        """Identifier safe to use in collection and file names"""
+        return re.sub(r"[^a-zA-Z0-9_-]", "-", self.model)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI API; the client is created on first use"""
+
+    name = "openai"
+
+    def __init__(self, model: Optional[str] = None, client=None, async_client=None):
+        self.model = model or os.getenv("OPENAI_EMBEDDING_MODEL", DEFAULT_OPENAI_EMBEDDING_MODEL)
+        self._client = client
+        self._async_client = async_client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from services.registry import get_openai_client
+
+            # Share the process-wide client (and its connection pool)
+            self._client = get_openai_client()
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            from services.registry import get_async_openai_client
+
+            self._async_client = get_async_openai_client()
+        return self._async_client
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(
+            model=self.model,
+            input=texts
+        )
+        return self._unpack(response)
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        response = await self.async_client.embeddings.create(
+            model=self.model,
+            input=texts
+        )
+        return self._unpack(response)
+
+    @staticmethod
+    def _unpack(response) -> List[List[float]]:
+        # Results carry their input index; don't rely on response ordering
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic local embeddings from hashed character n-grams
+
+    Byte n-grams of the lowercased text are hashed (vectorized with NumPy)
+    into a fixed number of signed buckets, damped with log1p and L2
+    normalized. Texts sharing vocabulary land close together, which is
+    enough for offline indexing, tests and load tests.
+    """
+
+    name = "local"
+
+    _PRIME = 1099511628211  # FNV-1a 64-bit prime
+    _MIX = 0x9E3779B97F4A7C15  # Golden-ratio constant for n-gram size seeding
+
+    def __init__(self, dimension: Optional[int] = None, ngram_range=(3, 5)):
+        self.dimension = dimension or int(
+            os.getenv("LOCAL_EMBEDDING_DIMENSION", str(DEFAULT_LOCAL_EMBEDDING_DIMENSION))
+        )
+        self.ngram_range = ngram_range
+        self.model = f"local-hash-ngram-{self.dimension}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self._embed_one(np, text)
+        return matrix.tolist()
+
+    def _embed_one(self, np, text: str):
+        data = np.frombuffer(" ".join(text.lower().split()).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+        vector = np.zeros(self.dimension, dtype=np.float64)
+        prime = np.uint64(self._PRIME)
+        low, high = self.ngram_range
+
+        for n in range(low, high + 1):
+            count = len(data) - n + 1
+            if count <= 0:
+                break
+            seed = (n * self._MIX) & 0xFFFFFFFFFFFFFFFF
+            hashes = np.full(count, seed, dtype=np.uint64)
+            for k in range(n):
+                hashes = (hashes ^ data[k:k + count]) * prime
+            # Final avalanche so low bits are well distributed
+            hashes ^= hashes >> np.uint64(29)
+            buckets = (hashes % np.uint64(self.dimension)).astype(np.int64)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+            vector += np.bincount(buckets, weights=signs, minlength=self.dimension)
+
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+_PROVIDER_FACTORIES: Dict[str, Callable[[], EmbeddingProvider]] = {
+    "openai": OpenAIEmbeddingProvider,
+    "local": HashingEmbeddingProvider,
+}
+_provider: Optional[EmbeddingProvider] = None
+_provider_lock = threading.Lock()
+
+
+def register_embedding_provider(name: str, factory: Callable[[], EmbeddingProvider]):
+    """Register a provider factory under a name usable in EMBEDDING_PROVIDER"""
+    _PROVIDER_FACTORIES[name.lower()] = factory
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Return the configured embedding provider (created once per process)"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                provider_name = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+                factory = _PROVIDER_FACTORIES.get(provider_name)
+                if factory is None:
+                    raise ValueError(
+                        f"Unknown EMBEDDING_PROVIDER '{provider_name}'. "
+                        f"Available: {', '.join(sorted(_PROVIDER_FACTORIES))}"
+                    )
+                _provider = factory()
+    return _provider
+
+
+def set_embedding_provider(provider: Optional[EmbeddingProvider]):
+    """Swap the active provider at runtime (None resets to the configured default)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
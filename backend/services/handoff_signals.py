@@ -0,0 +1,132 @@
+"""
+Handoff signal detection with a compiled phrase matcher and per-conversation state
+
+All booking and confusion phrases are matched by one precompiled regex in a
+single pass over the message. The frustration window (confused user messages
+among the last few messages) is persisted per conversation and advanced by
+one step per message, so evaluating a turn never rescans history.
+"""
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, ConversationSignalState
+
+BOOKING_PHRASES = (
+    "book a session", "book session", "schedule a tutor", "schedule tutor",
+    "need a tutor", "want a tutor", "human tutor", "book me", "schedule me"
+)
+CONFUSION_PHRASES = (
+    "confused", "don't understand", "dont understand", "don't get it", "dont get it",
+    "not getting it", "stuck", "lost", "no idea", "have no idea", "i have no idea",
+    "i'm not sure", "im not sure", "i am not sure", "i'm lost", "i feel lost",
+    "i'm clueless", "no clue", "not sure what to do"
+)
+
+FRUSTRATION_WINDOW = 5  # Recent messages considered
+FRUSTRATION_THRESHOLD = 3  # Confused user messages in the window that trigger a handoff
+
+_PHRASE_CATEGORIES = {
+    **{phrase: "confusion" for phrase in CONFUSION_PHRASES},
+    **{phrase: "booking" for phrase in BOOKING_PHRASES},
+}
+# Longest phrases first so overlapping alternatives resolve to the most specific match
+PHRASE_PATTERN = re.compile("|".join(
+    re.escape(phrase) for phrase in sorted(_PHRASE_CATEGORIES, key=len, reverse=True)
+))
+
+
+def scan_message(text: str) -> Dict[str, bool]:
+    """
+    Match every booking/confusion phrase in one pass
+
+    Returns:
+        {"booking": bool, "confusion": bool}
+    """
+    found = {"booking": False, "confusion": False}
+    normalized = (text or "").lower().replace("’", "'")
+    for match in PHRASE_PATTERN.finditer(normalized):
+        found[_PHRASE_CATEGORIES[match.group(0)]] = True
+        if found["booking"] and found["confusion"]:
+            break
+    return found
+
+
+def message_flag(role: str, text: str) -> int:
+    """Frustration window entry for one message (1 = confused user message)"""
+    return int(role == "user" and scan_message(text)["confusion"])
+
+
+def window_from_history(history: List[Dict]) -> List[int]:
+    """Frustration window rebuilt from client-supplied history (when no stored state exists)"""
+    return [
+        message_flag(message.get("role", "user"), message.get("content", ""))
+        for message in history[-FRUSTRATION_WINDOW:]
+    ]
+
+
+def state_to_dict(state: ConversationSignalState) -> Dict:
+    return {
+        "conversation_id": state.conversation_id,
+        "recent_flags": list(state.recent_flags or []),
+        "user_messages": state.user_messages or 0,
+        "confusion_messages": state.confusion_messages or 0,
+        "booking_requests": state.booking_requests or 0,
+        "handoffs": state.handoffs or 0,
+        "last_handoff_reason": state.last_handoff_reason,
+        "updated_at": state.updated_at.isoformat() if state.updated_at else None,
+    }
+
+
+def load_signal_state(db, conversation_id: int) -> Optional[Dict]:
+    """Stored signal state for a conversation, or None"""
+    state = db.query(ConversationSignalState).filter(
+        ConversationSignalState.conversation_id == conversation_id
+    ).first()
+    return state_to_dict(state) if state else None
+
+
+def record_turn_signals(conversation_id: int, user_message: str, result: Dict):
+    """
+    Advance a conversation's signal state by one chat turn
+
+    Args:
+        conversation_id: Conversation the turn was appended to
+        user_message: Student message
+        result: Chat result (should_handoff / handoff_message)
+    """
+    matched = scan_message(user_message)
+    db = SessionLocal()
+    try:
+        state = db.query(ConversationSignalState).filter(
+            ConversationSignalState.conversation_id == conversation_id
+        ).first()
+        if state is None:
+            state = ConversationSignalState(
+                conversation_id=conversation_id,
+                recent_flags=[],
+                user_messages=0,
+                confusion_messages=0,
+                booking_requests=0,
+                handoffs=0
+            )
+            db.add(state)
+
+        # User message, then the assistant reply (never a confusion signal)
+        flags = list(state.recent_flags or []) + [int(matched["confusion"]), 0]
+        state.recent_flags = flags[-FRUSTRATION_WINDOW:]
+        state.user_messages = (state.user_messages or 0) + 1
+        state.confusion_messages = (state.confusion_messages or 0) + int(matched["confusion"])
+        state.booking_requests = (state.booking_requests or 0) + int(matched["booking"])
+        if result.get("should_handoff"):
+            state.handoffs = (state.handoffs or 0) + 1
+            state.last_handoff_reason = result.get("handoff_message")
+        state.updated_at = datetime.utcnow()
+        db.commit()
+    except IntegrityError:
+        # Another worker created the row concurrently; losing one turn's counters is acceptable
+        db.rollback()
+    finally:
+        db.close()
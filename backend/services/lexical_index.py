@@ -0,0 +1,101 @@
+"""
+In-process BM25 inverted index for keyword retrieval over transcript text
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Function words that carry no retrieval signal in tutoring questions
+STOPWORDS = frozenset("""
+a about an and are as at be but by can did do does for from how i in is it me my
+of on or so that the this to was we what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Compact BM25 index over a small document set (e.g. one student's transcripts)
+
+    Postings map each term to {doc_index: term_frequency}; documents and
+    metadata are kept alongside so hits can be returned without a vector
+    store round trip.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._total_length = 0
+
+    def add(self, doc_id: str, text: str, metadata: Optional[Dict] = None):
+        """Index a document"""
+        doc_index = len(self.ids)
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_index] = frequency
+
+        length = sum(terms.values())
+        self.ids.append(doc_id)
+        self.documents.append(text)
+        self.metadatas.append(metadata or {})
+        self.doc_lengths.append(length)
+        self._total_length += length
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def idf(self, term: str) -> float:
+        document_frequency = len(self.postings.get(term, {}))
+        return math.log(1 + (len(self.ids) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float, float]]:
+        """
+        Score documents against a query
+
+        Returns:
+            List of (doc_index, bm25_score, term_coverage) sorted by score, where
+            term_coverage is the fraction of distinct query terms the document contains
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms or not self.ids:
+            return []
+
+        average_length = self._total_length / len(self.ids) or 1.0
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for term in query_terms:
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            idf = self.idf(term)
+            for doc_index, frequency in term_postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_index] / average_length)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+                matched[doc_index] = matched.get(doc_index, 0) + 1
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            (doc_index, score, matched[doc_index] / len(query_terms))
+            for doc_index, score in ranked
+        ]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> Dict[str, float]:
+    """Fuse several ranked id lists into RRF scores (higher is better)"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
@@ -0,0 +1,352 @@
+"""
+Shared LLM gateway: deadlines, retries, concurrency limits and circuit breaking
+
+Every chat completion (chat, streaming chat, quizzes, summaries) goes through
+this module instead of calling the OpenAI clients directly. A call gets an
+overall deadline, retryable failures (timeouts, connection errors, 429 and
+5xx) are retried with jittered exponential backoff, in-flight calls are capped
+per model, and a per-model circuit breaker fails fast with
+LLMUnavailableError after repeated failures so callers can return their
+fallback responses instead of queueing on a failing upstream.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from services.registry import get_async_openai_client, get_openai_client
+
+# HTTP connection pool shared by each client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+
+# Per-call policy
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))  # All attempts of one call
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "4"))
+LLM_MAX_CONCURRENCY_PER_MODEL = int(os.getenv("LLM_MAX_CONCURRENCY_PER_MODEL", "16"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))  # Wait for a free slot
+LLM_QUEUE_POLL_SECONDS = 0.01  # Async callers poll the shared slot limit instead of holding a thread
+
+# Circuit breaker
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # Consecutive failed calls that open it
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))  # Open time before a probe call
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    """The model is failing fast (circuit open, saturated, or deadline exhausted)"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def client_options(async_client: bool = False) -> Dict:
+    """Keyword arguments for OpenAI / AsyncOpenAI: pooled transport, default timeout, gateway-owned retries"""
+    import httpx
+
+    timeout = httpx.Timeout(LLM_DEADLINE_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS
+    )
+    http_client = (httpx.AsyncClient if async_client else httpx.Client)(timeout=timeout, limits=limits)
+    return {"timeout": timeout, "max_retries": 0, "http_client": http_client}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient upstream failures worth another attempt"""
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (TimeoutError, asyncio.TimeoutError))
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)"""
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one probe) -> closed"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may start (at most one probe while half-open)"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.probing = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def cancel_probe(self):
+        """Give back a probe slot that was granted but never used"""
+        with self._lock:
+            self.probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class ModelGate:
+    """Concurrency limit, circuit breaker and counters for one model"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS)
+        # One limit shared by threads and every event loop in the process
+        self.semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY_PER_MODEL)
+        self.counts = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "rejected": 0, "in_flight": 0}
+        self._lock = threading.Lock()
+
+    async def acquire_async(self, timeout: float) -> bool:
+        """Take a slot of the shared limit without blocking the event loop"""
+        deadline = time.monotonic() + timeout
+        delay = LLM_QUEUE_POLL_SECONDS
+        while not self.semaphore.acquire(blocking=False):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.1)
+        return True
+
+    def count(self, name: str, delta: int = 1):
+        with self._lock:
+            self.counts[name] += delta
+
+    def admit(self):
+        """Fail fast while the breaker is open"""
+        if not self.breaker.allow():
+            self.count("rejected")
+            retry_after = self.breaker.retry_after()
+            raise LLMUnavailableError(
+                f"{self.model} is temporarily unavailable (circuit open, retry in {retry_after:.0f}s)",
+                retry_after=retry_after
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counts, "breaker": self.breaker.state, "consecutive_failures": self.breaker.failures}
+
+
+_gates: Dict[str, ModelGate] = {}
+_gates_lock = threading.Lock()
+
+
+def get_gate(model: str) -> ModelGate:
+    gate = _gates.get(model)
+    if gate is None:
+        with _gates_lock:
+            gate = _gates.setdefault(model, ModelGate(model))
+    return gate
+
+
+def _remaining(deadline: float) -> float:
+    return deadline - time.monotonic()
+
+
+def _attempts(gate: ModelGate):
+    """Attempt numbers of one call (callers stop early on success, non-retryable errors or the deadline)"""
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if attempt:
+            gate.count("retries")
+        yield attempt
+
+
+def chat_completion(deadline_seconds: Optional[float] = None, **kwargs) -> Any:
+    """
+    Blocking chat completion through the gateway
+
+    Args:
+        deadline_seconds: Overall deadline for all attempts (default LLM_DEADLINE_SECONDS)
+        **kwargs: chat.completions.create arguments (model, messages, ...)
+
+    Raises:
+        LLMUnavailableError: circuit open, no free slot in time, or deadline exhausted
+    """
+    gate = get_gate(kwargs["model"])
+    gate.admit()
+    deadline = time.monotonic() + (deadline_seconds or LLM_DEADLINE_SECONDS)
+    if not gate.semaphore.acquire(timeout=min(LLM_QUEUE_TIMEOUT_SECONDS, max(0.0, _remaining(deadline)))):
+        gate.breaker.cancel_probe()
+        gate.count("rejected")
+        raise LLMUnavailableError(f"{kwargs['model']} is at its concurrency limit")
+    gate.count("calls")
+    gate.count("in_flight")
+    try:
+        for attempt in _attempts(gate):
+            try:
+                response = get_openai_client().chat.completions.create(timeout=_remaining(deadline), **kwargs)
+                gate.breaker.record_success()
+                gate.count("succeeded")
+                return response
+            except Exception as e:
+                delay = backoff_seconds(attempt)
+                if not is_retryable(e) or attempt == LLM_MAX_RETRIES or _remaining(deadline) <= delay:
+                    _record_failure(gate, e)
+                    raise
+                time.sleep(delay)
+    finally:
+        gate.count("in_flight", -1)
+        gate.semaphore.release()
+
+
+async def chat_completion_async(deadline_seconds: Optional[float] = None, **kwargs) -> Any:
+    """Async chat completion through the gateway (same policy as chat_completion)"""
+    gate = get_gate(kwargs["model"])
+    gate.admit()
+    deadline = time.monotonic() + (deadline_seconds or LLM_DEADLINE_SECONDS)
+    try:
+        acquired = await gate.acquire_async(min(LLM_QUEUE_TIMEOUT_SECONDS, max(0.0, _remaining(deadline))))
+    except BaseException:
+        gate.breaker.cancel_probe()
+        raise
+    if not acquired:
+        gate.breaker.cancel_probe()
+        gate.count("rejected")
+        raise LLMUnavailableError(f"{kwargs['model']} is at its concurrency limit")
+    gate.count("calls")
+    gate.count("in_flight")
+    try:
+        for attempt in _attempts(gate):
+            try:
+                response = await asyncio.wait_for(
+                    get_async_openai_client().chat.completions.create(timeout=_remaining(deadline), **kwargs),
+                    timeout=_remaining(deadline)
+                )
+                gate.breaker.record_success()
+                gate.count("succeeded")
+                return response
+            except Exception as e:
+                delay = backoff_seconds(attempt)
+                if not is_retryable(e) or attempt == LLM_MAX_RETRIES or _remaining(deadline) <= delay:
+                    _record_failure(gate, e)
+                    raise
+                await asyncio.sleep(delay)
+    finally:
+        gate.count("in_flight", -1)
+        gate.semaphore.release()
+
+
+def stream_chat_completion(deadline_seconds: Optional[float] = None, **kwargs) -> Iterator[Any]:
+    """
+    Streaming chat completion through the gateway
+
+    Only opening the stream is retried; once chunks have been yielded a
+    failure is raised to the caller. The overall deadline also covers the
+    stream: it is checked between chunks, and each read times out at the
+    time left. The concurrency slot and the upstream response are held
+    until the stream is exhausted or closed.
+    """
+    gate = get_gate(kwargs["model"])
+    gate.admit()
+    deadline = time.monotonic() + (deadline_seconds or LLM_DEADLINE_SECONDS)
+    if not gate.semaphore.acquire(timeout=min(LLM_QUEUE_TIMEOUT_SECONDS, max(0.0, _remaining(deadline)))):
+        gate.breaker.cancel_probe()
+        gate.count("rejected")
+        raise LLMUnavailableError(f"{kwargs['model']} is at its concurrency limit")
+    gate.count("calls")
+    gate.count("in_flight")
+    try:
+        for attempt in _attempts(gate):
+            try:
+                stream = get_openai_client().chat.completions.create(
+                    timeout=_remaining(deadline), stream=True, **kwargs
+                )
+                break
+            except Exception as e:
+                delay = backoff_seconds(attempt)
+                if not is_retryable(e) or attempt == LLM_MAX_RETRIES or _remaining(deadline) <= delay:
+                    _record_failure(gate, e)
+                    raise
+                time.sleep(delay)
+    except BaseException:
+        gate.count("in_flight", -1)
+        gate.semaphore.release()
+        raise
+    return _guarded_stream(gate, stream, deadline)
+
+
+def _guarded_stream(gate: ModelGate, stream, deadline: float) -> Iterator[Any]:
+    try:
+        for chunk in stream:
+            yield chunk
+            if _remaining(deadline) <= 0:
+                raise TimeoutError(f"{gate.model} stream exceeded its deadline")
+        gate.breaker.record_success()
+        gate.count("succeeded")
+    except Exception as e:
+        _record_failure(gate, e)
+        raise
+    finally:
+        # Also runs on early exit (GeneratorExit); release the HTTP response and its pooled connection
+        try:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            gate.count("in_flight", -1)
+            gate.semaphore.release()
+
+
+def _record_failure(gate: ModelGate, error: Exception):
+    gate.count("failed")
+    # Client errors (bad request, auth) say nothing about upstream health;
+    # a probe that hits one leaves the breaker half-open for the next call
+    if is_retryable(error):
+        gate.breaker.record_failure()
+    elif gate.breaker.probing:
+        gate.breaker.cancel_probe()
+
+
+def get_llm_gateway_stats() -> Dict:
+    """Per-model call counters and breaker states for this worker"""
+    with _gates_lock:
+        gates = list(_gates.values())
+    return {
+        "max_concurrency_per_model": LLM_MAX_CONCURRENCY_PER_MODEL,
+        "models": {gate.model: gate.stats() for gate in gates},
+    }
@@ -0,0 +1,191 @@
+"""
+Model routing for chat turns
+
+Before generation each turn is classified from cheap local features (message
+length, question complexity, retrieval distance, handoff signals, subject)
+and sent either to a fast small model or to the full model. Greetings,
+thanks and short, well-grounded follow-ups go to the fast model; anything
+long, technical, poorly grounded or from a struggling student stays on the
+full model. Every decision is counted, kept in a recent-decisions buffer
+and optionally appended to a JSONL log (CHAT_ROUTING_LOG_PATH) for offline
+evaluation (benchmarks/model_routing_eval.py).
+"""
+import json
+import os
+import re
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from services.handoff_signals import FRUSTRATION_THRESHOLD, scan_message, window_from_history
+
+# Routing configuration
+CHAT_ROUTING_ENABLED = os.getenv("CHAT_ROUTING_ENABLED", "true").lower() == "true"
+FAST_MODEL_NAME = os.getenv("CHAT_FAST_MODEL", "gpt-4o-mini")
+FULL_MODEL_NAME = os.getenv("CHAT_FULL_MODEL", "gpt-4o")
+CHAT_ROUTING_LOG_PATH = os.getenv("CHAT_ROUTING_LOG_PATH", "")  # Empty = no decision log file
+
+FAST_MAX_WORDS = 12  # Longest follow-up the fast model may answer
+COMPLEX_MIN_WORDS = 40  # Messages this long always use the full model
+WEAK_RETRIEVAL_DISTANCE = 1.0  # Squared L2 on unit vectors (cosine similarity < 0.5)
+RECENT_DECISIONS = 200
+
+# Subjects where even short questions tend to need worked reasoning
+REASONING_SUBJECTS = {"math", "algebra", "geometry", "calculus", "physics", "chemistry", "sat math"}
+
+# One or more greeting / acknowledgement phrases and nothing else ("ok thanks!", "got it, that makes sense")
+SMALLTALK_PATTERN = re.compile(
+    r"^\s*(?:(?:hi|hey|hello|yo|good (?:morning|afternoon|evening)|thanks(?: so much)?|thank you|thx|ty|"
+    r"ok(?:ay)?|cool|great|awesome|perfect|got it|(?:that )?makes sense|bye|see you|nice)\b[\s,!.?😊🙂👍]*)+$",
+    re.IGNORECASE
+)
+REASONING_PATTERN = re.compile(
+    r"\b(why|how|explain|prove|derive|solve|calculate|compare|difference between|step by step)\b|[=+\-*/^√∫]\s*\d|\d\s*[=+\-*/^]",
+    re.IGNORECASE
+)
+
+
+def extract_features(
+    message: str,
+    context: Optional[List[Dict]],
+    history: List[Dict],
+    signals: Optional[Dict] = None,
+    subject: Optional[str] = None
+) -> Dict:
+    """Cheap local features of one chat turn"""
+    matched = scan_message(message)
+    flags = signals["recent_flags"] if signals else window_from_history(history)
+    distances = [doc["distance"] for doc in (context or []) if doc.get("distance") is not None]
+    return {
+        "words": len(message.split()),
+        "smalltalk": bool(SMALLTALK_PATTERN.match(message)),
+        "reasoning": bool(REASONING_PATTERN.search(message)),
+        "best_distance": round(min(distances), 4) if distances else None,
+        "context_docs": len(context or []),
+        "confusion": matched["confusion"],
+        "booking": matched["booking"],
+        "recent_confusion": sum(flags),
+        "history_messages": len(history),
+        "subject": (subject or "General").strip().lower(),
+    }
+
+
+def choose_tier(features: Dict) -> Tuple[str, str]:
+    """
+    Routing rules
+
+    Returns:
+        (tier, reason) with tier "fast" or "full"
+    """
+    if features["smalltalk"]:
+        return "fast", "smalltalk"
+    if features["confusion"] or features["booking"]:
+        return "full", "handoff signal"
+    if features["recent_confusion"] >= FRUSTRATION_THRESHOLD - 1:
+        return "full", "struggling student"
+    if features["words"] >= COMPLEX_MIN_WORDS:
+        return "full", "long message"
+    if features["reasoning"]:
+        return "full", "reasoning question"
+    if features["best_distance"] is None or features["best_distance"] > WEAK_RETRIEVAL_DISTANCE:
+        return "full", "weak retrieval"
+    if features["subject"] in REASONING_SUBJECTS:
+        return "full", "reasoning subject"
+    if features["words"] <= FAST_MAX_WORDS:
+        return "fast", "short grounded follow-up"
+    return "full", "default"
+
+
+class RoutingLog:
+    """Thread-safe routing counters, recent decisions and optional JSONL log"""
+
+    def __init__(self, path: str = "", recent: int = RECENT_DECISIONS):
+        self.path = path
+        self.counts: Dict[str, int] = {}
+        self.reasons: Dict[str, int] = {}
+        self.latency_ms: Dict[str, float] = {}
+        self.recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        decision: Dict,
+        latency_ms: Optional[float] = None,
+        result: Optional[Dict] = None,
+        tokens: Optional[Dict] = None
+    ):
+        entry = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "model": decision["model"],
+            "tier": decision["tier"],
+            "reason": decision["reason"],
+            "features": decision["features"],
+            "latency_ms": round(latency_ms, 1) if latency_ms is not None else None,
+            "prompt_tokens": tokens.get("prompt_tokens") if tokens else None,
+            "completion_tokens": tokens.get("completion_tokens") if tokens else None,
+            "confidence_score": result.get("confidence_score") if result else None,
+            "should_handoff": result.get("should_handoff") if result else None,
+        }
+        with self._lock:
+            self.counts[decision["tier"]] = self.counts.get(decision["tier"], 0) + 1
+            self.reasons[decision["reason"]] = self.reasons.get(decision["reason"], 0) + 1
+            if latency_ms is not None:
+                self.latency_ms[decision["tier"]] = self.latency_ms.get(decision["tier"], 0.0) + latency_ms
+            self.recent.append(entry)
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(entry) + "\n")
+                except OSError as e:
+                    print(f"Warning: Failed to write routing log: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                "enabled": CHAT_ROUTING_ENABLED,
+                "models": {"fast": FAST_MODEL_NAME, "full": FULL_MODEL_NAME},
+                "turns": total,
+                "tiers": dict(self.counts),
+                "fast_share": round(self.counts.get("fast", 0) / total, 4) if total else 0.0,
+                "reasons": dict(self.reasons),
+                "mean_latency_ms": {
+                    tier: round(self.latency_ms[tier] / self.counts[tier], 1)
+                    for tier in self.latency_ms if self.counts.get(tier)
+                },
+                "recent": list(self.recent)[-20:],
+            }
+
+
+routing_log = RoutingLog(CHAT_ROUTING_LOG_PATH)
+
+
+def route_chat_turn(
+    message: str,
+    context: Optional[List[Dict]],
+    history: List[Dict],
+    signals: Optional[Dict] = None,
+    subject: Optional[str] = None
+) -> Dict:
+    """
+    Pick the model for a chat turn
+
+    Returns:
+        {"model", "tier", "reason", "features"}
+    """
+    features = extract_features(message, context, history, signals, subject)
+    if not CHAT_ROUTING_ENABLED:
+        tier, reason = "full", "routing disabled"
+    else:
+        tier, reason = choose_tier(features)
+    return {
+        "model": FAST_MODEL_NAME if tier == "fast" else FULL_MODEL_NAME,
+        "tier": tier,
+        "reason": reason,
+        "features": features,
+    }
+
+
+def get_routing_stats() -> Dict:
+    return routing_log.stats()
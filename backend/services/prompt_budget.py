@@ -0,0 +1,123 @@
+"""
+Token counting and budgeting for prompt assembly
+
+Counts use tiktoken's o200k_base encoding (gpt-4o / gpt-4o-mini) when tiktoken
+is installed, and a ~4 characters per token estimate otherwise.
+"""
+import math
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+PROMPT_ENCODING = "o200k_base"
+CHARS_PER_TOKEN = 4  # Fallback estimate for English text
+TRUNCATION_MARKER = "…"
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """tiktoken encoding, or None if tiktoken is not installed"""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(PROMPT_ENCODING)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text"""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens, marking the cut with an ellipsis"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max(0, max_tokens * CHARS_PER_TOKEN - 1)].rstrip() + TRUNCATION_MARKER
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens - 1]).rstrip() + TRUNCATION_MARKER
+
+
+class TokenBudget:
+    """Running token allowance shared by the sections of one prompt"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.remaining = total
+
+    def fits(self, text: str) -> bool:
+        return count_tokens(text) <= self.remaining
+
+    def spend(self, text: str) -> str:
+        """Charge text unconditionally (used for parts that are never trimmed)"""
+        self.remaining -= count_tokens(text)
+        return text
+
+    def take(self, text: str, max_tokens: Optional[int] = None, min_tokens: int = 16) -> Optional[str]:
+        """
+        Charge text, truncated to max_tokens and to what is left of the budget
+
+        Returns:
+            The (possibly truncated) text, or None if fewer than min_tokens
+            would fit (a fragment that short isn't worth including)
+        """
+        limit = self.remaining if max_tokens is None else min(max_tokens, self.remaining)
+        tokens = count_tokens(text)
+        if tokens > limit:
+            if limit < min_tokens:
+                return None
+            text = truncate_to_tokens(text, limit)
+            tokens = count_tokens(text)
+        self.remaining -= tokens
+        return text
+
+
+class PromptTokenStats:
+    """Thread-safe per-section token counters for built prompts"""
+
+    def __init__(self):
+        self.prompts = 0
+        self.trimmed = 0
+        self._sections: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, section_tokens: Dict[str, int], trimmed_sections: Iterable[str] = ()):
+        trimmed_sections = list(trimmed_sections)
+        with self._lock:
+            self.prompts += 1
+            if trimmed_sections:
+                self.trimmed += 1
+            for name, tokens in section_tokens.items():
+                section = self._sections.setdefault(name, {"total": 0, "max": 0, "last": 0, "trimmed": 0})
+                section["total"] += tokens
+                section["max"] = max(section["max"], tokens)
+                section["last"] = tokens
+            for name in trimmed_sections:
+                self._sections.setdefault(name, {"total": 0, "max": 0, "last": 0, "trimmed": 0})["trimmed"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "prompts": self.prompts,
+                "trimmed_prompts": self.trimmed,
+                "tokenizer": "tiktoken" if get_encoding() is not None else "estimate",
+                "sections": {
+                    name: {
+                        "mean": round(section["total"] / self.prompts, 1) if self.prompts else 0.0,
+                        "max": section["max"],
+                        "last": section["last"],
+                        "trimmed": section["trimmed"],
+                    }
+                    for name, section in self._sections.items()
+                },
+            }
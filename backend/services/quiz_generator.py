@@ -1,23 +1,14 @@
 """
 Quiz Generation Service with Adaptive Difficulty and Auto-Goal Completion
 """
-import os
 import json
 import uuid
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from openai import OpenAI
-from dotenv import load_dotenv
 from database import SessionLocal, Student, QuizResult, Goal
-from services.rag_engine import retrieve_context
-
-load_dotenv()
-
-# Initialize OpenAI client
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY environment variable must be set")
-openai_client = OpenAI(api_key=api_key)
+from services.llm_gateway import LLMUnavailableError, chat_completion
+from services.rag_engine import retrieve_context, retrieve_context_async
+from services.student_cache import get_student_profile
 
 MODEL_NAME = "gpt-4o-mini"
 
@@ -37,15 +28,15 @@ def calculate_difficulty_level(student_id: str) -> Tuple[str, Dict]:
     Returns:
         Tuple of (difficulty_string, performance_dict)
     """
+    student = get_student_profile(student_id)
+    if not student:
+        return "medium", {"avg_score": 0, "quiz_count": 0}
+    
     db = SessionLocal()
     try:
-        student = db.query(Student).filter(Student.student_id == student_id).first()
-        if not student:
-            return "medium", {"avg_score": 0, "quiz_count": 0}
-        
         # Get last 5 quiz results for this student
         recent_quizzes = db.query(QuizResult).filter(
-            QuizResult.student_id == student.id
+            QuizResult.student_id == student["id"]
         ).order_by(QuizResult.created_at.desc()).limit(5).all()
         
         if not recent_quizzes:
@@ -75,10 +66,20 @@ def calculate_difficulty_level(student_id: str) -> Tuple[str, Dict]:
         db.close()
 
 
+async def retrieve_quiz_context(student_id: str, subject: str) -> List[Dict]:
+    """Retrieve RAG context for quiz generation without blocking the event loop"""
+    return await retrieve_context_async(
+        query=f"Key concepts in {subject}",
+        student_id=student_id,
+        top_k=3
+    )
+
+
 def generate_quiz(
     student_id: str,
     subject: str,
-    num_questions: int = 5
+    num_questions: int = 5,
+    context: Optional[List[Dict]] = None
 ) -> Dict:
     """
     Generate an adaptive quiz for a student using GPT-4o.
@@ -87,6 +88,8 @@ def generate_quiz(
         student_id: Student identifier
         subject: Subject for quiz (e.g., "Chemistry", "Algebra")
         num_questions: Number of questions to generate (default 5)
+        context: Optional pre-fetched RAG context (e.g. from retrieve_quiz_context);
+            retrieved synchronously when omitted
     
     Returns:
         Dictionary with quiz_id, subject, questions list, difficulty, estimated_time
@@ -95,13 +98,39 @@ def generate_quiz(
     difficulty, performance = calculate_difficulty_level(student_id)
     
     # Retrieve relevant context from RAG engine
-    context = retrieve_context(
-        query=f"Key concepts in {subject}",
-        student_id=student_id,
-        top_k=3
-    )
+    if context is None:
+        context = retrieve_context(
+            query=f"Key concepts in {subject}",
+            student_id=student_id,
+            top_k=3
+        )
+    
+    questions = request_quiz_questions(subject, difficulty, num_questions, context)
+    return store_quiz(student_id, subject, difficulty, questions, num_questions)
+
+
+def request_quiz_questions(
+    subject: str,
+    difficulty: str,
+    num_questions: int,
+    context: Optional[List[Dict]] = None
+) -> List[Dict]:
+    """
+    Ask the model for quiz questions (shared by live generation and the quiz pool)
     
-    context_text = "\n".join([doc.get("content", "") for doc in context]) if context else ""
+    Args:
+        subject: Subject for quiz
+        difficulty: "easy", "medium" or "hard"
+        num_questions: Number of questions to generate
+        context: Optional RAG context to ground the questions in
+    
+    Returns:
+        Questions in the Question model shape (question_id, question_text, options, ...)
+    """
+    context_text = "\n".join([
+        "\n".join(doc.get("passages") or [doc.get("document", "")[:300]])
+        for doc in context
+    ]) if context else ""
     
     # Create prompt for GPT-4o to generate questions
     system_prompt = f"""You are an expert tutor creating adaptive quiz questions.
@@ -142,7 +171,7 @@ Rules:
     
     try:
         # Call GPT-4o to generate questions
-        response = openai_client.chat.completions.create(
+        response = chat_completion(
             model=MODEL_NAME,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -165,9 +194,6 @@ Rules:
         
         quiz_json = json.loads(response_text)
         
-        # Generate quiz_id
-        quiz_id = f"quiz_{uuid.uuid4().hex[:8]}"
-        
         # Transform questions to match Question model
         questions = []
         for i, q in enumerate(quiz_json.get("questions", [])[:num_questions]):
@@ -179,43 +205,57 @@ Rules:
                 "topic": q.get("topic", subject),
                 "difficulty": difficulty
             })
-        
-        # Store quiz in database
-        db = SessionLocal()
-        try:
-            student = db.query(Student).filter(Student.student_id == student_id).first()
-            if student:
-                quiz_record = QuizResult(
-                    student_id=student.id,
-                    quiz_id=quiz_id,
-                    subject=subject,
-                    difficulty=difficulty,
-                    total_questions=len(questions),
-                    questions={"questions": questions}  # Store full questions for later use
-                )
-                db.add(quiz_record)
-                db.commit()
-        finally:
-            db.close()
-        
-        # Calculate estimated time (1 minute per question on average)
-        estimated_time = num_questions
-        
-        return {
-            "quiz_id": quiz_id,
-            "subject": subject,
-            "questions": questions,
-            "num_questions": len(questions),
-            "difficulty": difficulty,
-            "estimated_time_minutes": estimated_time
-        }
+        return questions
     
+    except LLMUnavailableError:
+        raise
     except json.JSONDecodeError as e:
         raise Exception(f"Failed to parse GPT-4o response as JSON: {str(e)}")
     except Exception as e:
         raise Exception(f"Error generating quiz with GPT-4o: {str(e)}")
 
 
+def store_quiz(student_id: str, subject: str, difficulty: str, questions: List[Dict], num_questions: int) -> Dict:
+    """
+    Record a quiz for a student and build the API response
+    
+    Returns:
+        Dictionary with quiz_id, subject, questions list, difficulty, estimated_time
+    """
+    # Generate quiz_id
+    quiz_id = f"quiz_{uuid.uuid4().hex[:8]}"
+    
+    # Store quiz in database
+    student = get_student_profile(student_id)
+    db = SessionLocal()
+    try:
+        if student:
+            quiz_record = QuizResult(
+                student_id=student["id"],
+                quiz_id=quiz_id,
+                subject=subject,
+                difficulty=difficulty,
+                total_questions=len(questions),
+                questions={"questions": questions}  # Store full questions for later use
+            )
+            db.add(quiz_record)
+            db.commit()
+    finally:
+        db.close()
+    
+    # Calculate estimated time (1 minute per question on average)
+    estimated_time = num_questions
+    
+    return {
+        "quiz_id": quiz_id,
+        "subject": subject,
+        "questions": questions,
+        "num_questions": len(questions),
+        "difficulty": difficulty,
+        "estimated_time_minutes": estimated_time
+    }
+
+
 def score_quiz(quiz_id: str, submitted_answers: List[str], db=None) -> Dict:
     """
     Score a submitted quiz and return results.
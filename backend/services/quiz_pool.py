@@ -0,0 +1,388 @@
+"""
+Pre-generated quiz pool per (subject, difficulty)
+
+Quizzes are generated ahead of time into buckets keyed by subject,
+difficulty and question count (and student in the default
+QUIZ_POOL_MODE=student) and stored in the quiz_pool_entries table, so every
+worker on the database shares them. A request claims the oldest quiz in its
+bucket (a delete, so no quiz is served twice) and falls back to live
+generation on a miss. Buckets and their last-requested times live in the
+quiz_pool_buckets table; a background thread in each worker tops buckets up
+to QUIZ_POOL_TARGET, and a per-bucket refill lease in that table makes sure
+only one worker fills a given bucket at a time.
+
+The pool is off by default and only covers the subjects in QUIZ_POOL_SUBJECTS
+and up to QUIZ_POOL_MAX_QUESTIONS questions, with at most QUIZ_POOL_MAX_BUCKETS
+buckets; buckets not requested for QUIZ_POOL_IDLE_HOURS are dropped, so
+background LLM spend stays bounded whatever clients send.
+
+Student buckets are generated from the student's transcript context, like a
+live quiz. Shared buckets (QUIZ_POOL_MODE=shared) are generated without any
+transcript context: hits are more likely, but pooled quizzes are not grounded
+in the student's own sessions.
+"""
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, QuizPoolBucket, QuizPoolEntry
+from services.llm_gateway import LLMUnavailableError
+from services.quiz_generator import calculate_difficulty_level, request_quiz_questions, store_quiz
+from services.rag_engine import retrieve_context
+
+# Pool configuration
+QUIZ_POOL_ENABLED = os.getenv("QUIZ_POOL_ENABLED", "false").lower() == "true"
+QUIZ_POOL_TARGET = int(os.getenv("QUIZ_POOL_TARGET", "3"))  # Ready quizzes per bucket
+QUIZ_POOL_MODE = os.getenv("QUIZ_POOL_MODE", "student").lower()  # "student" (grounded) or "shared" (ungrounded)
+QUIZ_POOL_SUBJECTS = [s.strip() for s in os.getenv("QUIZ_POOL_SUBJECTS", "").split(",") if s.strip()]  # Allow-list
+QUIZ_POOL_MAX_QUESTIONS = int(os.getenv("QUIZ_POOL_MAX_QUESTIONS", "10"))  # Larger quizzes are generated live
+QUIZ_POOL_MAX_BUCKETS = int(os.getenv("QUIZ_POOL_MAX_BUCKETS", "100"))
+QUIZ_POOL_IDLE_HOURS = float(os.getenv("QUIZ_POOL_IDLE_HOURS", "24"))  # Unrequested buckets are dropped
+QUIZ_POOL_REFILL_INTERVAL_SECONDS = float(os.getenv("QUIZ_POOL_REFILL_INTERVAL_SECONDS", "60"))
+QUIZ_POOL_REFILL_LEASE_SECONDS = float(os.getenv("QUIZ_POOL_REFILL_LEASE_SECONDS", "300"))  # Takeover after a dead refiller
+QUIZ_POOL_MAX_AGE_HOURS = float(os.getenv("QUIZ_POOL_MAX_AGE_HOURS", "168"))  # Older quizzes are discarded
+
+DIFFICULTIES = ("easy", "medium", "hard")
+DEFAULT_NUM_QUESTIONS = 5
+
+
+def bucket_key(subject: str, difficulty: str, num_questions: int, student_id: Optional[str] = None) -> str:
+    parts = [subject.strip().lower(), difficulty, str(num_questions)]
+    if student_id:
+        parts.append(student_id)
+    return "|".join(parts)
+
+
+class QuizPool:
+    """Quiz buckets shared through the database, each refilled by one worker at a time"""
+
+    def __init__(self, target: int, mode: str):
+        self.target = target
+        self.mode = mode
+        self.owner = uuid.uuid4().hex  # Refill lease owner id of this worker
+        self.subjects = {subject.lower() for subject in QUIZ_POOL_SUBJECTS}
+        self.counts = {"hits": 0, "misses": 0, "bypassed": 0, "generated": 0, "failed": 0, "expired": 0, "dropped": 0}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _count(self, name: str, delta: int = 1):
+        with self._lock:
+            self.counts[name] += delta
+
+    def eligible(self, subject: str, num_questions: int) -> bool:
+        """Only allow-listed subjects and bounded quiz sizes are pooled"""
+        return subject.strip().lower() in self.subjects and 1 <= num_questions <= QUIZ_POOL_MAX_QUESTIONS
+
+    def register(self, subject: str, difficulty: str, num_questions: int, student_id: Optional[str] = None) -> Optional[str]:
+        """
+        Start maintaining a bucket and mark it requested (requested buckets are registered automatically)
+
+        Returns:
+            The bucket key, or None if the bucket is not eligible or the bucket limit is reached
+        """
+        if not self.eligible(subject, num_questions):
+            return None
+        if self.mode != "student":
+            student_id = None
+        key = bucket_key(subject, difficulty, num_questions, student_id)
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            touched = db.query(QuizPoolBucket).filter(QuizPoolBucket.bucket == key).update(
+                {"last_requested": now}, synchronize_session=False
+            )
+            if not touched:
+                # Workers registering at the same moment may overshoot the limit by a few buckets
+                if db.query(func.count(QuizPoolBucket.bucket)).scalar() >= QUIZ_POOL_MAX_BUCKETS:
+                    db.rollback()
+                    return None
+                db.add(QuizPoolBucket(
+                    bucket=key,
+                    subject=subject.strip(),
+                    difficulty=difficulty,
+                    num_questions=num_questions,
+                    student_id=student_id,
+                    last_requested=now
+                ))
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # Another worker registered it first
+        finally:
+            db.close()
+        return key
+
+    def take(self, subject: str, difficulty: str, num_questions: int, student_id: str) -> Optional[List[Dict]]:
+        """
+        Claim a ready quiz from the bucket
+
+        Returns:
+            Its questions, or None on a miss (the bucket is then scheduled for refill)
+        """
+        key = self.register(subject, difficulty, num_questions, student_id)
+        if key is None:
+            self._count("bypassed")
+            return None
+        cutoff = datetime.utcnow() - timedelta(hours=QUIZ_POOL_MAX_AGE_HOURS)
+        db = SessionLocal()
+        try:
+            # Another worker may claim the same row first; try the next one
+            for _ in range(3):
+                entry = db.query(QuizPoolEntry.id, QuizPoolEntry.questions).filter(
+                    QuizPoolEntry.bucket == key,
+                    QuizPoolEntry.created_at >= cutoff
+                ).order_by(QuizPoolEntry.id).first()
+                if entry is None:
+                    break
+                claimed = db.query(QuizPoolEntry).filter(QuizPoolEntry.id == entry.id).delete(synchronize_session=False)
+                db.commit()
+                if claimed:
+                    self._count("hits")
+                    self._ensure_worker()
+                    self._wake.set()
+                    return entry.questions
+        finally:
+            db.close()
+        self._count("misses")
+        self._ensure_worker()
+        self._wake.set()
+        return None
+
+    def bucket_specs(self) -> Dict[str, Dict]:
+        """All registered buckets (shared by every worker)"""
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                QuizPoolBucket.bucket, QuizPoolBucket.subject, QuizPoolBucket.difficulty,
+                QuizPoolBucket.num_questions, QuizPoolBucket.student_id
+            ).all()
+        finally:
+            db.close()
+        return {
+            bucket: {"subject": subject, "difficulty": difficulty, "num_questions": num_questions, "student_id": student_id}
+            for bucket, subject, difficulty, num_questions, student_id in rows
+        }
+
+    def depths(self) -> Dict[str, int]:
+        db = SessionLocal()
+        try:
+            buckets = [bucket for (bucket,) in db.query(QuizPoolBucket.bucket).all()]
+            rows = db.query(QuizPoolEntry.bucket, func.count(QuizPoolEntry.id)).group_by(QuizPoolEntry.bucket).all()
+        finally:
+            db.close()
+        depths = {bucket: 0 for bucket in buckets}
+        depths.update({bucket: count for bucket, count in rows})
+        return depths
+
+    def _claim_refill(self, key: str) -> bool:
+        """Take (or extend) the bucket's refill lease unless another worker holds it"""
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            claimed = db.query(QuizPoolBucket).filter(
+                QuizPoolBucket.bucket == key,
+                or_(
+                    QuizPoolBucket.refill_lease_until.is_(None),
+                    QuizPoolBucket.refill_lease_until < now,
+                    QuizPoolBucket.refill_owner == self.owner
+                )
+            ).update({
+                "refill_owner": self.owner,
+                "refill_lease_until": now + timedelta(seconds=QUIZ_POOL_REFILL_LEASE_SECONDS)
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        return claimed == 1
+
+    def _release_refill(self, key: str):
+        db = SessionLocal()
+        try:
+            db.query(QuizPoolBucket).filter(
+                QuizPoolBucket.bucket == key,
+                QuizPoolBucket.refill_owner == self.owner
+            ).update({"refill_owner": None, "refill_lease_until": None}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def refill_bucket(self, key: str, spec: Dict) -> int:
+        """
+        Generate quizzes until the bucket holds the target; returns how many were added
+
+        Only the worker holding the bucket's refill lease fills it, so the
+        target (and LLM spend) does not multiply with the number of workers.
+        """
+        if not self._claim_refill(key):
+            return 0
+        try:
+            self._expire(key)
+            db = SessionLocal()
+            try:
+                depth = db.query(func.count(QuizPoolEntry.id)).filter(QuizPoolEntry.bucket == key).scalar() or 0
+            finally:
+                db.close()
+
+            added = 0
+            for _ in range(max(0, self.target - depth)):
+                # Stop if shutting down, or if the bucket was dropped or the lease lost meanwhile
+                if self._stop.is_set() or not self._claim_refill(key):
+                    break
+                context = []
+                if spec["student_id"]:
+                    context = retrieve_context(f"Key concepts in {spec['subject']}", spec["student_id"], top_k=3)
+                questions = request_quiz_questions(spec["subject"], spec["difficulty"], spec["num_questions"], context)
+                db = SessionLocal()
+                try:
+                    db.add(QuizPoolEntry(
+                        bucket=key,
+                        subject=spec["subject"],
+                        difficulty=spec["difficulty"],
+                        num_questions=spec["num_questions"],
+                        student_id=spec["student_id"],
+                        questions=questions
+                    ))
+                    db.commit()
+                finally:
+                    db.close()
+                self._count("generated")
+                added += 1
+            return added
+        finally:
+            self._release_refill(key)
+
+    def _expire(self, key: str):
+        cutoff = datetime.utcnow() - timedelta(hours=QUIZ_POOL_MAX_AGE_HOURS)
+        db = SessionLocal()
+        try:
+            expired = db.query(QuizPoolEntry).filter(
+                QuizPoolEntry.bucket == key,
+                QuizPoolEntry.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if expired:
+            self._count("expired", expired)
+
+    def _drop_idle(self):
+        """Drop buckets no worker has served lately, with their quizzes"""
+        cutoff = datetime.utcnow() - timedelta(hours=QUIZ_POOL_IDLE_HOURS)
+        db = SessionLocal()
+        try:
+            idle = [bucket for (bucket,) in db.query(QuizPoolBucket.bucket).filter(QuizPoolBucket.last_requested < cutoff).all()]
+            for key in idle:
+                # Re-checked in the delete, so a bucket requested meanwhile by any worker is kept
+                dropped = db.query(QuizPoolBucket).filter(
+                    QuizPoolBucket.bucket == key,
+                    QuizPoolBucket.last_requested < cutoff
+                ).delete(synchronize_session=False)
+                if dropped:
+                    db.query(QuizPoolEntry).filter(QuizPoolEntry.bucket == key).delete(synchronize_session=False)
+                    self._count("dropped")
+                db.commit()
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(QUIZ_POOL_REFILL_INTERVAL_SECONDS)
+            self._wake.clear()
+            try:
+                self._drop_idle()
+                buckets = self.bucket_specs()
+            except Exception as e:
+                print(f"Warning: Failed to load quiz pool buckets: {e}")
+                continue
+            for key, spec in buckets.items():
+                if self._stop.is_set():
+                    break
+                try:
+                    self.refill_bucket(key, spec)
+                except LLMUnavailableError as e:
+                    # Upstream is failing fast; try again next cycle
+                    print(f"Warning: Quiz pool refill paused: {e}")
+                    break
+                except Exception as e:
+                    self._count("failed")
+                    print(f"Warning: Failed to refill quiz pool bucket {key}: {e}")
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name="quiz-pool-refill", daemon=True)
+                self._thread.start()
+
+    def start(self):
+        """Clear buckets that are no longer eligible, warm the allow-listed subjects and start refilling"""
+        db = SessionLocal()
+        try:
+            rows = db.query(QuizPoolBucket.bucket, QuizPoolBucket.subject, QuizPoolBucket.num_questions, QuizPoolBucket.student_id).all()
+            rows += db.query(QuizPoolEntry.bucket, QuizPoolEntry.subject, QuizPoolEntry.num_questions, QuizPoolEntry.student_id).distinct().all()
+            stale = list({
+                bucket for bucket, subject, num_questions, student_id in rows
+                if not self.eligible(subject, num_questions) or bool(student_id) != (self.mode == "student")
+            })
+            if stale:
+                db.query(QuizPoolBucket).filter(QuizPoolBucket.bucket.in_(stale)).delete(synchronize_session=False)
+                db.query(QuizPoolEntry).filter(QuizPoolEntry.bucket.in_(stale)).delete(synchronize_session=False)
+                db.commit()
+        finally:
+            db.close()
+        # Personalized buckets are registered per student on first request
+        if self.mode != "student":
+            for subject in QUIZ_POOL_SUBJECTS:
+                for difficulty in DIFFICULTIES:
+                    self.register(subject, difficulty, DEFAULT_NUM_QUESTIONS)
+        self._ensure_worker()
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        depths = self.depths()
+        with self._lock:
+            lookups = self.counts["hits"] + self.counts["misses"]
+            return {
+                "enabled": QUIZ_POOL_ENABLED,
+                "mode": self.mode,
+                "target": self.target,
+                "subjects": sorted(self.subjects),
+                "max_buckets": QUIZ_POOL_MAX_BUCKETS,
+                **self.counts,
+                "hit_rate": round(self.counts["hits"] / lookups, 4) if lookups else 0.0,
+                "buckets": depths,
+            }
+
+
+quiz_pool = QuizPool(QUIZ_POOL_TARGET, QUIZ_POOL_MODE)
+
+
+def serve_pooled_quiz(student_id: str, subject: str, num_questions: int = DEFAULT_NUM_QUESTIONS) -> Optional[Dict]:
+    """
+    Serve a quiz from the pool at the student's current difficulty
+
+    Returns:
+        Same shape as generate_quiz, or None on a miss (generate live instead)
+    """
+    if not QUIZ_POOL_ENABLED:
+        return None
+    difficulty, _ = calculate_difficulty_level(student_id)
+    questions = quiz_pool.take(subject, difficulty, num_questions, student_id)
+    if questions is None:
+        return None
+    return store_quiz(student_id, subject, difficulty, questions, num_questions)
+
+
+def get_quiz_pool_stats() -> Dict:
+    return quiz_pool.stats()
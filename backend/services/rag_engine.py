@@ -1,57 +1,252 @@
 import os
 import json
-import chromadb
-from chromadb.config import Settings
+import asyncio
 from pathlib import Path
-from openai import OpenAI
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Union
 import hashlib
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.registry import CHROMA_DB_PATH, get_chroma_client, get_or_create
+from services.embedding_batcher import embed_in_batches
+from services.embedding_cache import EmbeddingCache
+from services.embedding_providers import get_embedding_provider, DEFAULT_OPENAI_EMBEDDING_MODEL
+from services.ttl_cache import TTLCache
+from services.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
 
-# Load environment variables
-load_dotenv()
+# ChromaDB client and data directory are created lazily by services.registry
 
-# Initialize OpenAI client
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY environment variable must be set in .env file")
-openai_client = OpenAI(api_key=api_key)
-
-# ChromaDB configuration
-CHROMA_DB_PATH = Path(__file__).parent.parent / "chroma_db"
-CHROMA_DB_PATH.mkdir(exist_ok=True)
-
-# Initialize ChromaDB with persistent storage
-chroma_client = chromadb.PersistentClient(
-    path=str(CHROMA_DB_PATH),
-    settings=Settings(anonymized_telemetry=False)
-)
+# Vector store backend: "chroma" or "numpy" (student-partitioned, memory-mapped; see services/vector_store.py)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma").lower()
+NUMPY_STORE_PATH = Path(os.getenv(
+    "NUMPY_STORE_PATH",
+    str(Path(__file__).parent.parent / "vector_store")
+))
 
 # Collection name
 COLLECTION_NAME = "session_transcripts"
+CHUNK_COLLECTION_NAME = "session_transcript_chunks"
+
+# Indexing mode: "document" (one embedding per transcript) or "chunk" (windowed dialogue chunks)
+RAG_INDEX_MODE = os.getenv("RAG_INDEX_MODE", "document").lower()
+CHUNK_WINDOW_MESSAGES = int(os.getenv("CHUNK_WINDOW_MESSAGES", "6"))  # Dialogue messages per chunk
+CHUNK_OVERLAP_MESSAGES = int(os.getenv("CHUNK_OVERLAP_MESSAGES", "2"))  # Messages shared by neighbouring chunks
+CHUNK_OVERSAMPLE = 4  # Chunk hits fetched per requested transcript before aggregation
+MAX_PASSAGES_PER_TRANSCRIPT = 2  # Most relevant chunks kept per transcript
+
+# Embedding configuration (provider selected with EMBEDDING_PROVIDER, see services/embedding_providers.py)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))  # Texts per embeddings request
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))  # Requests in flight
+
+# Persistent embedding cache keyed by (model, sha256(text))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = Path(os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    str(Path(__file__).parent.parent / "embedding_cache.db")
+))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+
+# In-process cache of query embeddings for repeated queries (e.g. quiz context lookups)
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2048"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+query_embedding_cache = TTLCache(max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS)
+
+# Retrieval mode: "dense" (vector search only) or "hybrid" (BM25 + vector, fused with RRF)
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "dense").lower()
+LEXICAL_FAST_PATH_MAX_TERMS = 4  # Only short keyword-style queries may skip the embedding call
+LEXICAL_FAST_PATH_MARGIN = 1.5  # Top BM25 score must beat the runner-up by this factor
+LEXICAL_INDEX_MAX_STUDENTS = int(os.getenv("LEXICAL_INDEX_MAX_STUDENTS", "512"))
+LEXICAL_INDEX_TTL_SECONDS = float(os.getenv("LEXICAL_INDEX_TTL_SECONDS", "600"))  # Backstop for writes without a manifest
+
+# Per-student BM25 indexes, built lazily from the collection's documents and
+# keyed on the index manifest version so a re-index in any process invalidates them
+lexical_indexes = TTLCache(max_entries=LEXICAL_INDEX_MAX_STUDENTS, ttl_seconds=LEXICAL_INDEX_TTL_SECONDS)
+retrieval_counts = {"dense": 0, "hybrid": 0, "lexical_fast_path": 0}
+
+# Bounded executor for blocking vector store work issued from async code
+RAG_QUERY_WORKERS = int(os.getenv("RAG_QUERY_WORKERS", "8"))
+_query_executor = ThreadPoolExecutor(max_workers=RAG_QUERY_WORKERS, thread_name_prefix="rag-query")
+
+# Process-wide collection handles, resolved once per collection name
+_collection_handles: Dict[str, object] = {}
+_collection_lock = threading.Lock()
+
+
+def get_collection_name() -> str:
+    """Name of the collection used by the configured indexing mode and embedding provider"""
+    base_name = CHUNK_COLLECTION_NAME if RAG_INDEX_MODE == "chunk" else COLLECTION_NAME
+    provider = get_embedding_provider()
+    if provider.model == DEFAULT_OPENAI_EMBEDDING_MODEL:
+        return base_name
+    # Embedding spaces (and dimensions) differ per model; keep them in separate collections
+    return f"{base_name}__{provider.namespace}"
 
 
 def get_collection():
-    """Get or create the session_transcripts collection"""
-    try:
-        collection = chroma_client.get_collection(name=COLLECTION_NAME)
-        print(f"✅ Found existing collection: {COLLECTION_NAME}")
-    except:
-        collection = chroma_client.create_collection(
-            name=COLLECTION_NAME,
-            metadata={"description": "Tutoring session transcripts for RAG retrieval"}
-        )
-        print(f"✅ Created new collection: {COLLECTION_NAME}")
+    """Get or create the transcript collection for the configured indexing mode (cached per process)"""
+    collection_name = get_collection_name()
+    collection = _collection_handles.get(collection_name)
+    if collection is not None:
+        return collection
+    
+    with _collection_lock:
+        collection = _collection_handles.get(collection_name)
+        if collection is None and VECTOR_STORE_BACKEND == "numpy":
+            from services.vector_store import PartitionedVectorStore
+            
+            collection = PartitionedVectorStore(NUMPY_STORE_PATH / collection_name, partition_key="student_id")
+            print(f"✅ Opened partitioned vector store: {collection_name}")
+            _collection_handles[collection_name] = collection
+        elif collection is None:
+            try:
+                collection = get_chroma_client().get_collection(name=collection_name)
+                print(f"✅ Found existing collection: {collection_name}")
+            except:
+                collection = get_chroma_client().create_collection(
+                    name=collection_name,
+                    metadata={"description": "Tutoring session transcripts for RAG retrieval"}
+                )
+                print(f"✅ Created new collection: {collection_name}")
+            _collection_handles[collection_name] = collection
     return collection
 
 
-def generate_embedding(text: str) -> List[float]:
-    """Generate embedding using OpenAI's text-embedding-3-small model"""
-    response = openai_client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
+def invalidate_retrieval_caches(collections: bool = True, query_embeddings: bool = True):
+    """
+    Invalidation hook for the retrieval caches
+    
+    Call after deleting/recreating a collection or switching embedding models.
+    """
+    if collections:
+        with _collection_lock:
+            _collection_handles.clear()
+    if query_embeddings:
+        query_embedding_cache.clear()
+
+
+def invalidate_lexical_indexes():
+    """Drop per-student BM25 indexes so they are rebuilt from the collection on next use"""
+    lexical_indexes.clear()
+
+
+def get_retrieval_cache_stats() -> Dict:
+    """Return metrics for the query-embedding cache, embedding cache and collection handles"""
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "embeddings": get_embedding_cache_stats(),
+        "collection_handles": sorted(_collection_handles),
+        "lexical_indexes": lexical_indexes.stats(),
+        "retrievals": dict(retrieval_counts),
+    }
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Shared persistent embedding cache (opened on first use), or None if disabled"""
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    return get_or_create(
+        "embedding_cache",
+        lambda: EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
     )
-    return response.data[0].embedding
+
+
+def generate_embedding(text: str) -> List[float]:
+    """Generate embedding using the configured embedding provider"""
+    return generate_embeddings([text])[0]
+
+
+def embed_query(query: str) -> List[float]:
+    """Embed a search query, serving repeated queries from the in-process cache"""
+    normalized = " ".join(query.split())
+    key = (get_embedding_provider().model, normalized)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = generate_embedding(normalized)
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """Embed many search queries; cache misses are embedded in a single batched request"""
+    model = get_embedding_provider().model
+    normalized = [" ".join(query.split()) for query in queries]
+    embeddings = [query_embedding_cache.get((model, text)) for text in normalized]
+    
+    missing = list(dict.fromkeys(text for text, emb in zip(normalized, embeddings) if emb is None))
+    if missing:
+        fresh = dict(zip(missing, generate_embeddings(missing)))
+        for text, embedding in fresh.items():
+            query_embedding_cache.set((model, text), embedding)
+        embeddings = [emb if emb is not None else fresh[text] for text, emb in zip(normalized, embeddings)]
+    return embeddings
+
+
+async def embed_query_async(query: str) -> List[float]:
+    """Async version of embed_query using the provider's async client"""
+    normalized = " ".join(query.split())
+    key = (get_embedding_provider().model, normalized)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = (await generate_embeddings_async([normalized]))[0]
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+def generate_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Generate embeddings for many texts, going through the embedding cache
+    
+    Cached texts cost no API call; the remaining texts are embedded in a
+    single embeddings request and written back to the cache.
+    """
+    if not texts:
+        return []
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is None:
+        return request_embeddings(texts)
+    
+    model = get_embedding_provider().model
+    embeddings = embedding_cache.get_many(model, texts)
+    # Embed each distinct missing text once
+    missing = list(dict.fromkeys(text for text, emb in zip(texts, embeddings) if emb is None))
+    if missing:
+        fresh = dict(zip(missing, request_embeddings(missing)))
+        embedding_cache.put_many(model, missing, [fresh[text] for text in missing])
+        embeddings = [emb if emb is not None else fresh[text] for text, emb in zip(texts, embeddings)]
+    return embeddings
+
+
+async def generate_embeddings_async(texts: List[str]) -> List[List[float]]:
+    """Async version of generate_embeddings; only cache misses go to the provider"""
+    if not texts:
+        return []
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is None:
+        return await get_embedding_provider().aembed(texts)
+    
+    model = get_embedding_provider().model
+    loop = asyncio.get_running_loop()
+    embeddings = await loop.run_in_executor(_query_executor, embedding_cache.get_many, model, texts)
+    missing = list(dict.fromkeys(text for text, emb in zip(texts, embeddings) if emb is None))
+    if missing:
+        fresh = dict(zip(missing, await get_embedding_provider().aembed(missing)))
+        await loop.run_in_executor(
+            _query_executor, embedding_cache.put_many, model, missing, [fresh[text] for text in missing]
+        )
+        embeddings = [emb if emb is not None else fresh[text] for text, emb in zip(texts, embeddings)]
+    return embeddings
+
+
+def request_embeddings(texts: List[str]) -> List[List[float]]:
+    """Embed many texts in a single provider call (bypasses the cache)"""
+    return get_embedding_provider().embed(texts)
+
+
+def get_embedding_cache_stats() -> Dict:
+    """Return embedding cache hit/miss statistics"""
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_cache.stats()}
 
 
 def load_transcripts_from_directory(transcripts_dir: Path) -> List[Dict]:
@@ -91,8 +286,177 @@ def create_transcript_text(transcript: Dict) -> str:
     return "\n".join(parts)
 
 
-def embed_and_store_transcripts(transcripts_dir: Optional[Path] = None):
-    """Embed all transcripts and store in ChromaDB"""
+def create_transcript_chunks(
+    transcript: Dict,
+    window: int = CHUNK_WINDOW_MESSAGES,
+    overlap: int = CHUNK_OVERLAP_MESSAGES
+) -> List[str]:
+    """
+    Split a transcript into searchable chunks
+    
+    The first chunk carries tutor notes and key concepts; the dialogue is split
+    into overlapping windows of messages. Every chunk repeats the subject/topic
+    header so it embeds with its session context.
+    """
+    if overlap >= window:
+        raise ValueError("overlap must be smaller than window")
+    
+    header = f"Subject: {transcript.get('subject', '')} | Topic: {transcript.get('topic', '')}"
+    chunks = []
+    
+    summary_parts = []
+    if 'tutor_notes' in transcript:
+        summary_parts.append(f"Tutor Notes: {transcript['tutor_notes']}")
+    if 'key_concepts' in transcript:
+        summary_parts.append(f"Key Concepts: {', '.join(transcript['key_concepts'])}")
+    if summary_parts:
+        chunks.append("\n".join([header, *summary_parts]))
+    
+    lines = [
+        f"{msg.get('speaker', '').title()}: {msg.get('message', '')}"
+        for msg in transcript.get('dialogue', [])
+    ]
+    step = window - overlap
+    for start in range(0, len(lines), step):
+        chunks.append("\n".join([header, *lines[start:start + window]]))
+        if start + window >= len(lines):
+            break
+    
+    if not chunks:
+        chunks.append(header)
+    return chunks
+
+
+def build_transcript_records(transcript: Dict, index: int) -> List[Dict]:
+    """Build the records stored for a transcript in the configured indexing mode"""
+    record = build_transcript_record(transcript, index)
+    if RAG_INDEX_MODE != "chunk":
+        return [record]
+    
+    transcript_id = record["id"]
+    chunks = create_transcript_chunks(transcript)
+    return [
+        {
+            "id": f"{transcript_id}#c{n}",
+            "document": chunk,
+            "metadata": {
+                # Parent metadata (including the transcript-level content hash)
+                **record["metadata"],
+                "chunk_index": n,
+                "chunk_count": len(chunks),
+            }
+        }
+        for n, chunk in enumerate(chunks)
+    ]
+
+
+def build_transcript_record(transcript: Dict, index: int) -> Dict:
+    """Build the id, document text and metadata stored in ChromaDB for a transcript"""
+    # Create unique ID from transcript_id
+    transcript_id = transcript.get('transcript_id', f"transcript_{index}")
+    transcript_id_clean = transcript_id.replace(' ', '_').lower()
+    
+    document = create_transcript_text(transcript)
+    metadata = {
+        "student_id": transcript.get('student_id', ''),
+        "subject": transcript.get('subject', ''),
+        "topic": transcript.get('topic', ''),
+        "session_date": str(transcript.get('session_date', '')),
+        "transcript_id": transcript_id_clean,
+        "tutor_name": transcript.get('tutor_name', ''),
+        "difficulty": transcript.get('difficulty', 'intermediate'),
+    }
+    metadata["content_hash"] = compute_content_hash(document, metadata)
+    
+    return {
+        "id": transcript_id_clean,
+        "document": document,
+        "metadata": metadata
+    }
+
+
+def compute_content_hash(document: str, metadata: Dict) -> str:
+    """Hash the indexed content of a transcript (document text plus metadata)"""
+    payload = json.dumps(
+        {
+            "document": document,
+            "metadata": {k: v for k, v in metadata.items() if k != "content_hash"}
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_manifest_path() -> Path:
+    """Path of the index manifest (transcript_id -> content hash) for the collection"""
+    index_root = NUMPY_STORE_PATH if VECTOR_STORE_BACKEND == "numpy" else CHROMA_DB_PATH
+    return index_root / f"{get_collection_name()}.manifest.json"
+
+
+def load_index_manifest(collection) -> Dict[str, Dict]:
+    """
+    Load the index manifest, rebuilding it from collection metadata if missing
+    
+    Returns:
+        Dictionary of transcript_id -> {"hash": content hash, "ids": stored record ids}
+    """
+    manifest_path = get_manifest_path()
+    if manifest_path.exists():
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    
+    manifest: Dict[str, Dict] = {}
+    if collection.count() == 0:
+        return manifest
+    
+    # Collections indexed before the manifest existed: recover what we can
+    existing = collection.get(include=["metadatas"])
+    for record_id, metadata in zip(existing['ids'], existing['metadatas']):
+        metadata = metadata or {}
+        transcript_id = metadata.get("transcript_id", record_id)
+        entry = manifest.setdefault(transcript_id, {"hash": metadata.get("content_hash"), "ids": []})
+        entry["ids"].append(record_id)
+    return manifest
+
+
+def get_index_version() -> Optional[Tuple]:
+    """Signature of the index manifest file; every sync that changes the collection rewrites it"""
+    try:
+        stat = get_manifest_path().stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def save_index_manifest(manifest: Dict[str, Dict]):
+    """Atomically write the index manifest"""
+    manifest_path = get_manifest_path()
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def sync_transcripts(
+    transcripts_dir: Optional[Path] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_concurrency: int = EMBEDDING_MAX_CONCURRENCY
+) -> Dict:
+    """
+    Incrementally bring the collection in line with the transcripts on disk
+    
+    Compares each transcript's content hash against the index manifest,
+    upserts only new or changed transcripts, and deletes transcripts that no
+    longer exist. Work is proportional to the delta, not the corpus.
+    
+    Args:
+        transcripts_dir: Directory containing transcript JSON files
+        batch_size: Number of texts per embeddings request
+        max_concurrency: Maximum number of embeddings requests in flight
+    
+    Returns:
+        {"added": [...], "updated": [...], "removed": [...], "unchanged": int}
+    """
     if transcripts_dir is None:
         transcripts_dir = Path(__file__).parent.parent.parent / "data" / "transcripts"
     
@@ -101,65 +465,119 @@ def embed_and_store_transcripts(transcripts_dir: Optional[Path] = None):
     print(f"✅ Loaded {len(transcripts)} transcripts")
     
     collection = get_collection()
+    manifest = load_index_manifest(collection)
     
-    # Check if collection already has documents
-    existing_count = collection.count()
-    if existing_count > 0:
-        print(f"⚠️  Collection already has {existing_count} documents. Skipping embedding.")
-        return
+    # Group records by parent transcript
+    current: Dict[str, List[Dict]] = {}
+    for i, transcript in enumerate(transcripts):
+        records = build_transcript_records(transcript, i)
+        transcript_id = records[0]["metadata"]["transcript_id"]
+        if transcript_id in current:
+            print(f"⚠️  Duplicate transcript_id {transcript_id}; keeping the last one")
+        current[transcript_id] = records
     
-    print(f"🔮 Generating embeddings for {len(transcripts)} transcripts...")
+    def group_hash(records: List[Dict]) -> str:
+        return records[0]["metadata"]["content_hash"]
     
-    ids = []
-    embeddings = []
-    metadatas = []
-    documents = []
+    added = [tid for tid in current if tid not in manifest]
+    updated = [
+        tid for tid in current
+        if tid in manifest and manifest[tid].get("hash") != group_hash(current[tid])
+    ]
+    removed = [tid for tid in manifest if tid not in current]
+    unchanged = len(current) - len(added) - len(updated)
     
-    for i, transcript in enumerate(transcripts):
-        # Create unique ID from transcript_id
-        transcript_id = transcript.get('transcript_id', f"transcript_{i}")
-        transcript_id_clean = transcript_id.replace(' ', '_').lower()
-        
-        # Create searchable text
-        text = create_transcript_text(transcript)
-        
-        # Generate embedding
-        embedding = generate_embedding(text)
-        
-        # Prepare metadata
-        metadata = {
-            "student_id": transcript.get('student_id', ''),
-            "subject": transcript.get('subject', ''),
-            "topic": transcript.get('topic', ''),
-            "session_date": str(transcript.get('session_date', '')),
-            "transcript_id": transcript_id_clean,
-            "tutor_name": transcript.get('tutor_name', ''),
-            "difficulty": transcript.get('difficulty', 'intermediate'),
-        }
-        
-        ids.append(transcript_id_clean)
-        embeddings.append(embedding)
-        metadatas.append(metadata)
-        documents.append(text)
+    # Delete transcripts that disappeared from disk
+    if removed:
+        stale_ids = [record_id for tid in removed for record_id in manifest[tid]["ids"]]
+        collection.delete(ids=stale_ids)
+        for tid in removed:
+            del manifest[tid]
+        save_index_manifest(manifest)
+        print(f"🗑️  Removed {len(removed)} transcripts ({len(stale_ids)} records)")
+    
+    changed = added + updated
+    records = [record for tid in changed for record in current[tid]]
+    pending = {tid: len(current[tid]) for tid in changed}
+    
+    if records:
+        print(f"🔮 Embedding {len(changed)} new/changed transcripts ({len(records)} records, "
+              f"batch size {batch_size}, concurrency {max_concurrency})...")
+    
+    stored = 0
+    for batch, embeddings in embed_in_batches(
+        records,
+        generate_embeddings,
+        batch_size=batch_size,
+        max_concurrency=max_concurrency,
+        text_of=lambda record: record["document"]
+    ):
+        # Stream each finished batch into ChromaDB
+        collection.upsert(
+            ids=[record["id"] for record in batch],
+            embeddings=embeddings,
+            metadatas=[record["metadata"] for record in batch],
+            documents=[record["document"] for record in batch]
+        )
+        stored += len(batch)
         
-        print(f"  ✅ Embedded: {transcript_id_clean} ({i+1}/{len(transcripts)})")
-    
-    # Batch add to ChromaDB
-    print(f"\n💾 Storing {len(ids)} embeddings in ChromaDB...")
-    collection.add(
-        ids=ids,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        documents=documents
-    )
+        # Record transcripts whose records are now all written
+        for record in batch:
+            tid = record["metadata"]["transcript_id"]
+            pending[tid] -= 1
+            if pending[tid] == 0:
+                new_ids = [r["id"] for r in current[tid]]
+                stale_ids = [rid for rid in manifest.get(tid, {}).get("ids", []) if rid not in new_ids]
+                if stale_ids:
+                    collection.delete(ids=stale_ids)
+                manifest[tid] = {"hash": group_hash(current[tid]), "ids": new_ids}
+        save_index_manifest(manifest)
+        print(f"  ✅ Embedded and stored batch of {len(batch)} ({stored}/{len(records)})")
     
-    print(f"✅ Successfully stored {len(ids)} transcript embeddings!")
-    print(f"📊 Collection now contains {collection.count()} documents")
+    if changed or removed:
+        invalidate_lexical_indexes()
+    
+    return {
+        "added": added,
+        "updated": updated,
+        "removed": removed,
+        "unchanged": unchanged
+    }
+
+
+def embed_and_store_transcripts(
+    transcripts_dir: Optional[Path] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_concurrency: int = EMBEDDING_MAX_CONCURRENCY
+) -> Dict:
+    """
+    Embed transcripts and store them in ChromaDB
+    
+    Indexing is incremental (see sync_transcripts): texts are packed into
+    batched embeddings requests, a bounded number of batches run
+    concurrently, and each finished batch is written to ChromaDB as soon as
+    it arrives.
+    
+    Args:
+        transcripts_dir: Directory containing transcript JSON files
+        batch_size: Number of transcripts per embeddings request
+        max_concurrency: Maximum number of embeddings requests in flight
+    
+    Returns:
+        Change report from sync_transcripts
+    """
+    report = sync_transcripts(transcripts_dir, batch_size=batch_size, max_concurrency=max_concurrency)
+    
+    print(f"✅ Index sync complete: {len(report['added'])} added, {len(report['updated'])} updated, "
+          f"{len(report['removed'])} removed, {report['unchanged']} unchanged")
+    print(f"📊 Collection now contains {get_collection().count()} documents")
+    print(f"🗄️  Embedding cache: {get_embedding_cache_stats()}")
+    return report
 
 
 def retrieve_context(query: str, student_id: str, top_k: int = 3) -> List[Dict]:
     """
-    Retrieve relevant context using semantic search
+    Retrieve relevant context using semantic (or hybrid) search
     
     Args:
         query: Search query string
@@ -167,33 +585,254 @@ def retrieve_context(query: str, student_id: str, top_k: int = 3) -> List[Dict]:
         top_k: Number of results to return
     
     Returns:
-        List of dictionaries with retrieved context including metadata and distance scores
+        List of dictionaries with retrieved context including metadata and distance scores.
+        In chunk mode each entry is a transcript with its most relevant "passages".
     """
-    collection = get_collection()
+    n_candidates = get_candidate_count(top_k)
+    
+    lexical_hits = []
+    if RAG_RETRIEVAL_MODE == "hybrid":
+        lexical_hits, confident = search_lexical(query, student_id, n_candidates)
+        if confident:
+            # Keyword match is unambiguous: answer without an embedding call
+            retrieval_counts["lexical_fast_path"] += 1
+            return finalize_hits(lexical_hits, top_k)
+    
+    # Generate embedding for query (cached for repeated queries)
+    query_embedding = embed_query(query)
+    
+    results = query_collection([query_embedding], student_id, n_candidates)
+    return rank_results(results, 0, lexical_hits, top_k)
+
+
+async def retrieve_context_async(query: str, student_id: str, top_k: int = 3) -> List[Dict]:
+    """
+    Async version of retrieve_context for use from async request handlers
+    
+    The query embedding goes through the provider's async client and vector
+    store work runs on a bounded executor, so the event loop keeps serving
+    other requests while retrieval is in flight.
+    """
+    loop = asyncio.get_running_loop()
+    n_candidates = get_candidate_count(top_k)
+    
+    lexical_hits = []
+    if RAG_RETRIEVAL_MODE == "hybrid":
+        lexical_hits, confident = await loop.run_in_executor(
+            _query_executor, search_lexical, query, student_id, n_candidates
+        )
+        if confident:
+            retrieval_counts["lexical_fast_path"] += 1
+            return finalize_hits(lexical_hits, top_k)
+    
+    query_embedding = await embed_query_async(query)
+    
+    results = await loop.run_in_executor(
+        _query_executor, query_collection, [query_embedding], student_id, n_candidates
+    )
+    return rank_results(results, 0, lexical_hits, top_k)
+
+
+def retrieve_context_many(
+    queries: List[str],
+    student_ids: Union[str, List[str]],
+    top_k: int = 3
+) -> List[List[Dict]]:
+    """
+    Retrieve context for several queries (and/or students) in one call
+    
+    All queries that need vector search are embedded in one batched request,
+    and queries for the same student run as a single multi-embedding vector
+    store query (the student filter is per query, so distinct students cost
+    one query each). Results are demultiplexed back per input.
     
-    # Generate embedding for query
-    query_embedding = generate_embedding(query)
+    Args:
+        queries: Search query strings
+        student_ids: One student ID for all queries, or one per query
+        top_k: Number of results per query
+    
+    Returns:
+        List of context lists aligned with queries (same shape as retrieve_context)
+    """
+    if isinstance(student_ids, str):
+        student_ids = [student_ids] * len(queries)
+    if len(student_ids) != len(queries):
+        raise ValueError("student_ids must be a single ID or match the number of queries")
+    
+    n_candidates = get_candidate_count(top_k)
+    outputs: List[Optional[List[Dict]]] = [None] * len(queries)
+    lexical_hits: Dict[int, List[Dict]] = {}
+    
+    pending = []
+    for i, (query, student_id) in enumerate(zip(queries, student_ids)):
+        if RAG_RETRIEVAL_MODE == "hybrid":
+            lexical_hits[i], confident = search_lexical(query, student_id, n_candidates)
+            if confident:
+                retrieval_counts["lexical_fast_path"] += 1
+                outputs[i] = finalize_hits(lexical_hits[i], top_k)
+                continue
+        pending.append(i)
+    
+    if pending:
+        embeddings = dict(zip(pending, embed_queries([queries[i] for i in pending])))
+        
+        by_student: Dict[str, List[int]] = {}
+        for i in pending:
+            by_student.setdefault(student_ids[i], []).append(i)
+        
+        for student_id, positions in by_student.items():
+            results = query_collection([embeddings[i] for i in positions], student_id, n_candidates)
+            for row, i in enumerate(positions):
+                outputs[i] = rank_results(results, row, lexical_hits.get(i, []), top_k)
+    
+    return outputs
+
+
+def get_candidate_count(top_k: int) -> int:
+    """Number of records to fetch from the vector store for top_k results"""
+    return top_k * CHUNK_OVERSAMPLE if RAG_INDEX_MODE == "chunk" else top_k
+
+
+def query_collection(query_embeddings: List[List[float]], student_id: str, n_results: int) -> Dict:
+    """Run a vector query restricted to one student's records"""
+    collection = get_collection()
     
     # Query ChromaDB with student_id filter
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k,
+    return collection.query(
+        query_embeddings=query_embeddings,
+        n_results=n_results,
         where={"student_id": student_id}  # Filter by student_id
     )
+
+
+def rank_results(results: Dict, row: int, lexical_hits: List[Dict], top_k: int) -> List[Dict]:
+    """Produce the final context list for one query row, fusing lexical hits in hybrid mode"""
+    if RAG_RETRIEVAL_MODE == "hybrid":
+        retrieval_counts["hybrid"] += 1
+        return finalize_hits(fuse_hits(hits_from_results(results, row), lexical_hits), top_k)
+    
+    retrieval_counts["dense"] += 1
+    return format_query_results(results, row, top_k)
+
+
+def format_query_results(results: Dict, row: int, top_k: int) -> List[Dict]:
+    """Turn one row of a ChromaDB query result into retrieved context entries"""
+    return finalize_hits(hits_from_results(results, row), top_k)
+
+
+def hits_from_results(results: Dict, row: int) -> List[Dict]:
+    """Extract record-level hits (best first) from one row of a ChromaDB query result"""
+    hits = []
+    if not results['ids'] or len(results['ids'][row]) == 0:
+        return hits
     
-    # Format results
-    retrieved_contexts = []
-    if results['ids'] and len(results['ids'][0]) > 0:
-        for i in range(len(results['ids'][0])):
-            context = {
-                "transcript_id": results['ids'][0][i],
-                "document": results['documents'][0][i],
-                "metadata": results['metadatas'][0][i],
-                "distance": results['distances'][0][i] if 'distances' in results else None
+    for i in range(len(results['ids'][row])):
+        hits.append({
+            "transcript_id": results['ids'][row][i],
+            "document": results['documents'][row][i],
+            "metadata": results['metadatas'][row][i],
+            "distance": results['distances'][row][i] if 'distances' in results else None
+        })
+    return hits
+
+
+def finalize_hits(hits: List[Dict], top_k: int) -> List[Dict]:
+    """Cut record-level hits to top_k results, aggregating chunks per transcript in chunk mode"""
+    if RAG_INDEX_MODE == "chunk":
+        return aggregate_chunk_hits(hits, top_k)
+    return hits[:top_k]
+
+
+def get_lexical_index(student_id: str) -> BM25Index:
+    """Return the student's BM25 index, building it from the collection on first use after each re-index"""
+    def build() -> BM25Index:
+        index = BM25Index()
+        records = get_collection().get(
+            where={"student_id": student_id},
+            include=["documents", "metadatas"]
+        )
+        for record_id, document, metadata in zip(records['ids'], records['documents'], records['metadatas']):
+            index.add(record_id, document or "", metadata)
+        return index
+    
+    return lexical_indexes.get_or_set((student_id, get_index_version()), build)
+
+
+def search_lexical(query: str, student_id: str, n_results: int):
+    """
+    Keyword search over a student's transcripts
+    
+    Returns:
+        Tuple of (hits, confident) where confident means the lexical result is
+        strong enough to answer without vector search: a short keyword query
+        whose terms all appear in a top hit that clearly outscores the runner-up.
+    """
+    index = get_lexical_index(student_id)
+    ranked = index.search(query, top_k=n_results)
+    hits = [
+        {
+            "transcript_id": index.ids[doc_index],
+            "document": index.documents[doc_index],
+            "metadata": index.metadatas[doc_index],
+            "distance": None,
+            "score": score,
+        }
+        for doc_index, score, _ in ranked
+    ]
+    
+    query_terms = set(tokenize(query))
+    confident = False
+    if ranked and 0 < len(query_terms) <= LEXICAL_FAST_PATH_MAX_TERMS and ranked[0][2] == 1.0:
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        confident = ranked[0][1] >= LEXICAL_FAST_PATH_MARGIN * runner_up
+    return hits, confident
+
+
+def fuse_hits(dense_hits: List[Dict], lexical_hits: List[Dict]) -> List[Dict]:
+    """Merge dense and lexical hits with reciprocal rank fusion (best first)"""
+    fused_scores = reciprocal_rank_fusion([
+        [hit["transcript_id"] for hit in dense_hits],
+        [hit["transcript_id"] for hit in lexical_hits],
+    ])
+    # Prefer the dense copy of a hit so its distance is kept
+    by_id = {hit["transcript_id"]: hit for hit in lexical_hits}
+    by_id.update({hit["transcript_id"]: hit for hit in dense_hits})
+    
+    fused = []
+    for record_id, score in sorted(fused_scores.items(), key=lambda item: item[1], reverse=True):
+        fused.append({**by_id[record_id], "score": score})
+    return fused
+
+
+def aggregate_chunk_hits(hits: List[Dict], top_k: int) -> List[Dict]:
+    """
+    Aggregate chunk-level hits back to their parent transcripts
+    
+    Transcripts are ranked by their best chunk; each keeps its most relevant
+    passages (best first) in place of the full document.
+    """
+    by_transcript: Dict[str, Dict] = {}
+    for hit in hits:  # Hits arrive ordered best-first
+        metadata = hit["metadata"] or {}
+        transcript_id = metadata.get("transcript_id", hit["transcript_id"])
+        entry = by_transcript.get(transcript_id)
+        if entry is None:
+            parent_metadata = {
+                k: v for k, v in metadata.items() if k not in ("chunk_index", "chunk_count")
+            }
+            entry = by_transcript[transcript_id] = {
+                "transcript_id": transcript_id,
+                "metadata": parent_metadata,
+                "distance": hit["distance"],
+                "passages": [],
             }
-            retrieved_contexts.append(context)
+        if len(entry["passages"]) < MAX_PASSAGES_PER_TRANSCRIPT:
+            entry["passages"].append(hit["document"])
     
-    return retrieved_contexts
+    aggregated = list(by_transcript.values())[:top_k]
+    for entry in aggregated:
+        entry["document"] = "\n...\n".join(entry["passages"])
+    return aggregated
 
 
 def test_retrieval():
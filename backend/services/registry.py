@@ -0,0 +1,161 @@
+"""
+Lazily initialized, process-wide service handles
+
+Importing a service module no longer builds clients or opens stores. The
+shared LLM clients, the vector store client and the database schema are
+created on first use (or eagerly by warm_up() in the FastAPI lifespan) and
+reused by every module in the process.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from dotenv import load_dotenv
+
+# Load environment variables once for the whole backend
+load_dotenv()
+
+CHROMA_DB_PATH = Path(__file__).parent.parent / "chroma_db"
+
+_instances: Dict[str, Any] = {}
+_init_seconds: Dict[str, float] = {}
+_lock = threading.RLock()
+
+
+def get_or_create(name: str, factory: Callable[[], Any]) -> Any:
+    """Return the named shared instance, creating it with factory on first use"""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            start = time.perf_counter()
+            instance = factory()
+            _init_seconds[name] = time.perf_counter() - start
+            _instances[name] = instance
+    return instance
+
+
+def override(name: str, instance: Any):
+    """Install a specific instance (e.g. a fake client in benchmarks)"""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset(name: str = None):
+    """Forget one (or every) shared instance so it is recreated on next use"""
+    with _lock:
+        if name is None:
+            _instances.clear()
+            _init_seconds.clear()
+        else:
+            _instances.pop(name, None)
+            _init_seconds.pop(name, None)
+
+
+def _require_api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        if os.getenv("OPENAI_BASE_URL"):
+            # Local stand-ins (benchmarks/fake_openai_server.py) accept any key
+            return "local"
+        raise ValueError("OPENAI_API_KEY environment variable must be set in .env file")
+    return api_key
+
+
+def _client_kwargs(async_client: bool = False) -> Dict:
+    """API key, optional OPENAI_BASE_URL and the gateway's pooled transport settings"""
+    from services.llm_gateway import client_options
+
+    kwargs = {"api_key": _require_api_key(), **client_options(async_client=async_client)}
+    if os.getenv("OPENAI_BASE_URL"):
+        kwargs["base_url"] = os.getenv("OPENAI_BASE_URL")
+    return kwargs
+
+
+def get_openai_client():
+    """Shared synchronous OpenAI client (one tuned connection pool per process; call it via services.llm_gateway)"""
+    def create():
+        from openai import OpenAI
+
+        return OpenAI(**_client_kwargs())
+
+    return get_or_create("openai_client", create)
+
+
+def get_async_openai_client():
+    """Shared asynchronous OpenAI client"""
+    def create():
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(**_client_kwargs(async_client=True))
+
+    return get_or_create("async_openai_client", create)
+
+
+def get_chroma_client():
+    """Shared persistent ChromaDB client"""
+    def create():
+        import chromadb
+        from chromadb.config import Settings
+
+        CHROMA_DB_PATH.mkdir(exist_ok=True)
+        return chromadb.PersistentClient(
+            path=str(CHROMA_DB_PATH),
+            settings=Settings(anonymized_telemetry=False)
+        )
+
+    return get_or_create("chroma_client", create)
+
+
+def init_database():
+    """Create database tables once per process"""
+    def create():
+        from database import init_db
+
+        init_db()
+        return True
+
+    return get_or_create("database", create)
+
+
+def get_vector_store():
+    """Shared handle to the transcript collection used by the RAG engine"""
+    from services.rag_engine import get_collection
+
+    return get_collection()
+
+
+def warm_up():
+    """Eagerly initialize the database, vector store and LLM clients (called at startup)"""
+    init_database()
+    get_vector_store()
+    if os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_BASE_URL"):
+        get_openai_client()
+        get_async_openai_client()
+
+
+def readiness() -> Dict:
+    """Report which shared services are initialized and how long each took to create"""
+    components = {
+        name: {"ready": name in _instances, "init_ms": round(_init_seconds.get(name, 0.0) * 1000, 1)}
+        for name in ("database", "chroma_client", "openai_client", "async_openai_client")
+    }
+    # The chroma client is not used with the numpy vector store backend
+    from services.rag_engine import VECTOR_STORE_BACKEND, _collection_handles
+
+    if VECTOR_STORE_BACKEND != "chroma":
+        components.pop("chroma_client")
+    components["vector_store"] = {"ready": bool(_collection_handles), "backend": VECTOR_STORE_BACKEND}
+
+    from services.llm_gateway import get_llm_gateway_stats
+
+    required = ["database", "vector_store"]
+    return {
+        "ready": all(components[name]["ready"] for name in required),
+        "components": components,
+        "llm": get_llm_gateway_stats(),
+    }
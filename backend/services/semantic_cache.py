@@ -0,0 +1,125 @@
+"""
+Semantic response cache for repeated tutoring questions
+
+Responses are grouped by scope (the chat agent uses one per student) and
+subject. A lookup embeds the question and returns the stored response of the
+most similar earlier question in the same scope if its cosine similarity is
+above the threshold. Scopes never share entries, so one student's answers
+are never served to another.
+"""
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+from services.ttl_cache import TTLCache
+
+
+class _ScopeEntries:
+    """Normalized question embeddings and responses for one (scope, subject)"""
+
+    def __init__(self):
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.values: List[Dict] = []
+        self.expires_at: List[float] = []
+
+    def prune(self, now: float):
+        keep = [i for i, expires_at in enumerate(self.expires_at) if expires_at > now]
+        if len(keep) < len(self.values):
+            self.vectors = self.vectors[keep]
+            self.values = [self.values[i] for i in keep]
+            self.expires_at = [self.expires_at[i] for i in keep]
+
+
+class SemanticResponseCache:
+    """Per-scope nearest-neighbour response cache with TTL, LRU eviction and hit metrics"""
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_seconds: float = 3600.0,
+        max_scopes: int = 1024,
+        max_entries_per_scope: int = 64
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_scope = max_entries_per_scope
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._scopes = TTLCache(max_entries=max_scopes, ttl_seconds=None)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def lookup(self, scope: Hashable, subject: str, embedding: Sequence[float]) -> Optional[Dict]:
+        """
+        Most similar stored response in the scope
+
+        Returns:
+            {"value": stored dict, "similarity": float}, or None on a miss
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            entries = self._scopes.get((scope, subject))
+            if entries is not None:
+                entries.prune(time.monotonic())
+            if entries is None or not entries.values or entries.vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            similarities = entries.vectors @ query
+            best = int(np.argmax(similarities))
+            if float(similarities[best]) < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {"value": entries.values[best], "similarity": float(similarities[best])}
+
+    def store(self, scope: Hashable, subject: str, embedding: Sequence[float], value: Dict):
+        """Remember a response for a question, evicting the scope's oldest entry if full"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            entries = self._scopes.get((scope, subject))
+            if entries is None or entries.vectors.shape[1:] != (vector.shape[0],):
+                entries = _ScopeEntries()
+                entries.vectors = np.zeros((0, vector.shape[0]), dtype=np.float32)
+                self._scopes.set((scope, subject), entries)
+            entries.prune(time.monotonic())
+            if len(entries.values) >= self.max_entries_per_scope:
+                entries.vectors = entries.vectors[1:]
+                entries.values = entries.values[1:]
+                entries.expires_at = entries.expires_at[1:]
+                self.evictions += 1
+            entries.vectors = np.vstack([entries.vectors, vector[None, :]])
+            entries.values.append(value)
+            entries.expires_at.append(time.monotonic() + self.ttl_seconds)
+            self.stores += 1
+
+    def invalidate_scope(self, scope: Hashable) -> int:
+        """Drop every subject cached for a scope; returns the number of (scope, subject) groups removed"""
+        with self._lock:
+            return self._scopes.invalidate_where(lambda key: key[0] == scope)
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "scopes": len(self._scopes),
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+            }
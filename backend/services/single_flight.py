@@ -0,0 +1,266 @@
+"""
+Single-flight coalescing of identical in-flight LLM requests
+
+Concurrent calls with the same key (a double-clicked "Generate quiz", a
+retried chat message) share one execution: the first caller runs it and the
+others await its result. Within a worker this covers async tasks and
+threads; with SINGLE_FLIGHT_LEASE_PATH set, a SQLite lease extends it to the
+other workers on the host, which poll for the leader's stored result.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from services.registry import get_or_create
+
+# Coalescing configuration
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+# Optional cross-worker lease (empty = in-process only)
+SINGLE_FLIGHT_LEASE_PATH = os.getenv("SINGLE_FLIGHT_LEASE_PATH", "")
+SINGLE_FLIGHT_LEASE_SECONDS = float(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", "120"))  # Takeover after a dead leader
+SINGLE_FLIGHT_RESULT_TTL_SECONDS = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL_SECONDS", "10"))  # For polling waiters
+SINGLE_FLIGHT_POLL_SECONDS = 0.1
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", "60"))  # Then followers run it themselves
+
+
+def request_key(*parts: Any) -> str:
+    """Stable hash of a normalized request (parts must be JSON-serializable)"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SqliteLease:
+    """Per-key leases and short-lived results shared by the workers on one host"""
+
+    def __init__(self, path: Path, lease_seconds: float, result_ttl_seconds: float):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; acquire() opens its own IMMEDIATE transaction for the check-and-set
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS single_flight (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                lease_expires REAL NOT NULL,
+                result TEXT,
+                result_expires REAL
+            )
+            """
+        )
+
+    def acquire(self, key: str, waiting: bool = False) -> Tuple[str, Any]:
+        """
+        Take the lease for key unless another worker holds it
+
+        Args:
+            key: Request key
+            waiting: True if this caller was already told to wait; only
+                waiters receive a finished result, new callers start a new call
+
+        Returns:
+            ("leader", None), ("result", value) once the worker it waited on
+            has finished, or ("wait", None) while another worker is running it
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            committed = False
+            try:
+                row = self._conn.execute(
+                    "SELECT owner, lease_expires, result, result_expires FROM single_flight WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                if row is not None:
+                    owner, lease_expires, result, result_expires = row
+                    if waiting and result is not None and result_expires > now:
+                        return "result", json.loads(result)
+                    if result is None and lease_expires > now and owner != self.owner:
+                        return "wait", None
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO single_flight (key, owner, lease_expires, result, result_expires) "
+                    "VALUES (?, ?, ?, NULL, NULL)",
+                    (key, self.owner, now + self.lease_seconds)
+                )
+                return "leader", None
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                committed = True
+                raise
+            finally:
+                if not committed:
+                    self._conn.execute("COMMIT")
+
+    def complete(self, key: str, value: Any):
+        """Publish the leader's result for workers waiting on key"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE single_flight SET result = ?, result_expires = ? WHERE key = ? AND owner = ?",
+                (json.dumps(value), time.time() + self.result_ttl_seconds, key, self.owner)
+            )
+            # Opportunistic cleanup of expired entries
+            self._conn.execute(
+                "DELETE FROM single_flight WHERE lease_expires < ? AND (result_expires IS NULL OR result_expires < ?)",
+                (time.time(), time.time())
+            )
+
+    def release(self, key: str):
+        """Give up a failed lease so a waiting worker can take over"""
+        with self._lock:
+            self._conn.execute("DELETE FROM single_flight WHERE key = ? AND owner = ? AND result IS NULL", (key, self.owner))
+
+
+def get_lease() -> Optional[SqliteLease]:
+    """Shared lease store (opened on first use), or None if not configured"""
+    if not SINGLE_FLIGHT_LEASE_PATH:
+        return None
+    return get_or_create("single_flight_lease", lambda: SqliteLease(
+        SINGLE_FLIGHT_LEASE_PATH, SINGLE_FLIGHT_LEASE_SECONDS, SINGLE_FLIGHT_RESULT_TTL_SECONDS
+    ))
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_results = 0
+        self.abandoned = 0
+        self._flights: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable) -> Tuple[Future, bool]:
+        """
+        Join the in-flight call for key, or register a new one
+
+        Returns:
+            (future, is_leader); the leader must call finish() exactly once
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            self.leaders += 1
+            return future, True
+
+    def finish(self, key: Hashable, result: Any = None, error: Optional[BaseException] = None):
+        """Resolve the call for key (thread-safe; callable from any thread)"""
+        with self._lock:
+            future = self._flights.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def abandon(self, key: Hashable, future: Future):
+        """Drop a call whose leader never finished, so the next caller for key leads"""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+                self.abandoned += 1
+
+    async def wait(self, key: Hashable, future: Future) -> Any:
+        """
+        Await another caller's result (a cancelled follower never cancels the shared call)
+
+        Raises:
+            asyncio.TimeoutError: The leader did not finish within
+                SINGLE_FLIGHT_WAIT_SECONDS; the call is abandoned and the
+                caller should run the request itself
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), SINGLE_FLIGHT_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            self.abandon(key, future)
+            raise
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await fn() once for all concurrent callers with the same key
+
+        Results must be JSON-serializable when a cross-worker lease is configured.
+        """
+        if not SINGLE_FLIGHT_ENABLED:
+            return await fn()
+        future, leader = self.join(key)
+        if not leader:
+            try:
+                return await self.wait(key, future)
+            except asyncio.TimeoutError:
+                return await fn()
+        try:
+            result = await self._run_leased(key, fn)
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result)
+        return result
+
+    async def _run_leased(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        lease = get_lease()
+        if lease is None:
+            return await fn()
+        lease_key = f"{self.name}:{key}"
+        waiting = False
+        while True:
+            state, value = await asyncio.to_thread(lease.acquire, lease_key, waiting)
+            if state == "result":
+                self.shared_results += 1
+                return value
+            if state == "leader":
+                break
+            waiting = True
+            await asyncio.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+        try:
+            result = await fn()
+        except BaseException:
+            await asyncio.to_thread(lease.release, lease_key)
+            raise
+        await asyncio.to_thread(lease.complete, lease_key, result)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "shared_results": self.shared_results,
+                "abandoned": self.abandoned,
+                "in_flight": len(self._flights),
+            }
+
+
+quiz_flights = SingleFlight("quiz")
+chat_flights = SingleFlight("chat")
+
+
+def get_single_flight_stats() -> Dict:
+    return {
+        "enabled": SINGLE_FLIGHT_ENABLED,
+        "lease_path": SINGLE_FLIGHT_LEASE_PATH or None,
+        "quiz": quiz_flights.stats(),
+        "chat": chat_flights.stats(),
+    }
@@ -0,0 +1,215 @@
+"""
+Student context cache: profile and active goals per student
+
+Lookups go through an in-process LRU with TTL and, optionally, a shared
+SQLite store (STUDENT_CACHE_SHARED_PATH) so several workers on one host can
+reuse each other's loads. Writes that change a profile or its goals must
+call invalidate_student_profile(); with a shared store, other workers' local
+copies are bounded by STUDENT_CACHE_LOCAL_TTL_SECONDS.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from database import SessionLocal, Student, Goal, User
+from services.registry import get_or_create
+from services.ttl_cache import TTLCache
+
+# Cache configuration
+STUDENT_CACHE_ENABLED = os.getenv("STUDENT_CACHE_ENABLED", "true").lower() == "true"
+STUDENT_CACHE_MAX_ENTRIES = int(os.getenv("STUDENT_CACHE_MAX_ENTRIES", "4096"))
+STUDENT_CACHE_TTL_SECONDS = float(os.getenv("STUDENT_CACHE_TTL_SECONDS", "300"))
+
+# Optional shared store (empty = in-process only)
+STUDENT_CACHE_SHARED_PATH = os.getenv("STUDENT_CACHE_SHARED_PATH", "")
+STUDENT_CACHE_LOCAL_TTL_SECONDS = float(os.getenv("STUDENT_CACHE_LOCAL_TTL_SECONDS", "5"))
+
+student_profiles = TTLCache(
+    max_entries=STUDENT_CACHE_MAX_ENTRIES,
+    ttl_seconds=(
+        min(STUDENT_CACHE_TTL_SECONDS, STUDENT_CACHE_LOCAL_TTL_SECONDS)
+        if STUDENT_CACHE_SHARED_PATH else STUDENT_CACHE_TTL_SECONDS
+    )
+)
+profile_loads = {"database": 0, "shared": 0}
+
+
+class SharedProfileStore:
+    """SQLite-backed profile store shared by the workers on one host"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS student_profiles (
+                student_id TEXT PRIMARY KEY,
+                profile TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, student_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT profile FROM student_profiles WHERE student_id = ? AND expires_at > ?",
+                (student_id, time.time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, student_id: str, profile: Dict, ttl_seconds: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO student_profiles (student_id, profile, expires_at) VALUES (?, ?, ?)",
+                (student_id, json.dumps(profile), time.time() + ttl_seconds)
+            )
+            self._conn.commit()
+
+    def delete(self, student_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM student_profiles WHERE student_id = ?", (student_id,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM student_profiles")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM student_profiles").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "path": str(self.path),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+            }
+
+
+def get_shared_store() -> Optional[SharedProfileStore]:
+    """Shared profile store (opened on first use), or None if not configured"""
+    if not STUDENT_CACHE_SHARED_PATH:
+        return None
+    return get_or_create("student_profile_store", lambda: SharedProfileStore(STUDENT_CACHE_SHARED_PATH))
+
+
+def load_student_profile(student_id: str) -> Optional[Dict]:
+    """
+    Load a student's profile and active goals from the database
+
+    Returns:
+        Profile dict (including the Student primary key as "id"), or None if
+        the student doesn't exist
+    """
+    db = SessionLocal()
+    try:
+        student = db.query(Student).filter(Student.student_id == student_id).first()
+        if not student:
+            return None
+
+        # Get user info
+        user = db.query(User).filter(User.id == student.user_id).first()
+
+        # Get current goals
+        goals = db.query(Goal).filter(
+            Goal.student_id == student.id,
+            Goal.status == "active"
+        ).all()
+
+        return {
+            "id": student.id,
+            "student_id": student.student_id,
+            "name": user.name if user else "Student",
+            "grade": user.grade if user else None,
+            "engagement_level": student.engagement_level,
+            "avg_quiz_score": student.avg_quiz_score,
+            "current_goals": [
+                {
+                    "subject": goal.subject,
+                    "description": goal.description,
+                    "progress_percent": goal.progress_percent
+                }
+                for goal in goals
+            ]
+        }
+    finally:
+        db.close()
+
+
+def get_student_profile(student_id: str) -> Optional[Dict]:
+    """
+    Cached student profile and active goals (treat the result as read-only)
+
+    Unknown students are not cached, so a newly created student is visible
+    immediately.
+
+    Returns:
+        Profile dict as returned by load_student_profile, or None
+    """
+    if not STUDENT_CACHE_ENABLED:
+        return load_student_profile(student_id)
+
+    profile = student_profiles.get(student_id)
+    if profile is not None:
+        return profile
+
+    shared_store = get_shared_store()
+    if shared_store is not None:
+        profile = shared_store.get(student_id)
+        if profile is not None:
+            profile_loads["shared"] += 1
+            student_profiles.set(student_id, profile)
+            return profile
+
+    profile = load_student_profile(student_id)
+    profile_loads["database"] += 1
+    if profile is not None:
+        student_profiles.set(student_id, profile)
+        if shared_store is not None:
+            shared_store.set(student_id, profile, STUDENT_CACHE_TTL_SECONDS)
+    return profile
+
+
+def invalidate_student_profile(student_id: str):
+    """Drop a student's cached profile after a write to the student, user or goals"""
+    student_profiles.invalidate(student_id)
+    shared_store = get_shared_store()
+    if shared_store is not None:
+        shared_store.delete(student_id)
+
+
+def clear_student_profiles():
+    """Drop every cached profile (e.g. after bulk data loads)"""
+    student_profiles.clear()
+    shared_store = get_shared_store()
+    if shared_store is not None:
+        shared_store.clear()
+
+
+def get_student_cache_stats() -> Dict:
+    """Return metrics for the local and shared profile caches"""
+    shared_store = get_shared_store()
+    return {
+        "local": student_profiles.stats(),
+        "shared": shared_store.stats() if shared_store is not None else None,
+        "loads": dict(profile_loads),
+    }
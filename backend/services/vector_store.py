@@ -0,0 +1,308 @@
+"""
+Student-partitioned vector store backed by memory-mapped NumPy matrices
+
+Implements the subset of the ChromaDB collection API used by the RAG engine
+(add/upsert/delete/get/query/count), so it can be swapped in behind
+retrieve_context with VECTOR_STORE_BACKEND=numpy and benchmarked against
+Chroma. Each partition (one student) is a contiguous float32 matrix on disk
+searched with exact vectorized dot products. Partitions written by another
+process (an indexing run, another API worker) are reloaded when their files
+change on disk.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class _Partition:
+    """One partition's records and its (memory-mapped) embedding matrix"""
+
+    def __init__(self, name: str, directory: Path):
+        self.name = name
+        self.directory = directory
+        self.version: Optional[Tuple] = None  # On-disk signature of the loaded files
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.sq_norms = np.zeros(0, dtype=np.float32)
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.directory / "vectors.npy"
+
+    @property
+    def records_path(self) -> Path:
+        return self.directory / "records.json"
+
+    def disk_version(self) -> Optional[Tuple]:
+        """Signature of the files on disk (save() replaces both, so any write changes it)"""
+        try:
+            records = self.records_path.stat()
+            vectors = self.vectors_path.stat()
+        except FileNotFoundError:
+            return None
+        return (records.st_ino, records.st_mtime_ns, vectors.st_ino, vectors.st_mtime_ns)
+
+    def changed_on_disk(self) -> bool:
+        return self.disk_version() != self.version
+
+    def load(self, attempts: int = 5):
+        """(Re)load from disk; retried if another process replaces the files mid-read"""
+        for _ in range(attempts):
+            version = self.disk_version()
+            if version is None:
+                self.ids, self.documents, self.metadatas = [], [], []
+                self.vectors = np.zeros((0, 0), dtype=np.float32)
+                self.sq_norms = np.zeros(0, dtype=np.float32)
+                self.version = None
+                return
+            try:
+                with open(self.records_path, 'r') as f:
+                    records = json.load(f)
+                vectors = np.load(self.vectors_path, mmap_mode="r")
+            except (FileNotFoundError, ValueError):
+                time.sleep(0.01)
+                continue
+            if self.disk_version() != version or len(vectors) != len(records["ids"]):
+                time.sleep(0.01)
+                continue
+            self.ids = records["ids"]
+            self.documents = records["documents"]
+            self.metadatas = records["metadatas"]
+            self.vectors = vectors
+            self.sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+            self.version = version
+            return
+        raise RuntimeError(f"Vector store partition kept changing while loading: {self.directory}")
+
+    def save(self, vectors: np.ndarray):
+        """Atomically persist records and vectors, then re-map the matrix from disk"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_vectors = self.directory / "vectors.tmp.npy"
+        np.save(tmp_vectors, np.ascontiguousarray(vectors, dtype=np.float32))
+        tmp_records = self.directory / "records.tmp.json"
+        with open(tmp_records, 'w') as f:
+            json.dump({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}, f)
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_records, self.records_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        self.sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        self.version = self.disk_version()
+
+
+class PartitionedVectorStore:
+    """ChromaDB-collection-compatible store partitioned by a metadata key"""
+
+    def __init__(self, root: Path, partition_key: str = "student_id"):
+        self.root = Path(root)
+        self.partition_key = partition_key
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._partitions: Dict[str, _Partition] = {}
+        self._id_partitions: Dict[str, str] = {}  # Record id -> partition, for loaded partitions
+        self._lock = threading.RLock()
+        self._root_version: Optional[int] = None
+
+    # Partition management
+
+    @staticmethod
+    def _partition_name(partition: str) -> str:
+        """Collision-free directory name: the hex-encoded partition id (safe on case-insensitive filesystems)"""
+        return "p" + partition.encode("utf-8").hex()
+
+    @staticmethod
+    def _partition_from_name(name: str) -> Optional[str]:
+        if not name.startswith("p"):
+            return None
+        try:
+            return bytes.fromhex(name[1:]).decode("utf-8")
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def _partition_dir(self, partition: str) -> Path:
+        return self.root / self._partition_name(partition)
+
+    def _index_ids(self, partition: _Partition):
+        for record_id in partition.ids:
+            self._id_partitions[record_id] = partition.name
+
+    def _unindex_ids(self, partition: _Partition):
+        for record_id in partition.ids:
+            if self._id_partitions.get(record_id) == partition.name:
+                del self._id_partitions[record_id]
+
+    def _partition(self, partition: str) -> _Partition:
+        """Cached partition, reloaded if another process has rewritten it"""
+        loaded = self._partitions.get(partition)
+        if loaded is None:
+            loaded = _Partition(partition, self._partition_dir(partition))
+            loaded.load()
+            self._partitions[partition] = loaded
+            self._index_ids(loaded)
+        elif loaded.changed_on_disk():
+            self._unindex_ids(loaded)
+            loaded.load()
+            self._index_ids(loaded)
+        return loaded
+
+    def _load_all(self):
+        """Load every partition, rescanning the directory only when partitions were added or removed"""
+        root_version = self.root.stat().st_mtime_ns
+        if root_version != self._root_version:
+            for directory in self.root.iterdir():
+                if not (directory / "records.json").exists():
+                    continue
+                partition = self._partition_from_name(directory.name)
+                if partition is None or self._partition_name(partition) != directory.name:
+                    print(f"Warning: Skipping vector store directory with an unrecognized name (re-index to migrate): {directory}")
+                    continue
+                self._partition(partition)
+            self._root_version = root_version
+        for partition in list(self._partitions):
+            self._partition(partition)
+
+    def _partitions_for(self, where: Optional[Dict]) -> List[_Partition]:
+        if where and isinstance(where.get(self.partition_key), str):
+            return [self._partition(where[self.partition_key])]
+        self._load_all()
+        return list(self._partitions.values())
+
+    def _remove_rows(self, partition: _Partition, keep: List[int]):
+        vectors = np.asarray(partition.vectors)[keep]
+        self._unindex_ids(partition)
+        partition.ids = [partition.ids[row] for row in keep]
+        partition.documents = [partition.documents[row] for row in keep]
+        partition.metadatas = [partition.metadatas[row] for row in keep]
+        partition.save(vectors)
+        self._index_ids(partition)
+
+    @staticmethod
+    def _matches(metadata: Dict, where: Optional[Dict]) -> bool:
+        return not where or all(metadata.get(key) == value for key, value in where.items())
+
+    # Collection API
+
+    def count(self) -> int:
+        with self._lock:
+            self._load_all()
+            return sum(len(partition.ids) for partition in self._partitions.values())
+
+    def add(self, ids, embeddings, metadatas, documents):
+        self.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        with self._lock:
+            grouped: Dict[str, List[int]] = {}
+            for i, metadata in enumerate(metadatas):
+                grouped.setdefault(str((metadata or {}).get(self.partition_key, "")), []).append(i)
+
+            # A record whose partition key changed moves: drop it from its old (loaded) partition
+            moved: Dict[str, set] = {}
+            for partition_name, positions in grouped.items():
+                for i in positions:
+                    old = self._id_partitions.get(ids[i])
+                    if old is not None and old != partition_name:
+                        moved.setdefault(old, set()).add(ids[i])
+            for old, moved_ids in moved.items():
+                partition = self._partition(old)
+                self._remove_rows(partition, [row for row, record_id in enumerate(partition.ids) if record_id not in moved_ids])
+
+            for partition_name, positions in grouped.items():
+                partition = self._partition(partition_name)
+                existing = {record_id: row for row, record_id in enumerate(partition.ids)}
+                vectors = np.array(partition.vectors, dtype=np.float32) if len(partition.ids) else None
+                appended = []
+                for i in positions:
+                    row = existing.get(ids[i])
+                    if row is None:
+                        appended.append(i)
+                        continue
+                    # Replace in place
+                    vectors[row] = embeddings[i]
+                    partition.documents[row] = documents[i]
+                    partition.metadatas[row] = metadatas[i]
+                if appended:
+                    new_vectors = np.asarray([embeddings[i] for i in appended], dtype=np.float32)
+                    vectors = new_vectors if vectors is None else np.vstack([vectors, new_vectors])
+                    partition.ids.extend(ids[i] for i in appended)
+                    partition.documents.extend(documents[i] for i in appended)
+                    partition.metadatas.extend(metadatas[i] for i in appended)
+                partition.save(vectors)
+                self._index_ids(partition)
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            id_set = set(ids or [])
+            for partition in self._partitions_for(where):
+                keep = [
+                    row for row, record_id in enumerate(partition.ids)
+                    if not (
+                        (ids is None or record_id in id_set)
+                        and self._matches(partition.metadatas[row], where)
+                    )
+                ]
+                if len(keep) == len(partition.ids):
+                    continue
+                self._remove_rows(partition, keep)
+
+    def get(self, ids=None, where=None, include=None) -> Dict:
+        with self._lock:
+            id_set = set(ids) if ids is not None else None
+            result = {"ids": [], "documents": [], "metadatas": []}
+            for partition in self._partitions_for(where):
+                for row, record_id in enumerate(partition.ids):
+                    if id_set is not None and record_id not in id_set:
+                        continue
+                    if not self._matches(partition.metadatas[row], where):
+                        continue
+                    result["ids"].append(record_id)
+                    result["documents"].append(partition.documents[row])
+                    result["metadatas"].append(partition.metadatas[row])
+            return result
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, include=None) -> Dict:
+        """
+        Exact top-k search; distances are squared L2 like Chroma's default space
+
+        Returns:
+            Chroma-shaped results: lists of ids/documents/metadatas/distances per query
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        # Snapshot partition state so concurrent upserts can't swap arrays mid-search
+        with self._lock:
+            snapshots = [
+                (p.ids, p.documents, p.metadatas, p.vectors, p.sq_norms)
+                for p in self._partitions_for(where) if len(p.ids)
+            ]
+
+        extra_filter = {k: v for k, v in (where or {}).items() if k != self.partition_key}
+        for query in queries:
+            candidates = []
+            query_sq_norm = float(query @ query)
+            for snapshot_index, (_, _, metadatas, vectors, sq_norms) in enumerate(snapshots):
+                distances = sq_norms + query_sq_norm - 2.0 * (vectors @ query)
+                if extra_filter:
+                    mask = np.array([self._matches(m, extra_filter) for m in metadatas], dtype=bool)
+                    distances = np.where(mask, distances, np.inf)
+                k = min(n_results, len(distances))
+                top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+                candidates.extend(
+                    (float(distances[row]), snapshot_index, int(row))
+                    for row in top if np.isfinite(distances[row])
+                )
+
+            candidates.sort(key=lambda item: item[0])
+            candidates = candidates[:n_results]
+            results["ids"].append([snapshots[s][0][row] for _, s, row in candidates])
+            results["documents"].append([snapshots[s][1][row] for _, s, row in candidates])
+            results["metadatas"].append([snapshots[s][2][row] for _, s, row in candidates])
+            results["distances"].append([max(distance, 0.0) for distance, _, _ in candidates])
+
+        return results
@@ -1,6 +1,6 @@
 import { useState, useRef, useEffect } from "react";
 import { useSearchParams, useNavigate } from "react-router-dom";
-import { sendChatMessage } from "../services/api";
+import { streamChatMessage } from "../services/api";
 import {
   MessageCircle,
   Send,
@@ -19,6 +19,7 @@ export default function Chat() {
   const [messages, setMessages] = useState([]);
   const [inputMessage, setInputMessage] = useState("");
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const [error, setError] = useState(null);
   const messagesEndRef = useRef(null);
 
@@ -45,27 +46,38 @@ export default function Chat() {
     setError(null);
 
     try {
-      const history = messages.slice(-10).map((msg) => ({
-        role: msg.role,
-        content: msg.content,
-      }));
+      // Placeholder reply that fills in as tokens arrive
+      const replyIndex = messages.length + 1;
+      const updateReply = (fields) =>
+        setMessages((prev) =>
+          prev.map((msg, index) =>
+            index === replyIndex ? { ...msg, ...fields } : msg
+          )
+        );
+      setMessages((prev) => [
+        ...prev,
+        { role: "assistant", content: "", timestamp: new Date().toISOString() },
+      ]);
 
-      const response = await sendChatMessage(
+      let streamedText = "";
+      const response = await streamChatMessage(
         studentId,
         userMessage.content,
-        history
+        null, // History is loaded server-side from the stored conversation
+        (token) => {
+          streamedText += token;
+          setIsStreaming(true);
+          updateReply({ content: streamedText });
+        },
+        subject
       );
 
-      const aiMessage = {
-        role: "assistant",
+      updateReply({
         content: response.response,
-        timestamp: new Date().toISOString(),
         confidence_score: response.confidence_score,
         should_handoff: response.should_handoff,
         handoff_message: response.handoff_message,
-      };
-
-      setMessages((prev) => [...prev, aiMessage]);
+      });
     } catch (err) {
       setError(err.message || "Failed to get response. Please try again.");
       const errorMessage = {
@@ -75,9 +87,13 @@ export default function Chat() {
         timestamp: new Date().toISOString(),
         isError: true,
       };
-      setMessages((prev) => [...prev, errorMessage]);
+      setMessages((prev) => [
+        ...prev.filter((msg) => msg.role === "user" || msg.content),
+        errorMessage,
+      ]);
     } finally {
       setIsLoading(false);
+      setIsStreaming(false);
     }
   };
 
@@ -141,6 +157,7 @@ export default function Chat() {
           )}
 
           {messages.map((message, index) => (
+            (message.role === "user" || message.content) && (
             <div
               key={index}
               className={`flex ${
@@ -183,9 +200,10 @@ export default function Chat() {
                 </p>
               </div>
             </div>
+            )
           ))}
 
-          {isLoading && (
+          {isLoading && !isStreaming && (
             <div className="flex justify-start">
               <div className="bg-gray-50 border border-gray-200 rounded-2xl px-5 py-3 flex items-center gap-2">
                 <Loader2 className="w-4 h-4 animate-spin text-indigo-600" />
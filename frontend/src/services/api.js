@@ -42,10 +42,16 @@ export async function apiCall(endpoint, method = "GET", body = null) {
  * Send a chat message to the AI
  * @param {string} studentId - Student ID
  * @param {string} message - User message
- * @param {Array} history - Optional conversation history
+ * @param {Array} history - Optional conversation history (null = use the stored conversation)
+ * @param {string} subject - Optional subject of the conversation
  * @returns {Promise} Response from API
  */
-export async function sendChatMessage(studentId, message, history = []) {
+export async function sendChatMessage(
+  studentId,
+  message,
+  history = null,
+  subject = null
+) {
   try {
     const response = await fetch(`${API_BASE_URL}/chat/`, {
       method: "POST",
@@ -56,6 +62,7 @@ export async function sendChatMessage(studentId, message, history = []) {
         student_id: studentId,
         message: message,
         history: history,
+        subject: subject,
       }),
     });
 
@@ -70,3 +77,78 @@ export async function sendChatMessage(studentId, message, history = []) {
     throw error;
   }
 }
+
+/**
+ * Stream a chat response from the AI (Server-Sent Events)
+ * @param {string} studentId - Student ID
+ * @param {string} message - User message
+ * @param {Array} history - Optional conversation history (null = use the stored conversation)
+ * @param {Function} onToken - Called with each piece of text as it arrives
+ * @param {string} subject - Optional subject of the conversation
+ * @returns {Promise} Final response (same shape as sendChatMessage)
+ */
+export async function streamChatMessage(
+  studentId,
+  message,
+  history = null,
+  onToken = () => {},
+  subject = null
+) {
+  try {
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({
+        student_id: studentId,
+        message: message,
+        history: history,
+        subject: subject,
+      }),
+    });
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || "Failed to send message");
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let result = null;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = "message";
+        let data = "";
+        for (const line of rawEvent.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        if (!data) continue;
+
+        const payload = JSON.parse(data);
+        if (event === "token") onToken(payload.content);
+        else if (event === "done") result = payload;
+      }
+    }
+
+    if (!result) {
+      throw new Error("Chat stream ended unexpectedly");
+    }
+    return result;
+  } catch (error) {
+    console.error("Chat stream error:", error);
+    throw error;
+  }
+}